@@ -47,6 +47,10 @@ QT_KEY_PRESS = QtCore.QEvent.Type.KeyPress if USE_PYQT6 else QtCore.QEvent.KeyPr
 QT_KEY_RELEASE = (
     QtCore.QEvent.Type.KeyRelease if USE_PYQT6 else QtCore.QEvent.KeyRelease
 )
+QT_EVENT_PAINT = QtCore.QEvent.Type.Paint if USE_PYQT6 else QtCore.QEvent.Paint
+QT_EVENT_CHILD_POLISHED = (
+    QtCore.QEvent.Type.ChildPolished if USE_PYQT6 else QtCore.QEvent.ChildPolished
+)
 QT_NO_MODIFIER = (
     QtCore.Qt.KeyboardModifier.NoModifier if USE_PYQT6 else QtCore.Qt.NoModifier
 )
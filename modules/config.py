@@ -97,6 +97,18 @@ class Config:
     # log setting
     G_LOG_DIR = "log"
     G_LOG_DB = os.path.join(G_LOG_DIR, "log.db")
+    # records are written to G_LOG_DB in one transaction every G_LOG_DB_COMMIT_INTERVAL seconds
+    # or G_LOG_DB_COMMIT_ROWS records, whichever comes first.
+    # on a crash or a power loss, at most the records of the last G_LOG_DB_COMMIT_INTERVAL seconds
+    # are lost (with G_LOG_DB_SYNCHRONOUS = "NORMAL", the last committed transaction may be lost too)
+    G_LOG_DB_COMMIT_INTERVAL = 10  # [s]
+    G_LOG_DB_COMMIT_ROWS = 30
+    # PRAGMA synchronous of the database in WAL mode: OFF, NORMAL or FULL
+    G_LOG_DB_SYNCHRONOUS = "NORMAL"
+    # write the database from a dedicated thread, so that slow commits do not delay the event loop
+    G_LOG_DB_THREAD = True
+    # records waiting to be written, record_log waits when it is full
+    G_LOG_DB_QUEUE_SIZE = 120
     G_LOG_OUTPUT_FILE = False
     G_LOG_DEBUG_FILE = os.path.join(G_LOG_DIR, "debug.log")
 
@@ -106,6 +118,12 @@ class Config:
     G_MAP_CONFIG = {}
     # external input of G_MAP_CONFIG
     G_MAP_LIST = "map.yaml"
+    # drawn tiles kept in the map widget by map, the others are removed
+    G_MAP_TILE_ITEMS = 64
+    # mmap_size of the .mbtiles files [bytes] (0: disabled)
+    G_MAP_MBTILES_MMAP_SIZE = 0
+    # decoded tiles kept by .mbtiles map (256x256 RGBA: 256KB by tile)
+    G_MAP_MBTILES_CACHE_SIZE = 16
 
     # overlay map
     G_USE_HEATMAP_OVERLAY_MAP = False
@@ -280,6 +298,14 @@ class Config:
     G_GPS_ON_ROUTE_CUTOFF = 50  # [m] #generate from course
     G_GPS_SEARCH_RANGE = 6  # [km] #100km/h -> 27.7m/s
     G_GPS_AZIMUTH_CUTOFF = 60  # degree(30/45/90): 0~G_GPS_AZIMUTH_CUTOFF, (360-G_GPS_AZIMUTH_CUTOFF)~G_GPS_AZIMUTH_CUTOFF
+    # only with the segment grid (G_GPS_SEGMENT_GRID_MIN_POINTS): scan the windows
+    # ahead of the course index first, then query the grid for the other windows
+    # (False: query the grid from the first window). Without the grid, the windows
+    # are always scanned in order
+    G_GPS_INCREMENTAL_SEARCH = True
+    # spatial index of the course segments, only faster than the search windows
+    # for long courses (python -m tests.benchmarks.bench_course_index)
+    G_GPS_SEGMENT_GRID_MIN_POINTS = 20000
     # for route downsampling cutoff
     G_ROUTE_DISTANCE_CUTOFF = 1.0  # 1.0
     G_ROUTE_AZIMUTH_CUTOFF = 3.0  # 3.0
@@ -777,7 +803,11 @@ class Config:
 
     def get_courses(self):
         dirs = sorted(
-            glob(os.path.join(self.G_COURSE_DIR, "*.tcx")),
+            [
+                f
+                for ext in ("tcx", "gpx", "fit")
+                for f in glob(os.path.join(self.G_COURSE_DIR, f"*.{ext}"))
+            ],
             key=lambda f: os.stat(f).st_mtime,
             reverse=True,
         )
@@ -1,18 +1,25 @@
 import os
 import json
+import hashlib
 import re
 import shutil
 from datetime import datetime, timedelta
 import asyncio
+from itertools import accumulate
 
 import oyaml
 import numpy as np
 from crdp import rdp
 
 from logger import app_logger
-from modules.loaders import TcxLoader
+from modules.loaders import FitLoader, GpxLoader, TcxLoader
 from modules.utils.filters import savitzky_golay
-from modules.utils.geo import calc_azimuth, get_dist_on_earth, get_dist_on_earth_array
+from modules.utils.geo import (
+    G_DISTANCE_BY_LAT1S,
+    calc_azimuth,
+    get_dist_on_earth,
+    get_dist_on_earth_array,
+)
 from modules.utils.network import detect_network
 from modules.utils.timer import Timer, log_timers
 
@@ -24,7 +31,59 @@ try:
 except ImportError:
     pass
 
-LOADERS = {"tcx": TcxLoader}
+LOADERS = {"tcx": TcxLoader, "gpx": GpxLoader, "fit": FitLoader}
+
+# bump when the course processing changes so that stale cache files are ignored
+COURSE_CACHE_VERSION = 1
+COURSE_CACHE_ARRAYS = (
+    "latitude",
+    "longitude",
+    "altitude",
+    "distance",
+    "points_diff",
+    "azimuth",
+    "slope_smoothing",
+    "colored_altitude",
+    "climb_segment",
+)
+COURSE_POINTS_CACHE_ARRAYS = (
+    "name",
+    "type",
+    "altitude",
+    "distance",
+    "latitude",
+    "longitude",
+    "notes",
+)
+
+CLIMB_SEGMENT_DTYPE = np.dtype(
+    [
+        ("start", "int64"),
+        ("end", "int64"),
+        ("start_point_distance", "float64"),
+        ("start_point_altitude", "float64"),
+        ("distance", "float64"),
+        ("average_grade", "float64"),
+        ("volume", "float64"),
+        ("course_point_distance", "float64"),
+        ("course_point_altitude", "float64"),
+        ("course_point_longitude", "float64"),
+        ("course_point_latitude", "float64"),
+        ("cat", "U8"),
+    ]
+)
+
+
+def get_nearest_index(sorted_array, value):
+    # same as np.abs(sorted_array - value).argmin() (first index on ties) for a sorted array
+    n = len(sorted_array)
+    i = np.searchsorted(sorted_array, value)
+    if i == n:
+        i = n - 1
+    elif i > 0 and abs(sorted_array[i - 1] - value) <= abs(sorted_array[i] - value):
+        i -= 1
+    # first of equal values
+    return np.searchsorted(sorted_array, sorted_array[i])
 
 
 class CourseIndex:
@@ -83,6 +142,127 @@ class CoursePoints:
         self.notes = np.array([])
 
 
+class CourseSegmentGrid:
+    # uniform grid over the bounding boxes of the course segments
+    # every segment is registered in all the cells its bounding box overlaps, so the segments
+    # close to a position can be fetched without scanning the whole course
+    MIN_CELL_SIZE = 0.005  # [degree]
+
+    cell_size = MIN_CELL_SIZE
+    origin = (0, 0)
+    shape = (0, 0)
+
+    # cell keys (sorted) and their segment index
+    keys = None
+    segments = None
+
+    # zero-length segments: their distance is nan which always wins np.argmin,
+    # so they are returned with every query
+    degenerate = None
+
+    def __init__(self, longitude, latitude, points_diff_sum_of_squares):
+        lon_min = np.minimum(longitude[:-1], longitude[1:])
+        lon_max = np.maximum(longitude[:-1], longitude[1:])
+        lat_min = np.minimum(latitude[:-1], latitude[1:])
+        lat_max = np.maximum(latitude[:-1], latitude[1:])
+
+        # grow cells for courses with long (downsampled) segments,
+        # so that a segment is registered in a few cells only
+        extent = np.maximum(lon_max - lon_min, lat_max - lat_min)
+        self.cell_size = max(self.MIN_CELL_SIZE, float(np.percentile(extent, 95)))
+        self.origin = (np.min(longitude), np.min(latitude))
+
+        x0 = ((lon_min - self.origin[0]) / self.cell_size).astype("int64")
+        x1 = ((lon_max - self.origin[0]) / self.cell_size).astype("int64")
+        y0 = ((lat_min - self.origin[1]) / self.cell_size).astype("int64")
+        y1 = ((lat_max - self.origin[1]) / self.cell_size).astype("int64")
+        self.shape = (int(np.max(x1)) + 1, int(np.max(y1)) + 1)
+
+        # enumerate the (x, y) cells of each bounding box
+        n_x = x1 - x0 + 1
+        n_y = y1 - y0 + 1
+        counts = n_x * n_y
+        segments = np.repeat(np.arange(len(counts)), counts)
+        k = np.arange(len(segments)) - np.repeat(np.cumsum(counts) - counts, counts)
+        n_y = np.repeat(n_y, counts)
+        keys = (np.repeat(x0, counts) + k // n_y) * self.shape[1] + (
+            np.repeat(y0, counts) + k % n_y
+        )
+
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.segments = segments[order]
+        self.degenerate = np.flatnonzero(points_diff_sum_of_squares == 0)
+
+    def query(self, lon, lat, radius):
+        # return the sorted indexes of the segments whose bounding box is within radius [degree]
+        x0, x1, y0, y1 = (
+            int(np.floor((v - self.origin[i]) / self.cell_size))
+            for v, i in (
+                (lon - radius, 0),
+                (lon + radius, 0),
+                (lat - radius, 1),
+                (lat + radius, 1),
+            )
+        )
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, self.shape[0] - 1), min(y1, self.shape[1] - 1)
+
+        if x0 > x1 or y0 > y1:
+            return self.degenerate
+
+        # keys are sorted by (x, y): the cells y0 -> y1 of a column are contiguous
+        columns = np.arange(x0, x1 + 1) * self.shape[1]
+        start = np.searchsorted(self.keys, columns + y0, side="left")
+        end = np.searchsorted(self.keys, columns + y1, side="right")
+        segments = np.concatenate([self.segments[s:e] for s, e in zip(start, end)])
+
+        return np.union1d(segments, self.degenerate)
+
+
+class CourseSegmentCandidates:
+    # segments around a position fetched from the CourseSegmentGrid of the course,
+    # with their distance [degree] to the position (inf if the azimuth is out of cutoff)
+    # the nearest segment of a search window is one of them if its distance is within radius,
+    # otherwise the radius needs to be expanded
+    EXPAND_FACTOR = 4
+
+    radius = np.nan
+    segments = None
+    dist_diff_mod = None
+
+    def __init__(self, course, lat, lon, track, on_route_cutoff, azimuth_cutoff):
+        self.course = course
+        self.lat = lat
+        self.lon = lon
+        self.track = track
+        self.azimuth_cutoff = azimuth_cutoff
+        self.query(
+            on_route_cutoff / (G_DISTANCE_BY_LAT1S * 3600 * np.cos(np.radians(lat)))
+        )
+
+    def query(self, radius):
+        self.radius = radius
+        # a little margin for rounding errors
+        self.segments = self.course.segment_grid.query(
+            self.lon, self.lat, radius * 1.01
+        )
+        _, dist_diff = self.course.get_segment_distance(
+            self.lat, self.lon, self.segments
+        )
+        self.dist_diff_mod = np.where(
+            self.course.check_azimuth(
+                self.course.get_azimuth_diff(self.track, self.segments),
+                self.azimuth_cutoff,
+            ),
+            dist_diff,
+            np.inf,
+        )
+
+    def expand(self):
+        self.query(self.radius * self.EXPAND_FACTOR)
+
+
 # we have mutable attributes but course is supposed to be a singleton anyway
 class Course:
     config = None
@@ -96,6 +276,7 @@ class Course:
 
     course_points = None
     index = None
+    segment_grid = None
 
     # calculated
     points_diff = np.array([])
@@ -104,7 +285,7 @@ class Course:
     slope_smoothing = np.array([])
     colored_altitude = np.array([])
     # [start_index, end_index, distance, average_grade, volume(=dist*average), cat]
-    climb_segment = []
+    climb_segment = np.array([], dtype=CLIMB_SEGMENT_DTYPE)
 
     # for wind
     #wind_distance = []
@@ -151,7 +332,8 @@ class Course:
         self.slope = np.array([])
         self.slope_smoothing = np.array([])
         self.colored_altitude = np.array([])
-        self.climb_segment = []
+        self.climb_segment = np.array([], dtype=CLIMB_SEGMENT_DTYPE)
+        self.segment_grid = None
         #self.wind_distance = []
         self.wind_coordinates = []
         self.wind_timeline = []
@@ -164,76 +346,185 @@ class Course:
         if delete_course_file:
             if os.path.exists(self.config.G_COURSE_FILE_PATH):
                 os.remove(self.config.G_COURSE_FILE_PATH)
+            if os.path.exists(self.cache_file_path):
+                os.remove(self.cache_file_path)
             if not replace and self.config.G_THINGSBOARD_API["STATUS"]:
                 self.config.api.send_livetrack_course_reset()
 
     def load(self, file=None):
+        ext = None
         # if file is given, copy it to self.config.G_COURSE_FILE_PATH firsthand, we are loading a new course
         if file:
             _, ext = os.path.splitext(file)
+            ext = ext[1:].lower()
             shutil.copy(file, self.config.G_COURSE_FILE_PATH)
-            # shutil.copy2(file, self.config.G_COURSE_FILE_PATH)
-            # if ext:
-            #    os.setxattr(
-            #        self.config.G_COURSE_FILE_PATH, "user.ext", ext[1:].encode()
-            #    )
 
         self.reset()
 
         timers = [
-            Timer(auto_start=False, text="read_file           : {0:.3f} sec"),
-            Timer(auto_start=False, text="downsample          : {0:.3f} sec"),
-            Timer(auto_start=False, text="calc_slope_smoothing: {0:.3f} sec"),
-            Timer(auto_start=False, text="modify_course_points: {0:.3f} sec"),
-            Timer(auto_start=False, text="get_course_wind     : {0:.3f} sec"),
+            Timer(auto_start=False, text="load_cache          : {0:.3f} sec"),
         ]
 
         with timers[0]:
-            # get loader based on the extension
-            if os.path.exists(self.config.G_COURSE_FILE_PATH):
-                # get file extension in order to find the correct loader
-                # extension was set in custom attributes as the current course is always
-                # loaded from '.current'
-                try:
-                    # ext = os.getxattr(
-                    #    self.config.G_COURSE_FILE_PATH, "user.ext"
-                    # ).decode()
-                    ext = "tcx"
-                    if ext in LOADERS:
-                        course_data, course_points_data = LOADERS[ext].load_file(
-                            self.config.G_COURSE_FILE_PATH
-                        )
-                        if course_data:
-                            for k, v in course_data.items():
-                                setattr(self, k, v)
-                        if course_points_data:
-                            for k, v in course_points_data.items():
-                                setattr(self.course_points, k, v)
-                    else:
-                        app_logger.warning(f".{ext} files are not handled")
-                except (AttributeError, OSError) as e:
-                    app_logger.error(
-                        f"Incorrect course file: {e}. Please reload the course and make sure your file"
-                        f"has a proper extension set"
-                    )
-        with timers[1]:
-            self.downsample()
+            cache_key = self.get_cache_key()
+            cached = self.load_cache(cache_key)
+
+        if not cached:
+            timers.extend(
+                [
+                    Timer(auto_start=False, text="read_file           : {0:.3f} sec"),
+                    Timer(auto_start=False, text="downsample          : {0:.3f} sec"),
+                    Timer(auto_start=False, text="calc_slope_smoothing: {0:.3f} sec"),
+                    Timer(auto_start=False, text="modify_course_points: {0:.3f} sec"),
+                    Timer(auto_start=False, text="save_cache          : {0:.3f} sec"),
+                ]
+            )
+
+            with timers[1]:
+                self.read_file(ext)
+
+            with timers[2]:
+                self.downsample()
 
-        with timers[2]:
-            self.calc_slope_smoothing()
+            with timers[3]:
+                self.calc_slope_smoothing()
 
-        with timers[3]:
-            self.modify_course_points()
+            with timers[4]:
+                self.modify_course_points()
 
-        with timers[4]:
+            with timers[5]:
+                self.save_cache(cache_key)
+
+        timers.append(
+            Timer(auto_start=False, text="get_course_wind     : {0:.3f} sec")
+        )
+        with timers[-1]:
             asyncio.create_task(self.get_course_wind())
 
-        app_logger.info("[logger] Loading course:")
+        app_logger.info(f"[logger] Loading course{' (cached)' if cached else ''}:")
         log_timers(timers, text_total="total               : {0:.3f} sec")
 
         if self.config.G_THINGSBOARD_API["STATUS"]:
             self.config.api.send_livetrack_course_load()
 
+    def read_file(self, ext=None):
+        if not os.path.exists(self.config.G_COURSE_FILE_PATH):
+            return
+
+        try:
+            # get loader based on the extension
+            # the current course is always loaded from '.current', so the extension is not known
+            # when reloading it: detect the format from the content instead
+            if ext not in LOADERS:
+                ext = self.get_course_file_ext()
+            if ext in LOADERS:
+                course_data, course_points_data = LOADERS[ext].load_file(
+                    self.config.G_COURSE_FILE_PATH
+                )
+                if course_data:
+                    for k, v in course_data.items():
+                        setattr(self, k, v)
+                if course_points_data:
+                    for k, v in course_points_data.items():
+                        setattr(self.course_points, k, v)
+            else:
+                app_logger.warning(f".{ext} files are not handled")
+        except (AttributeError, OSError) as e:
+            app_logger.error(
+                f"Incorrect course file: {e}. Please reload the course and make sure your file"
+                f"has a proper extension set"
+            )
+
+    def get_course_file_ext(self):
+        with open(self.config.G_COURSE_FILE_PATH, "rb") as f:
+            head = f.read(1024)
+        if head[8:12] == b".FIT":
+            return "fit"
+        elif b"<gpx" in head:
+            return "gpx"
+        elif b"<TrainingCenterDatabase" in head:
+            return "tcx"
+        return None
+
+    @property
+    def cache_file_path(self):
+        return f"{self.config.G_COURSE_FILE_PATH}.npz"
+
+    def get_cache_key(self):
+        # the cache is valid for the same course file processed with the same parameters
+        if not os.path.exists(self.config.G_COURSE_FILE_PATH):
+            return None
+
+        content_hash = hashlib.sha256()
+        with open(self.config.G_COURSE_FILE_PATH, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                content_hash.update(chunk)
+
+        parameters = (
+            self.config.G_COURSE_INDEXING,
+            self.config.G_GPS_ON_ROUTE_CUTOFF,
+            self.config.G_CLIMB_DISTANCE_CUTOFF,
+            self.config.G_CLIMB_GRADE_CUTOFF,
+            self.config.G_SLOPE_CUTOFF,
+            self.config.G_SLOPE_COLOR,
+            self.config.G_CLIMB_CATEGORY,
+        )
+        parameter_hash = hashlib.sha256(repr(parameters).encode())
+
+        return (
+            f"{COURSE_CACHE_VERSION}:"
+            f"{content_hash.hexdigest()}:{parameter_hash.hexdigest()}"
+        )
+
+    def load_cache(self, cache_key):
+        if cache_key is None or not os.path.exists(self.cache_file_path):
+            return False
+
+        try:
+            with np.load(self.cache_file_path, allow_pickle=False) as cache:
+                if str(cache["key"]) != cache_key:
+                    return False
+                for k in COURSE_CACHE_ARRAYS:
+                    setattr(self, k, cache[k])
+                for k in COURSE_POINTS_CACHE_ARRAYS:
+                    setattr(self.course_points, k, cache[f"course_points_{k}"])
+                self.info = json.loads(str(cache["info"]))
+        except (OSError, KeyError, ValueError) as e:
+            app_logger.warning(f"Could not load course cache: {e}")
+            self.reset()
+            return False
+
+        if len(self.distance) > 1:
+            self.update_search_range()
+        if self.config.G_COURSE_INDEXING:
+            self.init_segment_index()
+
+        return True
+
+    def save_cache(self, cache_key):
+        if cache_key is None:
+            return
+
+        arrays = {k: getattr(self, k) for k in COURSE_CACHE_ARRAYS}
+        for k in COURSE_POINTS_CACHE_ARRAYS:
+            arrays[f"course_points_{k}"] = getattr(self.course_points, k)
+
+        # write to a temporary file first so that an interrupted write never leaves a broken cache
+        tmp_file = f"{self.cache_file_path}.tmp"
+        try:
+            with open(tmp_file, "wb") as f:
+                np.savez(
+                    f,
+                    key=np.array(cache_key),
+                    info=np.array(json.dumps(self.info)),
+                    **arrays,
+                )
+            os.replace(tmp_file, self.cache_file_path)
+        except (OSError, TypeError, ValueError) as e:
+            app_logger.warning(f"Could not save course cache: {e}")
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
     async def load_google_map_route(self, load_html=False, html_file=None):
         self.reset()
 
@@ -482,7 +773,6 @@ class Course:
             )
             self.distance = np.insert(self.distance, 0, 0)
             self.distance = np.cumsum(self.distance)
-        dist_diff = 1000 * np.diff(self.distance)  # [m]
 
         if len_alt:
             modified_altitude = savitzky_golay(self.altitude, 53, 3)
@@ -500,6 +790,12 @@ class Course:
             #  alt_dem[i] = self.config.api.get_altitude([self.longitude[i], self.latitude[i]])
             # np.savetxt('log/course_altitude_dem.csv', alt_dem, fmt='%.3f')
 
+        self.update_search_range()
+
+        app_logger.info(f"downsampling:{len_lat} -> {len(self.latitude)}")
+
+    def update_search_range(self):
+        dist_diff = 1000 * np.diff(self.distance)  # [m]
         diff_dist_max = int(np.max(dist_diff)) * 2 / 1000  # [m->km]
         if diff_dist_max > self.config.G_GPS_SEARCH_RANGE:  # [km]
             app_logger.debug(
@@ -507,8 +803,6 @@ class Course:
             )
             self.config.G_GPS_SEARCH_RANGE = diff_dist_max
 
-        app_logger.info(f"downsampling:{len_lat} -> {len(self.latitude)}")
-
     # make route colors by slope for MapWidget, CourseProfileWidget
     def calc_slope_smoothing(self):
         # parameters
@@ -553,26 +847,35 @@ class Course:
         grade_mod[cond_diff] = grade[3][cond_diff]
 
         # apply LP filter (forward and backward)
-        self.slope_smoothing = np.zeros(course_n)
-        self.slope_smoothing[0] = grade_mod[0]
-        self.slope_smoothing[-1] = grade_mod[-1]
+        # a first order IIR is sequential, so it runs on python floats which is
+        # much faster than indexing numpy arrays (and gives the same results)
+        grade_mod = grade_mod.tolist()
+        LP_coefficient_pre = 1 - LP_coefficient
 
         # forward
-        for i in range(1, course_n - 1):
-            self.slope_smoothing[i] = grade_mod[
-                i
-            ] * LP_coefficient + self.slope_smoothing[i - 1] * (1 - LP_coefficient)
+        slope_smoothing = list(
+            accumulate(
+                grade_mod[1:-1],
+                lambda pre, g: g * LP_coefficient + pre * LP_coefficient_pre,
+                initial=grade_mod[0],
+            )
+        )
+        slope_smoothing.append(grade_mod[-1])
 
         # backward
-        for i in reversed(range(course_n - 1)):
-            self.slope_smoothing[i] = self.slope_smoothing[
-                i
-            ] * LP_coefficient + self.slope_smoothing[i + 1] * (1 - LP_coefficient)
+        slope_smoothing = list(
+            accumulate(
+                reversed(slope_smoothing[:-1]),
+                lambda pre, s: s * LP_coefficient + pre * LP_coefficient_pre,
+                initial=slope_smoothing[-1],
+            )
+        )
+        self.slope_smoothing = np.array(slope_smoothing[::-1])
 
-        # detect climbs
+        # categorize by slope
         slope_smoothing_cat = np.zeros(course_n).astype("uint8")
 
-        for i in range(i, len(self.config.G_SLOPE_CUTOFF) - 1):
+        for i in range(1, len(self.config.G_SLOPE_CUTOFF) - 1):
             slope_smoothing_cat = np.where(
                 (self.config.G_SLOPE_CUTOFF[i - 1] < self.slope_smoothing)
                 & (self.slope_smoothing <= self.config.G_SLOPE_CUTOFF[i]),
@@ -586,95 +889,91 @@ class Course:
             slope_smoothing_cat,
         )
 
-        climb_search_state = False
+        self.climb_segment = self.detect_climbs(slope_smoothing_cat)
+        self.colored_altitude = np.array(self.config.G_SLOPE_COLOR)[slope_smoothing_cat]
+
+    def detect_climbs(self, slope_smoothing_cat):
+        course_n = len(slope_smoothing_cat)
         climb_start_cutoff = 2
         climb_end_cutoff = 1
 
-        if slope_smoothing_cat[0] >= climb_start_cutoff:
-            self.climb_segment.append(
-                {
-                    "start": 0,
-                    "start_point_distance": self.distance[0],
-                    "start_point_altitude": self.altitude[0],
-                }
+        # a climb starts at the first point with slope_smoothing_cat >= climb_start_cutoff,
+        # and ends at the next point with slope_smoothing_cat < climb_end_cutoff
+        # (or at the end of the course)
+        start_points = np.flatnonzero(slope_smoothing_cat >= climb_start_cutoff)
+        end_points = np.flatnonzero(slope_smoothing_cat < climb_end_cutoff)
+        start = []
+        end = []
+        i = 0
+
+        while True:
+            k = np.searchsorted(start_points, i)
+            # a climb can not start on the last point
+            if k == len(start_points) or start_points[k] == course_n - 1:
+                break
+            start.append(start_points[k])
+            k = np.searchsorted(end_points, start[-1] + 1)
+            end.append(end_points[k] if k < len(end_points) else course_n - 1)
+            i = end[-1] + 1
+
+        start = np.array(start, dtype="int64")
+        end = np.array(end, dtype="int64")
+
+        climb_segment = np.zeros(len(start), dtype=CLIMB_SEGMENT_DTYPE)
+        climb_segment["start"] = start
+        climb_segment["end"] = end
+        climb_segment["start_point_distance"] = self.distance[start]
+        climb_segment["start_point_altitude"] = self.altitude[start]
+        climb_segment["distance"] = self.distance[end] - self.distance[start]
+        alt = self.altitude[end] - self.altitude[start]
+        climb_segment["average_grade"] = (
+            alt / (climb_segment["distance"] * 1000) * 100
+        )
+        climb_segment["volume"] = (
+            climb_segment["distance"] * 1000 * climb_segment["average_grade"]
+        )
+        climb_segment["course_point_distance"] = self.distance[end]
+        climb_segment["course_point_altitude"] = self.altitude[end]
+        climb_segment["course_point_longitude"] = self.longitude[end]
+        climb_segment["course_point_latitude"] = self.latitude[end]
+
+        climb_segment = climb_segment[
+            ~(
+                (climb_segment["distance"] < self.config.G_CLIMB_DISTANCE_CUTOFF)
+                | (climb_segment["average_grade"] < self.config.G_CLIMB_GRADE_CUTOFF)
+                | (climb_segment["volume"] < self.config.G_CLIMB_CATEGORY[0]["volume"])
+            )
+        ]
+
+        # highest category whose volume is exceeded
+        cat_index = (
+            np.sum(
+                climb_segment["volume"][:, None]
+                > np.array([c["volume"] for c in self.config.G_CLIMB_CATEGORY]),
+                axis=1,
             )
-            climb_search_state = True
+            - 1
+        )
+        climb_segment["cat"] = np.array(
+            [c["name"] for c in self.config.G_CLIMB_CATEGORY] + [""]
+        )[cat_index]
 
-        for i in range(1, course_n):
-            # search climb end (detect top of climb)
-            if (
-                climb_search_state
-                and slope_smoothing_cat[i - 1] >= climb_end_cutoff
-                and (slope_smoothing_cat[i] < climb_end_cutoff or i == course_n - 1)
-            ):
-                end_index = i
-                self.climb_segment[-1]["end"] = end_index
-                self.climb_segment[-1]["distance"] = (
-                    self.distance[end_index]
-                    - self.distance[self.climb_segment[-1]["start"]]
-                )
-                alt = (
-                    self.altitude[end_index]
-                    - self.altitude[self.climb_segment[-1]["start"]]
-                )
-                self.climb_segment[-1]["average_grade"] = (
-                    alt / (self.climb_segment[-1]["distance"] * 1000) * 100
-                )
-                self.climb_segment[-1]["volume"] = (
-                    self.climb_segment[-1]["distance"]
-                    * 1000
-                    * self.climb_segment[-1]["average_grade"]
-                )
-                self.climb_segment[-1]["course_point_distance"] = self.distance[
-                    end_index
-                ]
-                self.climb_segment[-1]["course_point_altitude"] = self.altitude[
-                    end_index
-                ]
-                self.climb_segment[-1]["course_point_longitude"] = self.longitude[
-                    end_index
-                ]
-                self.climb_segment[-1]["course_point_latitude"] = self.latitude[
-                    end_index
-                ]
-                if (
-                    self.climb_segment[-1]["distance"]
-                    < self.config.G_CLIMB_DISTANCE_CUTOFF
-                    or self.climb_segment[-1]["average_grade"]
-                    < self.config.G_CLIMB_GRADE_CUTOFF
-                    or self.climb_segment[-1]["volume"]
-                    < self.config.G_CLIMB_CATEGORY[0]["volume"]
-                ):
-                    # app_logger.debug(f"{self.climb_segment[-1]['distance']}, {self.climb_segment[-1]['volume']}, {self.climb_segment[-1]['distance']}, {self.climb_segment[-1]['average_grade']}")
-                    self.climb_segment.pop()
-                else:
-                    for j in reversed(range(len(self.config.G_CLIMB_CATEGORY))):
-                        if (
-                            self.climb_segment[-1]["volume"]
-                            > self.config.G_CLIMB_CATEGORY[j]["volume"]
-                        ):
-                            self.climb_segment[-1][
-                                "cat"
-                            ] = self.config.G_CLIMB_CATEGORY[j]["name"]
-                            break
-                climb_search_state = False
-            # detect climb start
-            elif (
-                not climb_search_state
-                and slope_smoothing_cat[i - 1] < climb_start_cutoff
-                and slope_smoothing_cat[i] >= climb_start_cutoff
-            ):
-                self.climb_segment.append(
-                    {
-                        "start": i,
-                        "start_point_distance": self.distance[i],
-                        "start_point_altitude": self.altitude[i],
-                    }
-                )
-                climb_search_state = True
+        # app_logger.debug(climb_segment)
+        return climb_segment
 
-        # app_logger.debug(self.climb_segment)
-        self.colored_altitude = np.array(self.config.G_SLOPE_COLOR)[slope_smoothing_cat]
+    def init_segment_index(self):
+        self.points_diff_sum_of_squares = (
+            self.points_diff[0] ** 2 + self.points_diff[1] ** 2
+        )
+        self.points_diff_dist = np.sqrt(self.points_diff_sum_of_squares)
+
+        self.segment_grid = None
+        if len(self.latitude) >= max(
+            self.config.G_GPS_SEGMENT_GRID_MIN_POINTS, 2
+        ) and np.all(np.isfinite(self.latitude) & np.isfinite(self.longitude)):
+            self.segment_grid = CourseSegmentGrid(
+                self.longitude, self.latitude, self.points_diff_sum_of_squares
+            )
 
     def modify_course_points(self):
         if not self.config.G_COURSE_INDEXING:
@@ -682,10 +981,7 @@ class Course:
 
         self.azimuth = calc_azimuth(self.latitude, self.longitude)
         self.points_diff = np.array([np.diff(self.longitude), np.diff(self.latitude)])
-        self.points_diff_sum_of_squares = (
-            self.points_diff[0] ** 2 + self.points_diff[1] ** 2
-        )
-        self.points_diff_dist = np.sqrt(self.points_diff_sum_of_squares)
+        self.init_segment_index()
 
         course_points = self.course_points
 
@@ -884,7 +1180,7 @@ class Course:
         dist = self.config.G_GROSS_AVE_SPEED
         index = 0
         while dist < self.distance[-1]:
-            index += np.argmin(np.abs(self.distance[index:] - dist))
+            index = self.get_index_with_distance(dist, start=index)
             self.wind_coordinates.append([self.longitude[index], self.latitude[index]])
             current_time += timedelta(hours=1)
             self.wind_timeline.append(current_time)
@@ -936,30 +1232,10 @@ class Course:
             start, -search_range
         )
 
-        b_a_x = self.points_diff[0]
-        b_a_y = self.points_diff[1]
-        lon_diff = lon - self.longitude
-        lat_diff = lat - self.latitude
-        p_a_x = lon_diff[0:-1]
-        p_a_y = lat_diff[0:-1]
-        p_b_x = lon_diff[1:]
-        p_b_y = lat_diff[1:]
-        inner_p = (b_a_x * p_a_x + b_a_y * p_a_y) / self.points_diff_sum_of_squares
-
-        azimuth_diff = np.full(len(self.azimuth), np.nan)
-
-        if not np.isnan(track) and track is not None:
-            azimuth_diff = (track - self.azimuth) % 360
-
-        dist_diff = np.where(
-            inner_p <= 0.0,
-            np.sqrt(p_a_x**2 + p_a_y**2),
-            np.where(
-                inner_p >= 1.0,
-                np.sqrt(p_b_x**2 + p_b_y**2),
-                np.abs(b_a_x * p_a_y - b_a_y * p_a_x) / self.points_diff_dist,
-            ),
-        )
+        # GPS is lost (no segment can pass the azimuth check)
+        if np.isnan(track):
+            self.index.on_course_status = False
+            return
 
         # search with no penalty
         # 1st start -> forward_search_index
@@ -978,40 +1254,54 @@ class Course:
         s_state = ["forward(close)", "forward(far)", "back", "end", "start"]
         penalty_index = 2
 
+        # segments around the position, from the spatial index
+        candidates = None
+
         for i, s in enumerate(search_indexes):
             if s[0] < 0:
                 continue
             elif s[0] == s[1]:
                 continue
 
-            m = s[0]
+            # incremental search (with the grid only): the windows ahead of the current
+            # index are scanned as is, the grid is queried if the position is not there
+            if (
+                candidates is None
+                and self.segment_grid is not None
+                and not np.isnan(lon)
+                and (i >= penalty_index or not self.config.G_GPS_INCREMENTAL_SEARCH)
+            ):
+                candidates = CourseSegmentCandidates(
+                    self, lat, lon, track, on_route_cutoff, azimuth_cutoff
+                )
 
-            dist_diff_mod = np.where(
-                ((0 <= azimuth_diff) & (azimuth_diff <= azimuth_cutoff[0]))
-                | ((azimuth_cutoff[1] <= azimuth_diff) & (azimuth_diff <= 360)),
-                dist_diff,
-                np.inf,
+            # segments s[0] -> s[1] (-> end of course)
+            m = self.get_nearest_segment(
+                lat,
+                lon,
+                track,
+                azimuth_cutoff,
+                slice(s[0], min(s[1], course_n - 1)),
+                candidates,
             )
-            # app_logger.debug(f"azimuth_diff: {azimuth_diff[s[0]:s[1]]}")
-            # app_logger.debug(f"dist_diff_mod: {dist_diff_mod[s[0]:s[1]]}")
-            # app_logger.debug(f"inner_p: {inner_p[s[0]:s[1]]}")
 
-            if s[1] >= course_n - 1:
-                m += dist_diff_mod[s[0] :].argmin()
-            else:
-                m += dist_diff_mod[s[0] : s[1]].argmin()
+            inner_p_m = (
+                self.points_diff[0][m] * (lon - self.longitude[m])
+                + self.points_diff[1][m] * (lat - self.latitude[m])
+            ) / self.points_diff_sum_of_squares[m]
+            azimuth_diff_m = self.get_azimuth_diff(track, m)
 
             # check azimuth
-            # app_logger.debug(f"i:{i}, s:{s}, m:{m}, azimuth_diff:{azimuth_diff[m]}, {len(azimuth_diff)}")
+            # app_logger.debug(f"i:{i}, s:{s}, m:{m}, azimuth_diff:{azimuth_diff_m}, {len(azimuth_diff)}")
             # app_logger.debug(f"track:{track}, m:{m}")
             # app_logger.debug(f"self.azimuth:{self.azimuth}, {len(self.azimuth)}")
             # app_logger.debug(f"azimuth_diff:{azimuth_diff}")
-            if np.isnan(azimuth_diff[m]):
+            if np.isnan(azimuth_diff_m):
                 # GPS is lost(return start finally)
                 continue
             if (
-                0 <= azimuth_diff[m] <= azimuth_cutoff[0]
-                or azimuth_cutoff[1] <= azimuth_diff[m] <= 360
+                0 <= azimuth_diff_m <= azimuth_cutoff[0]
+                or azimuth_cutoff[1] <= azimuth_diff_m <= 360
             ):
                 # go forward
                 pass
@@ -1022,7 +1312,7 @@ class Course:
                 # app_logger.debug(f"azimuth_diff:{azimuth_diff}")
                 continue
             app_logger.debug(
-                f"i:{i}, s:{s}, m:{m}, azimuth_diff:{azimuth_diff[m]}, course_index:{self.index.value}, course_point_index:{self.index.course_points_index}"
+                f"i:{i}, s:{s}, m:{m}, azimuth_diff:{azimuth_diff_m}, course_index:{self.index.value}, course_point_index:{self.index.course_points_index}"
             )
             # app_logger.debug(f"\t lat_lon: {lat}, {lon}")
             # app_logger.debug(f"\t course: {self.latitude[self.index.value]}, {self.longitude[self.index.value]}")
@@ -1035,9 +1325,9 @@ class Course:
             ):
                 continue
 
-            if m == 0 and inner_p[0] <= 0.0:
+            if m == 0 and inner_p_m <= 0.0:
                 continue
-            elif m == len(dist_diff) - 1 and inner_p[-1] >= 1.0:
+            elif m == course_n - 2 and inner_p_m >= 1.0:
                 app_logger.info(f"after end of course {start} -> {m}")
                 app_logger.info(
                     f"\t {lat} {lon} / {self.latitude[m]} {self.longitude[m]}",
@@ -1051,11 +1341,11 @@ class Course:
 
             h_lon = (
                 self.longitude[m]
-                + (self.longitude[m + 1] - self.longitude[m]) * inner_p[m]
+                + (self.longitude[m + 1] - self.longitude[m]) * inner_p_m
             )
             h_lat = (
                 self.latitude[m]
-                + (self.latitude[m + 1] - self.latitude[m]) * inner_p[m]
+                + (self.latitude[m + 1] - self.latitude[m]) * inner_p_m
             )
             dist_diff_h = get_dist_on_earth(h_lon, h_lat, lon, lat)
 
@@ -1064,9 +1354,9 @@ class Course:
                     f"dist_diff_h: {dist_diff_h:.0f} > cutoff {on_route_cutoff}[m]"
                 )
                 app_logger.debug(
-                    f"\ti:{i}, s:{s}, m:{m}, azimuth_diff:{azimuth_diff[m]}, "
+                    f"\ti:{i}, s:{s}, m:{m}, azimuth_diff:{azimuth_diff_m}, "
                     f"course_point_index:{self.index.course_points_index}, "
-                    f"inner_p[m]:{inner_p[m]}"
+                    f"inner_p_m:{inner_p_m}"
                 )
                 app_logger.debug(
                     f"\th_lat/h_lon: {h_lat}, {h_lon}, lat_lon: {lat}, {lon}"
@@ -1115,27 +1405,80 @@ class Course:
             self.index.value = m
 
             if len(self.course_points.distance):
-                cp_m = np.abs(
-                    self.course_points.distance - self.index.distance / 1000
-                ).argmin()
                 # specify next points for displaying in cuesheet widget
-                if self.course_points.distance[cp_m] < self.index.distance / 1000:
-                    cp_m += 1
-                if cp_m >= len(self.course_points.distance):
-                    cp_m = len(self.course_points.distance) - 1
-                self.index.course_points_index = cp_m
+                self.index.course_points_index = self.get_course_point_index(
+                    self.index.distance / 1000
+                )
 
             if i >= penalty_index:
                 app_logger.info(f"{s_state[i]} {start} -> {m}")
                 app_logger.info(
                     f"\t {lat} {lon} / {self.latitude[m]} {self.longitude[m]}"
                 )
-                app_logger.info(f"\t azimuth_diff: {azimuth_diff[m]}")
+                app_logger.info(f"\t azimuth_diff: {azimuth_diff_m}")
 
             return
 
         self.index.on_course_status = False
 
+    def get_nearest_segment(
+        self, lat, lon, track, azimuth_cutoff, window, candidates=None
+    ):
+        # index of the nearest segment of window whose azimuth is within cutoff
+        # (or of the first zero-length segment, its distance is nan)
+        while candidates is not None and len(candidates.segments) < (
+            window.stop - window.start
+        ):
+            c_start, c_end = np.searchsorted(
+                candidates.segments, [window.start, window.stop]
+            )
+            if c_start < c_end:
+                c = c_start + candidates.dist_diff_mod[c_start:c_end].argmin()
+                if not candidates.dist_diff_mod[c] > candidates.radius:
+                    return candidates.segments[c]
+            candidates.expand()
+
+        # scan the whole window
+        _, dist_diff = self.get_segment_distance(lat, lon, window)
+        dist_diff_mod = np.where(
+            self.check_azimuth(self.get_azimuth_diff(track, window), azimuth_cutoff),
+            dist_diff,
+            np.inf,
+        )
+        # app_logger.debug(f"dist_diff_mod: {dist_diff_mod}")
+        return window.start + dist_diff_mod.argmin()
+
+    def get_segment_distance(self, lat, lon, s):
+        # projection ratio of (lon, lat) on the course segments s (slice or indexes)
+        # and distance [degree] to these segments
+        b_a_x = self.points_diff[0][s]
+        b_a_y = self.points_diff[1][s]
+        p_a_x = lon - self.longitude[0:-1][s]
+        p_a_y = lat - self.latitude[0:-1][s]
+        p_b_x = lon - self.longitude[1:][s]
+        p_b_y = lat - self.latitude[1:][s]
+        inner_p = (b_a_x * p_a_x + b_a_y * p_a_y) / self.points_diff_sum_of_squares[s]
+
+        dist_diff = np.where(
+            inner_p <= 0.0,
+            np.sqrt(p_a_x**2 + p_a_y**2),
+            np.where(
+                inner_p >= 1.0,
+                np.sqrt(p_b_x**2 + p_b_y**2),
+                np.abs(b_a_x * p_a_y - b_a_y * p_a_x) / self.points_diff_dist[s],
+            ),
+        )
+        return inner_p, dist_diff
+
+    def get_azimuth_diff(self, track, s):
+        return (track - self.azimuth[s]) % 360
+
+    @staticmethod
+    def check_azimuth(azimuth_diff, azimuth_cutoff):
+        return ((0 <= azimuth_diff) & (azimuth_diff <= azimuth_cutoff[0])) | (
+            (azimuth_cutoff[1] <= azimuth_diff) & (azimuth_diff <= 360)
+        )
+
     def get_index_with_distance_cutoff(self, start, search_range):
         if not self.is_set:
             return 0
@@ -1148,8 +1491,22 @@ class Course:
 
         min_index = 0
         if search_range > 0:
-            min_index = start + np.abs((self.distance[start:] - dist_to)).argmin()
+            min_index = self.get_index_with_distance(dist_to, start=start)
         elif search_range < 0:
-            min_index = np.abs((self.distance[0:start] - dist_to)).argmin()
+            min_index = self.get_index_with_distance(dist_to, end=start)
 
         return min_index
+
+    def get_index_with_distance(self, distance, start=0, end=None):
+        # nearest course index of distance [km], between start and end
+        return start + get_nearest_index(self.distance[start:end], distance)
+
+    def get_course_point_index(self, distance):
+        # next course point index from distance [km] (the last one after the end)
+        distance_array = self.course_points.distance
+        cp_m = get_nearest_index(distance_array, distance)
+        if distance_array[cp_m] < distance:
+            cp_m += 1
+        if cp_m >= len(distance_array):
+            cp_m = len(distance_array) - 1
+        return cp_m
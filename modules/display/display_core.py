@@ -1,5 +1,7 @@
 import os
 
+import numpy as np
+
 from logger import app_logger
 
 DEFAULT_RESOLUTION = (400, 240)
@@ -23,6 +25,10 @@ class Display:
     has_color = True
     has_touch = True
     send = False
+    # update(buf, direct_update, start_line) with the rows of the screen from start_line
+    # only, start_line being a multiple of line_align
+    has_partial_update = False
+    line_align = 1
 
     # current auto brightness status (on/off)
     auto_brightness = False
@@ -87,6 +93,21 @@ class Display:
         pass
 
 
+def get_update_lines(top, bottom, line_align, height):
+    # lines [y0, y1) of the screen covering the rows [top, bottom), aligned
+    y0 = max(top, 0) // line_align * line_align
+    y1 = min(-(-bottom // line_align) * line_align, height)
+    return y0, y1
+
+
+def get_lines_array(bits, height, bytes_per_line, shape):
+    # (height, *shape) array of the lines of an image buffer, without the padding
+    # at the end of the lines
+    row_bytes = int(np.prod(shape))
+    buf = np.frombuffer(bits, dtype=np.uint8).reshape(height, bytes_per_line)
+    return buf[:, :row_bytes].reshape((height,) + tuple(shape))
+
+
 def detect_display():
     hatdir = "/proc/device-tree/hat"
     product_file = f"{hatdir}/product"
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import numpy as np
+
+
+class LineQueue:
+    # draw queue of the lines of the screen, by row: the lines pending when a new
+    # frame is put are merged with it (latest wins, the worker reads the bytes of
+    # the rows when writing them), so the queue holds one screen at most and the
+    # frames that SPI can't follow are dropped instead of piling up
+    def __init__(self, height, max_lines=None):
+        # lines by write (SPI transfer size)
+        self.max_lines = max_lines or height
+        # frame of the pending rows, -1 if not pending
+        self.pending = np.full(height, -1, dtype="int64")
+        # pending rows and put time by frame
+        self.frame_rows = {}
+        self.frame_time = {}
+        # frames completed by the lines of the current write
+        self.done_frames = []
+        self.closed = False
+        self.event = asyncio.Event()
+
+        # metrics
+        self.start_time = time.perf_counter()
+        self.frames = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.bytes_written = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+
+    def put(self, rows):
+        frame = self.frames
+        self.frames += 1
+
+        # frames whose pending rows are all replaced by this frame
+        replaced = self.pending[rows]
+        frames, counts = np.unique(replaced[replaced >= 0], return_counts=True)
+        for f, c in zip(frames.tolist(), counts.tolist()):
+            self.frame_rows[f] -= c
+            if not self.frame_rows[f]:
+                del self.frame_rows[f]
+                del self.frame_time[f]
+                self.frames_dropped += 1
+
+        self.pending[rows] = frame
+        self.frame_rows[frame] = len(rows)
+        self.frame_time[frame] = time.perf_counter()
+        self.event.set()
+
+    async def get(self):
+        # rows to write, or None when closed
+        while not self.closed and not len(self.frame_rows):
+            await self.event.wait()
+            self.event.clear()
+        if self.closed:
+            return None
+
+        rows = np.flatnonzero(self.pending >= 0)[: self.max_lines]
+        frames, counts = np.unique(self.pending[rows], return_counts=True)
+        self.pending[rows] = -1
+        self.done_frames = []
+        for f, c in zip(frames.tolist(), counts.tolist()):
+            self.frame_rows[f] -= c
+            if not self.frame_rows[f]:
+                del self.frame_rows[f]
+                self.done_frames.append(f)
+        return rows
+
+    def task_done(self, nbytes):
+        t = time.perf_counter()
+        self.bytes_written += nbytes
+        for f in self.done_frames:
+            latency = t - self.frame_time.pop(f)
+            self.latency_sum += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.frames_written += 1
+        self.done_frames = []
+
+    def close(self):
+        self.closed = True
+        self.event.set()
+
+    def get_metrics(self):
+        elapsed = time.perf_counter() - self.start_time
+        return {
+            "frames": self.frames,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "pending_lines": int(np.count_nonzero(self.pending >= 0)),
+            "spi_bytes_per_sec": self.bytes_written / elapsed if elapsed else 0.0,
+            # from put to the write of the last line of the frame [s]
+            "latency_avg": (
+                self.latency_sum / self.frames_written if self.frames_written else 0.0
+            ),
+            "latency_max": self.latency_max,
+        }
@@ -5,6 +5,7 @@ import numpy as np
 
 from logger import app_logger
 from .display_core import Display
+from .line_queue import LineQueue
 
 _SENSOR_DISPLAY = False
 MODE = "Python"
@@ -42,6 +43,9 @@ UPDATE_MODE = 0x80
 # BACKLIGHT frequency
 GPIO_BACKLIGHT_FREQ = 64
 
+# max bytes by spi_write (270 lines of MIP_640)
+SPI_MAX_BYTES = 65536
+
 
 class MipDisplay(Display):
     pi = None
@@ -52,6 +56,10 @@ class MipDisplay(Display):
     has_auto_brightness = True
     has_touch = False
     send = True
+    has_partial_update = True
+    # dithering pattern of 2x2 pixels: the conv_color functions start the pattern
+    # at the first line of im_array, so partial updates start at even lines
+    line_align = 2
 
     brightness_table = [0, 1, 2, 3, 5, 7, 10, 25, 50, 100]
     brightness = 0
@@ -74,6 +82,8 @@ class MipDisplay(Display):
         if MODE == "Cython":
             self.conv_color = conv_3bit_color
         elif MODE == "Cython_full":
+            # full screen only
+            self.has_partial_update = False
             self.mip_display_cpp = MipDisplay_CPP(config.G_DISPLAY_PARAM["SPI_CLOCK"])
             self.mip_display_cpp.set_screen_size(self.size[0], self.size[1])
             self.update = self.mip_display_cpp.update
@@ -82,7 +92,7 @@ class MipDisplay(Display):
             self.quit = self.mip_display_cpp.quit
             return
         else:
-            self.conv_color = self.conv_3bit_color_py
+            self.conv_color = self.conv_3bit_color_np
 
         self.init_buffer()
 
@@ -113,9 +123,25 @@ class MipDisplay(Display):
         self.img_buff_rgb8[:, 0] = self.img_buff_rgb8[:, 0] + (
             np.arange(self.size[1]) >> 8
         )
+        self.init_dithering()
+
+    def init_dithering(self):
+        # threshold planes of the 2x2 ordered dithering of conv_3bit_color_py:
+        # >= LOW on (2n, 2n) and (2n+1, 2n+1) pixels, > HIGH on the others
+        low = self.dithering_cutoff["LOW"][self.dithering_cutoff_low_index]
+        high = self.dithering_cutoff["HIGH"][self.dithering_cutoff_high_index] + 1
+        odd = (np.arange(self.size[1])[:, np.newaxis] + np.arange(self.size[0])) % 2
+        self.dithering_thresholds = np.repeat(
+            np.where(odd, high, low).astype("uint8"), 3, axis=1
+        )
+        # bits before packbits, reused by frame
+        self.dithering_bits = np.empty(self.dithering_thresholds.shape, dtype="bool")
 
     def start_coroutine(self):
-        self.draw_queue = asyncio.Queue()
+        # drawn by MipDisplay_CPP
+        if self.mip_display_cpp is not None:
+            return
+        self.draw_queue = LineQueue(self.size[1], SPI_MAX_BYTES // self.buff_width)
         asyncio.create_task(self.draw_worker())
 
     def clear(self):
@@ -167,9 +193,11 @@ class MipDisplay(Display):
 
     async def draw_worker(self):
         while True:
-            img_bytes = await self.draw_queue.get()
-            if img_bytes is None:
+            rows = await self.draw_queue.get()
+            if rows is None:
                 break
+            # latest lines of the rows
+            img_bytes = self.pre_img[rows].tobytes()
             # self.config.check_time("mip_draw_worker start")
             # t = datetime.datetime.now()
             self.pi.write(GPIO_SCS, 1)
@@ -181,21 +209,28 @@ class MipDisplay(Display):
             self.pi.write(GPIO_SCS, 0)
             # self.config.check_time("mip_draw_worker end")
             # print("####### draw(Py)", (datetime.datetime.now()-t).total_seconds())
-            self.draw_queue.task_done()
+            self.draw_queue.task_done(len(img_bytes))
 
-    def update(self, im_array, direct_update):
+    def update(self, im_array, direct_update, start_line=0):
         # direct update not yet supported for MPI_640
         if direct_update and self.config.G_DISPLAY in ("MIP_640",):
             direct_update = False
 
+        # rows of im_array
+        lines = slice(start_line, start_line + len(im_array))
+
         # self.config.check_time("mip_update start")
-        self.img_buff_rgb8[:, 2:] = self.conv_color(im_array)
+        self.img_buff_rgb8[lines, 2:] = self.conv_color(im_array)
         # self.config.check_time("packbits")
 
         # differential update
-        diff_lines = np.where(
-            np.sum((self.img_buff_rgb8 == self.pre_img), axis=1) != self.buff_width
-        )[0]
+        diff_lines = (
+            np.where(
+                np.sum((self.img_buff_rgb8[lines] == self.pre_img[lines]), axis=1)
+                != self.buff_width
+            )[0]
+            + start_line
+        )
         # print("diff ", int(len(diff_lines)/self.size[1]*100), "%")
         # print(" ")
 
@@ -210,27 +245,13 @@ class MipDisplay(Display):
             self.pi.spi_write(self.spi, self.img_buff_rgb8[diff_lines].tobytes())
             time.sleep(0.000006)
             self.pi.write(GPIO_SCS, 0)
-        # put queue
-        elif len(diff_lines) < 270:
-            # await self.draw_queue.put((self.img_buff_rgb8[diff_lines].tobytes()))
-            asyncio.create_task(
-                self.draw_queue.put((self.img_buff_rgb8[diff_lines].tobytes()))
-            )
         else:
-            # for MIP 640x480
-            l = int(len(diff_lines) / 2)
-            # await self.draw_queue.put((self.img_buff_rgb8[diff_lines[0:l]].tobytes()))
-            # await self.draw_queue.put((self.img_buff_rgb8[diff_lines[l:]].tobytes()))
-            asyncio.create_task(
-                self.draw_queue.put((self.img_buff_rgb8[diff_lines[0:l]].tobytes()))
-            )
-            asyncio.create_task(
-                self.draw_queue.put((self.img_buff_rgb8[diff_lines[l:]].tobytes()))
-            )
+            # put queue (written by SPI_MAX_BYTES for MIP 640x480)
+            self.draw_queue.put(diff_lines)
 
     def conv_2bit_color_py(self, im_array):
         return np.packbits(
-            (im_array >= 128).reshape(self.size[1], self.size[0] * 3),
+            (im_array >= 128).reshape(len(im_array), self.size[0] * 3),
             axis=1,
         )
 
@@ -271,7 +292,19 @@ class MipDisplay(Display):
             ]
         ] = 1
 
-        return np.packbits(im_array_bin.reshape(self.size[1], self.size[0] * 3), axis=1)
+        return np.packbits(
+            im_array_bin.reshape(len(im_array), self.size[0] * 3), axis=1
+        )
+
+    def conv_3bit_color_np(self, im_array):
+        # same as conv_3bit_color_py with one comparison of the lines to the
+        # threshold planes (im_array starts at an even line, see line_align)
+        n = len(im_array)
+        bits = self.dithering_bits[:n]
+        np.greater_equal(
+            im_array.reshape(bits.shape), self.dithering_thresholds[:n], out=bits
+        )
+        return np.packbits(bits, axis=1)
 
     def set_brightness(self, b):
         if b == self.brightness:
@@ -289,7 +322,8 @@ class MipDisplay(Display):
                 time.sleep(0.05)
 
     def quit(self):
-        asyncio.create_task(self.draw_queue.put(None))
+        self.draw_queue.close()
+        app_logger.info(f"MIP draw queue: {self.draw_queue.get_metrics()}")
         self.set_brightness(0)
         self.clear()
 
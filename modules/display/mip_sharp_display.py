@@ -5,6 +5,7 @@ import numpy as np
 
 from logger import app_logger
 from .display_core import Display
+from .line_queue import LineQueue
 
 _SENSOR_DISPLAY = False
 try:
@@ -36,6 +37,7 @@ class MipSharpDisplay(Display):
     has_color = False
     has_touch = False
     send = True
+    has_partial_update = True
 
     size = (400, 240)
 
@@ -61,7 +63,7 @@ class MipSharpDisplay(Display):
         self.update(self.pre_img[:, 2:], direct_update=True)
 
     def start_coroutine(self):
-        self.draw_queue = asyncio.Queue()
+        self.draw_queue = LineQueue(self.size[1])
         asyncio.create_task(self.draw_worker())
 
     def init_buffer(self):
@@ -105,9 +107,11 @@ class MipSharpDisplay(Display):
 
     async def draw_worker(self):
         while True:
-            img_bytes = await self.draw_queue.get()
-            if img_bytes is None:
+            rows = await self.draw_queue.get()
+            if rows is None:
                 break
+            # latest lines of the rows
+            img_bytes = self.pre_img[rows].tobytes()
             self.pi.write(GPIO_SCS, 1)
             await asyncio.sleep(0.000006)
             if len(img_bytes):
@@ -116,16 +120,23 @@ class MipSharpDisplay(Display):
             self.pi.spi_write(self.spi, [0x00000000, 0])
             await asyncio.sleep(0.000006)
             self.pi.write(GPIO_SCS, 0)
-            self.draw_queue.task_done()
+            self.draw_queue.task_done(len(img_bytes))
+
+    def update(self, im_array, direct_update, start_line=0):
+        # rows of im_array
+        lines = slice(start_line, start_line + len(im_array))
 
-    def update(self, im_array, direct_update):
         # self.config.check_time("mip_sharp_update start")
-        self.img_buff_rgb8[:, 2:] = ~im_array
+        self.img_buff_rgb8[lines, 2:] = ~im_array
 
         # differential update
-        diff_lines = np.where(
-            np.sum((self.img_buff_rgb8 == self.pre_img), axis=1) != self.buff_width
-        )[0]
+        diff_lines = (
+            np.where(
+                np.sum((self.img_buff_rgb8[lines] == self.pre_img[lines]), axis=1)
+                != self.buff_width
+            )[0]
+            + start_line
+        )
         # print("diff ", int(len(diff_lines)/self.size[1]*100), "%")
         # print(" ")
 
@@ -142,12 +153,11 @@ class MipSharpDisplay(Display):
             time.sleep(0.000006)
             self.pi.write(GPIO_SCS, 0)
         else:
-            asyncio.create_task(
-                self.draw_queue.put((self.img_buff_rgb8[diff_lines].tobytes()))
-            )
+            self.draw_queue.put(diff_lines)
 
     def quit(self):
-        asyncio.create_task(self.draw_queue.put(None))
+        self.draw_queue.close()
+        app_logger.info(f"MIP Sharp draw queue: {self.draw_queue.get_metrics()}")
         self.clear()
 
         self.pi.write(GPIO_DISP, 1)
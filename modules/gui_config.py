@@ -1,6 +1,12 @@
 import oyaml as yaml
 
 
+def compile_item_getter(expression):
+    # G_ITEM_DEF expression to a function of the widget (self in the expression),
+    # instead of eval() of the string at each update
+    return eval(compile(f"lambda self: {expression}", "<G_ITEM_DEF>", "eval"))
+
+
 class GUI_Config:
     G_GUI_INDEX = {
         "boot": 0,
@@ -328,6 +334,7 @@ class GUI_Config:
 
     def __init__(self, layout_file):
         self.layout = {}
+        self.item_getters = {}
 
         try:
             with open(layout_file) as file:
@@ -335,3 +342,15 @@ class GUI_Config:
                 self.layout = yaml.safe_load(text)
         except FileNotFoundError:
             pass
+
+        # items of the layout
+        for screen in self.layout.values():
+            if isinstance(screen, dict) and isinstance(screen.get("LAYOUT"), dict):
+                for name in screen["LAYOUT"]:
+                    if name in self.G_ITEM_DEF:
+                        self.get_item_getter(name)
+
+    def get_item_getter(self, name):
+        if name not in self.item_getters:
+            self.item_getters[name] = compile_item_getter(self.G_ITEM_DEF[name][1])
+        return self.item_getters[name]
@@ -7,6 +7,7 @@ import asyncio
 import numpy as np
 
 from logger import app_logger
+from modules.display.display_core import get_lines_array, get_update_lines
 from modules.gui_config import GUI_Config
 from modules._pyqt import (
     QT_ALIGN_BOTTOM,
@@ -16,6 +17,8 @@ from modules._pyqt import (
     QT_PE_WIDGET,
     QT_STACKINGMODE_STACKONE,
     QT_KEY_RELEASE,
+    QT_EVENT_PAINT,
+    QT_EVENT_CHILD_POLISHED,
     QT_KEY_SPACE,
     QT_KEY_PRESS,
     QT_KEY_BACKTAB,
@@ -85,10 +88,6 @@ class MainWindow(QtWidgets.QMainWindow):
     async def closeEvent(self, event):
         await self.gui.quit()
 
-    # override from QtWidget
-    def paintEvent(self, event):
-        self.gui.draw_display()
-
 
 class GUI_PyQt(QtCore.QObject):
     config = None
@@ -125,6 +124,9 @@ class GUI_PyQt(QtCore.QObject):
     screen_image = None
     remove_bytes = 0
     bufsize = 0
+    # rect of stack_widget repainted since the last draw
+    damage = None
+    grabbing = False
 
     # for dialog
     display_dialog = False
@@ -181,6 +183,8 @@ class GUI_PyQt(QtCore.QObject):
 
         # for draw_display
         self.init_buffer(self.config.display)
+        self.damage = QtCore.QRect()
+        self.install_damage_filter(self.main_window)
 
         self.exec()
 
@@ -438,7 +442,7 @@ class GUI_PyQt(QtCore.QObject):
             else:
                 self.image_format = QT_FORMAT_MONO
 
-            p = self.stack_widget.grab().toImage().convertToFormat(self.image_format)
+            p = self.grab_image()
 
             # PyQt 5.11(Buster) or 5.15(Bullseye)
             qt_version = QtCore.QT_VERSION_STR.split(".")
@@ -454,12 +458,63 @@ class GUI_PyQt(QtCore.QObject):
                 self.screen_shape = (p.height(), int(p.width() / 8))
                 self.remove_bytes = p.bytesPerLine() - int(p.width() / 8)
 
-    def draw_display(self, direct_update=False):
+    def install_damage_filter(self, widget):
+        # on the widget and its descendants only (not the app: all its events)
+        widget.installEventFilter(self)
+        for child in widget.findChildren(QtWidgets.QWidget):
+            child.installEventFilter(self)
+
+    # override from QObject, installed on main_window and its widgets
+    def eventFilter(self, obj, event):
+        # paint events of all the widgets of main_window: the opaque ones (graph
+        # viewports, button box, ...) are not in the paint region of main_window
+        event_type = event.type()
+        if event_type == QT_EVENT_PAINT:
+            if not self.grabbing and obj.window() is self.main_window:
+                self.add_damage(obj, event.rect())
+        elif event_type == QT_EVENT_CHILD_POLISHED:
+            # new widgets are polished before they are painted
+            self.install_damage_filter(event.child())
+        return False
+
+    def add_damage(self, widget, rect):
+        if rect.isEmpty():
+            return
+        rect = QtCore.QRect(
+            self.stack_widget.mapFromGlobal(widget.mapToGlobal(rect.topLeft())),
+            rect.size(),
+        )
+        if self.damage.isEmpty():
+            # drawn once after the paint events of the widgets
+            QtCore.QTimer.singleShot(0, self.draw_damage)
+        self.damage = self.damage.united(rect)
+
+    def draw_damage(self):
+        rect, self.damage = self.damage, QtCore.QRect()
+        self.draw_display(rect=rect)
+
+    def grab_image(self, rect=None):
+        # paint events of the grab are not damages
+        self.grabbing = True
+        try:
+            if rect is None:
+                p = self.stack_widget.grab()
+            else:
+                p = self.stack_widget.grab(rect)
+        finally:
+            self.grabbing = False
+        return p.toImage().convertToFormat(self.image_format)
+
+    def draw_display(self, direct_update=False, rect=None):
         if not self.bufsize:
             return
 
+        if rect is not None and self.config.display.has_partial_update:
+            self.draw_display_lines(direct_update, rect)
+            return
+
         # self.config.check_time("draw_display start")
-        p = self.stack_widget.grab().toImage().convertToFormat(self.image_format)
+        p = self.grab_image()
 
         if self.screen_image is not None and p == self.screen_image:
             return
@@ -485,6 +540,32 @@ class GUI_PyQt(QtCore.QObject):
         self.config.display.update(buf, direct_update)
         # self.config.check_time("draw_display end")
 
+    def draw_display_lines(self, direct_update, rect):
+        # grab and send only the full lines of the damaged rect (stack_widget)
+        rect = rect.intersected(self.stack_widget.rect())
+        if rect.isEmpty():
+            return
+        y0, y1 = get_update_lines(
+            rect.top(),
+            rect.bottom() + 1,
+            self.config.display.line_align,
+            self.screen_shape[0],
+        )
+
+        p = self.grab_image(QtCore.QRect(0, y0, self.stack_widget.width(), y1 - y0))
+        ptr = p.constBits()
+
+        if ptr is None:
+            return
+
+        # the full screen image is outdated
+        self.screen_image = None
+
+        ptr.setsize(p.bytesPerLine() * p.height())
+        buf = get_lines_array(ptr, p.height(), p.bytesPerLine(), self.screen_shape[1:])
+
+        self.config.display.update(buf, direct_update, y0)
+
     def exec(self):
         with self.config.loop:
             self.config.loop.run_forever()
@@ -1 +1,3 @@
+from .fit import FitLoader  # noqa
+from .gpx import GpxLoader  # noqa
 from .tcx import TcxLoader  # noqa
@@ -0,0 +1,294 @@
+import os
+import struct
+from collections import defaultdict
+
+import numpy as np
+
+from logger import app_logger
+
+# base type number -> numpy type (strings and byte arrays are read as raw bytes)
+base_types = {
+    0x00: "u1",  # enum
+    0x01: "i1",  # sint8
+    0x02: "u1",  # uint8
+    0x03: "i2",  # sint16
+    0x04: "u2",  # uint16
+    0x05: "i4",  # sint32
+    0x06: "u4",  # uint32
+    0x07: "S",  # string
+    0x08: "f4",  # float32
+    0x09: "f8",  # float64
+    0x0A: "u1",  # uint8z
+    0x0B: "u2",  # uint16z
+    0x0C: "u4",  # uint32z
+    0x0D: "S",  # byte
+    0x0E: "i8",  # sint64
+    0x0F: "u8",  # uint64
+    0x10: "u8",  # uint64z
+}
+
+# global message numbers
+MESG_LAP = 19
+MESG_RECORD = 20
+MESG_COURSE = 31
+MESG_COURSE_POINT = 32
+
+# course_point type enum, named as the TCX PointType
+course_point_types = [
+    "Generic",
+    "Summit",
+    "Valley",
+    "Water",
+    "Food",
+    "Danger",
+    "Left",
+    "Right",
+    "Straight",
+    "First Aid",
+    "4th Category",
+    "3rd Category",
+    "2nd Category",
+    "1st Category",
+    "Hors Category",
+    "Sprint",
+    "Left Fork",
+    "Right Fork",
+    "Middle Fork",
+    "Slight Left",
+    "Sharp Left",
+    "Slight Right",
+    "Sharp Right",
+    "U-Turn",
+    "Segment Start",
+    "Segment End",
+]
+
+SEMICIRCLES_TO_DEGREES = 180 / 2**31
+
+
+class FitDefinition:
+    def __init__(self, global_num, big_endian, fields, size):
+        self.global_num = global_num
+        self.size = size
+
+        endian = ">" if big_endian else "<"
+        names = []
+        formats = []
+        offsets = []
+        offset = 0
+        for num, field_size, base_type in fields:
+            t = base_types.get(base_type & 0x1F, "S")
+            if t == "S" or np.dtype(t).itemsize != field_size:
+                # strings, arrays and unknown types are not decoded
+                t = f"S{field_size}"
+            else:
+                t = endian + t
+            name = f"f{num}"
+            if name not in names:
+                names.append(name)
+                formats.append(t)
+                offsets.append(offset)
+            offset += field_size
+        # developer fields are skipped with itemsize
+        self.dtype = np.dtype(
+            {"names": names, "formats": formats, "offsets": offsets, "itemsize": size}
+        )
+
+
+class FitLoader:
+    config = None
+
+    @classmethod
+    def read_messages(cls, data, global_nums):
+        # split the data messages of global_nums by definition, keeping the order:
+        # a new run starts each time the definition changes
+        runs = defaultdict(list)
+        definitions = {}
+        offset = 0
+        data_len = len(data)
+
+        while offset + 12 <= data_len:
+            header_size = data[offset]
+            data_size = struct.unpack_from("<I", data, offset + 4)[0]
+            if data[offset + 8 : offset + 12] != b".FIT":
+                raise ValueError("Invalid FIT header")
+            offset += header_size
+            end = min(offset + data_size, data_len)
+
+            while offset < end:
+                header = data[offset]
+                offset += 1
+
+                if header & 0x80:
+                    # compressed timestamp header
+                    local_num = (header >> 5) & 0x03
+                elif header & 0x40:
+                    # definition message
+                    local_num = header & 0x0F
+                    big_endian = data[offset + 1] == 1
+                    global_num = struct.unpack_from(
+                        ">H" if big_endian else "<H", data, offset + 2
+                    )[0]
+                    field_num = data[offset + 4]
+                    offset += 5
+                    fields = [
+                        tuple(data[offset + 3 * i : offset + 3 * i + 3])
+                        for i in range(field_num)
+                    ]
+                    offset += 3 * field_num
+                    size = sum(f[1] for f in fields)
+                    if header & 0x20:
+                        # developer fields
+                        dev_field_num = data[offset]
+                        offset += 1
+                        size += sum(
+                            data[offset + 3 * i + 1] for i in range(dev_field_num)
+                        )
+                        offset += 3 * dev_field_num
+                    definitions[local_num] = FitDefinition(
+                        global_num, big_endian, fields, size
+                    )
+                    continue
+                else:
+                    local_num = header & 0x0F
+
+                definition = definitions[local_num]
+                if definition.global_num in global_nums:
+                    message_runs = runs[definition.global_num]
+                    if not message_runs or message_runs[-1][0] is not definition:
+                        message_runs.append((definition, bytearray()))
+                    message_runs[-1][1].extend(data[offset : offset + definition.size])
+                offset += definition.size
+
+            # skip crc, there may be chained FIT files
+            offset = end + 2
+
+        return runs
+
+    @staticmethod
+    def get_field(runs, name, dtype, invalid):
+        # concatenate a field over the runs of a message, missing fields are set to invalid
+        values = []
+        for definition, raw in runs:
+            n = len(raw) // definition.size
+            if name in definition.dtype.names:
+                v = np.frombuffer(raw, dtype=definition.dtype, count=n)[name]
+                values.append(v.astype(dtype))
+            else:
+                values.append(np.full(n, invalid, dtype=dtype))
+        if not values:
+            return np.array([], dtype=dtype)
+        return np.concatenate(values)
+
+    @staticmethod
+    def get_string_field(runs, name):
+        values = []
+        for definition, raw in runs:
+            n = len(raw) // definition.size
+            if name in definition.dtype.names:
+                v = np.frombuffer(raw, dtype=definition.dtype, count=n)[name]
+                values.extend(
+                    s.split(b"\0")[0].decode("utf-8", errors="replace") for s in v
+                )
+            else:
+                values.extend([""] * n)
+        return np.array(values)
+
+    @staticmethod
+    def fill_invalid(values, valid):
+        # interpolate missing values, or drop the field if none is set
+        if not np.any(valid):
+            return np.array([])
+        if np.all(valid):
+            return values
+        index = np.arange(len(values))
+        return np.interp(index, index[valid], values[valid])
+
+    @classmethod
+    def load_file(cls, file):
+        if not os.path.exists(file):
+            return None, None
+        app_logger.info(f"[{cls.__name__}]: loading {file}")
+
+        course = {
+            "info": {},
+            "latitude": np.array([]),
+            "longitude": np.array([]),
+            "altitude": np.array([]),
+            "distance": np.array([]),
+        }
+        course_points = defaultdict(lambda: np.array([]))
+
+        with open(file, "rb") as f:
+            data = f.read()
+
+        try:
+            runs = cls.read_messages(
+                data, (MESG_LAP, MESG_RECORD, MESG_COURSE, MESG_COURSE_POINT)
+            )
+        except (ValueError, KeyError, IndexError, struct.error) as e:
+            app_logger.error(f"Could not parse course: {e}")
+            return course, course_points
+
+        # course name
+        name = cls.get_string_field(runs[MESG_COURSE], "f5")
+        if len(name) and name[0]:
+            course["info"]["Name"] = name[0]
+
+        # total distance of the first lap, as in TCX
+        total_distance = cls.get_field(runs[MESG_LAP], "f9", "u4", 0xFFFFFFFF)
+        if len(total_distance) and total_distance[0] != 0xFFFFFFFF:
+            course["info"]["DistanceMeters"] = round(total_distance[0] / 100 / 1000, 1)
+
+        # record: points without position are dropped
+        records = runs[MESG_RECORD]
+        latitude = cls.get_field(records, "f0", "i4", 0x7FFFFFFF)
+        longitude = cls.get_field(records, "f1", "i4", 0x7FFFFFFF)
+        cond = (latitude != 0x7FFFFFFF) & (longitude != 0x7FFFFFFF)
+        course["latitude"] = latitude[cond] * SEMICIRCLES_TO_DEGREES
+        course["longitude"] = longitude[cond] * SEMICIRCLES_TO_DEGREES
+
+        # enhanced_altitude first, then altitude [m]
+        altitude = cls.get_field(records, "f78", "u4", 0xFFFFFFFF)[cond]
+        altitude_valid = altitude != 0xFFFFFFFF
+        altitude_16 = cls.get_field(records, "f2", "u4", 0xFFFF)[cond]
+        altitude = np.where(altitude_valid, altitude, altitude_16)
+        altitude_valid |= altitude_16 != 0xFFFF
+        course["altitude"] = cls.fill_invalid(altitude / 5 - 500, altitude_valid)
+
+        # distance [m]
+        distance = cls.get_field(records, "f5", "u4", 0xFFFFFFFF)[cond]
+        course["distance"] = cls.fill_invalid(
+            distance / 100, distance != 0xFFFFFFFF
+        )
+
+        # course points
+        points = runs[MESG_COURSE_POINT]
+        latitude = cls.get_field(points, "f2", "i4", 0x7FFFFFFF)
+        longitude = cls.get_field(points, "f3", "i4", 0x7FFFFFFF)
+        cond = (latitude != 0x7FFFFFFF) & (longitude != 0x7FFFFFFF)
+
+        if np.any(cond):
+            point_type = cls.get_field(points, "f5", "u1", 0xFF)[cond]
+            course_points["name"] = cls.get_string_field(points, "f6")[cond]
+            course_points["latitude"] = latitude[cond] * SEMICIRCLES_TO_DEGREES
+            course_points["longitude"] = longitude[cond] * SEMICIRCLES_TO_DEGREES
+            course_points["type"] = np.array(
+                [
+                    course_point_types[t] if t < len(course_point_types) else "Generic"
+                    for t in point_type
+                ]
+            )
+            course_points["notes"] = np.full(len(point_type), "")
+
+            # course_point distance is set in [km]
+            distance = cls.get_field(points, "f4", "u4", 0xFFFFFFFF)[cond]
+            if np.all(distance != 0xFFFFFFFF):
+                course_points["distance"] = distance / 100 / 1000
+
+            # delete 'Straight' from course points
+            not_straight_cond = course_points["type"] != "Straight"
+            for key in list(course_points):
+                course_points[key] = course_points[key][not_straight_cond]
+
+        return course, course_points
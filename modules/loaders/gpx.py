@@ -0,0 +1,121 @@
+import os
+from array import array
+from collections import defaultdict
+from xml.etree.ElementTree import ParseError, iterparse
+
+import numpy as np
+
+from logger import app_logger
+from modules.utils.geo import get_route_position
+
+
+def local_name(tag):
+    # strip the namespace: {http://www.topografix.com/GPX/1/1}trkpt -> trkpt
+    return tag.rpartition("}")[2]
+
+
+def child_text(elem, name):
+    for child in elem:
+        if local_name(child.tag) == name:
+            return (child.text or "").strip()
+    return ""
+
+
+class GpxLoader:
+    config = None
+
+    @classmethod
+    def load_file(cls, file):
+        if not os.path.exists(file):
+            return None, None
+        app_logger.info(f"[{cls.__name__}]: loading {file}")
+
+        course = {
+            "info": {},
+            "latitude": np.array([]),
+            "longitude": np.array([]),
+            "altitude": np.array([]),
+            # not set in GPX, computed from the points
+            "distance": np.array([]),
+        }
+        course_points = defaultdict(lambda: np.array([]))
+
+        # track points (trkpt) are used, or route points (rtept) if there is no track
+        points = {
+            k: {"latitude": array("d"), "longitude": array("d"), "altitude": array("d")}
+            for k in ("trkpt", "rtept")
+        }
+        waypoints = defaultdict(list)
+
+        try:
+            for _, elem in iterparse(file, events=("end",)):
+                name = local_name(elem.tag)
+
+                if name in points:
+                    p = points[name]
+                    p["latitude"].append(float(elem.get("lat")))
+                    p["longitude"].append(float(elem.get("lon")))
+                    ele = child_text(elem, "ele")
+                    p["altitude"].append(float(ele) if ele else np.nan)
+                    elem.clear()
+                elif name == "wpt":
+                    waypoints["name"].append(child_text(elem, "name"))
+                    waypoints["latitude"].append(float(elem.get("lat")))
+                    waypoints["longitude"].append(float(elem.get("lon")))
+                    waypoints["type"].append(
+                        child_text(elem, "type") or child_text(elem, "sym")
+                    )
+                    waypoints["notes"].append(
+                        child_text(elem, "desc") or child_text(elem, "cmt")
+                    )
+                    elem.clear()
+                elif name in ("trk", "rte", "metadata"):
+                    # first name of the file, as in TCX
+                    if "Name" not in course["info"]:
+                        text = child_text(elem, "name")
+                        if text:
+                            course["info"]["Name"] = text
+                    elem.clear()
+        except (ParseError, TypeError, ValueError) as e:
+            app_logger.error(f"Could not parse course: {e}")
+            return course, course_points
+
+        p = points["trkpt"] if len(points["trkpt"]["latitude"]) else points["rtept"]
+        if len(p["latitude"]):
+            course["latitude"] = np.frombuffer(p["latitude"])
+            course["longitude"] = np.frombuffer(p["longitude"])
+
+            # interpolate missing elevations, or drop the altitude if none is set
+            altitude = np.frombuffer(p["altitude"])
+            valid = ~np.isnan(altitude)
+            if np.all(valid):
+                course["altitude"] = altitude
+            elif np.any(valid):
+                index = np.arange(len(altitude))
+                course["altitude"] = np.interp(index, index[valid], altitude[valid])
+
+        if waypoints:
+            for k, v in waypoints.items():
+                course_points[k] = np.array(v)
+
+            # delete 'Straight' from course points
+            not_straight_cond = course_points["type"] != "Straight"
+            for key in list(course_points):
+                course_points[key] = course_points[key][not_straight_cond]
+
+            # wpt are not ordered along the route (course point distances are set
+            # forward along the track and searched with binary search)
+            if len(course["latitude"]):
+                order = np.argsort(
+                    get_route_position(
+                        course["longitude"],
+                        course["latitude"],
+                        course_points["longitude"],
+                        course_points["latitude"],
+                    ),
+                    kind="stable",
+                )
+                for key in list(course_points):
+                    course_points[key] = course_points[key][order]
+
+        return course, course_points
@@ -1,33 +1,123 @@
 import os
 import re
+from array import array
 from collections import defaultdict
 
 import numpy as np
 
 from logger import app_logger
 
-patterns = {
-    "name": re.compile(r"<Name>(?P<text>[\s\S]*?)</Name>"),
-    "distance_meters": re.compile(
-        r"<DistanceMeters>(?P<text>[\s\S]*?)</DistanceMeters>"
-    ),
-    "track": re.compile(r"<Track>(?P<text>[\s\S]*?)</Track>"),
-    "latitude": re.compile(r"<LatitudeDegrees>(?P<text>[^<]*)</LatitudeDegrees>"),
-    "longitude": re.compile(r"<LongitudeDegrees>(?P<text>[^<]*)</LongitudeDegrees>"),
-    "altitude": re.compile(r"<AltitudeMeters>(?P<text>[^<]*)</AltitudeMeters>"),
-    "distance": re.compile(r"<DistanceMeters>(?P<text>[^<]*)</DistanceMeters>"),
-    "time": re.compile(r"<Time>(?P<text>[^<]*)</Time>"),
-    "course_point": re.compile(r"<CoursePoint>(?P<text>[\s\S]+)</CoursePoint>"),
-    "course_name": re.compile(r"<Name>(?P<text>[^<]*)</Name>"),
-    "course_point_type": re.compile(r"<PointType>(?P<text>[^<]*)</PointType>"),
-    "course_notes": re.compile(r"<Notes>(?P<text>[^<]*)</Notes>"),
-    "course_time": re.compile(r"<Time>(?P<text>[^<]*)</Time>"),
+# single pass tokenizer: section boundaries and the leaf elements we are interested in
+token_pattern = re.compile(
+    r"<(?P<close>/?)(?P<section>Track|CoursePoint)>"
+    r"|<(?P<tag>Name|DistanceMeters|LatitudeDegrees|LongitudeDegrees|AltitudeMeters"
+    r"|Time|PointType|Notes)>(?P<text>[^<]*)</(?P=tag)>"
+)
+
+# leaf element -> key in course/course_points
+track_fields = {
+    "LatitudeDegrees": "latitude",
+    "LongitudeDegrees": "longitude",
+    "AltitudeMeters": "altitude",
+    "DistanceMeters": "distance",
 }
+course_point_fields = {
+    "Name": "name",
+    "LatitudeDegrees": "latitude",
+    "LongitudeDegrees": "longitude",
+    "PointType": "type",
+    "Notes": "notes",
+    "Time": "time",
+}
+course_point_float_fields = ("latitude", "longitude")
 
 
 class TcxLoader:
     config = None
 
+    # characters read at once, the file is never loaded in memory as a whole
+    CHUNK_SIZE = 1 << 20
+
+    @classmethod
+    def parse(cls, file):
+        info = {}
+        track = None
+        course_points = None
+
+        # values of the current section, committed when the section is closed
+        # (the first <Track> and everything between the first <CoursePoint> and the last </CoursePoint>)
+        in_track = False
+        track_done = False
+        track_values = {k: array("d") for k in track_fields.values()}
+        track_values["time"] = []
+        in_course_points = False
+        course_point_values = {
+            k: array("d") if k in course_point_float_fields else []
+            for k in course_point_fields.values()
+        }
+
+        with open(file, "r", encoding="utf-8_sig") as f:
+            buffer = ""
+            while True:
+                chunk = f.read(cls.CHUNK_SIZE)
+                buffer += chunk
+
+                # process up to the last tag opening: text has no "<", so any element before it is complete
+                # and the (maybe incomplete) one starting there is kept for the next chunk
+                cut = len(buffer)
+                if chunk:
+                    cut = buffer.rfind("<", 0, cut - 1)
+                    while cut > 0 and buffer[cut + 1] == "/":
+                        cut = buffer.rfind("<", 0, cut)
+                    cut = max(cut, 0)
+
+                for close, section, tag, text in token_pattern.findall(buffer, 0, cut):
+                    if section == "Track":
+                        if not close:
+                            in_track = not track_done
+                        elif in_track:
+                            in_track = False
+                            track_done = True
+                            track = track_values
+                        continue
+                    elif section == "CoursePoint":
+                        if not close:
+                            in_course_points = True
+                        elif in_course_points:
+                            course_points = {
+                                k: len(v) for k, v in course_point_values.items()
+                            }
+                        continue
+
+                    if in_track:
+                        if tag == "Time":
+                            track_values["time"].append(text.strip())
+                        elif tag in track_fields:
+                            track_values[track_fields[tag]].append(float(text.strip()))
+
+                    if tag == "Name" and "Name" not in info:
+                        info["Name"] = text.strip()
+                    elif tag == "DistanceMeters" and "DistanceMeters" not in info:
+                        info["DistanceMeters"] = round(float(text.strip()) / 1000, 1)
+
+                    if in_course_points and tag in course_point_fields:
+                        key = course_point_fields[tag]
+                        if key in course_point_float_fields:
+                            course_point_values[key].append(float(text.strip()))
+                        else:
+                            course_point_values[key].append(text.strip())
+
+                if not chunk:
+                    break
+                buffer = buffer[cut:]
+
+        if course_points is not None:
+            course_points = {
+                k: v[: course_points[k]] for k, v in course_point_values.items()
+            }
+
+        return info, track, course_points
+
     @classmethod
     def load_file(cls, file):
         if not os.path.exists(file):
@@ -45,90 +135,20 @@ class TcxLoader:
         }
         course_points = defaultdict(lambda: np.array([]))
 
-        with open(file, "r", encoding="utf-8_sig") as f:
-            tcx = f.read()
-
-            match_name = patterns["name"].search(tcx)
-            if match_name:
-                course["info"]["Name"] = match_name.group("text").strip()
-
-            match_distance_meter = patterns["distance_meters"].search(tcx)
-            if match_distance_meter:
-                course["info"]["DistanceMeters"] = round(
-                    float(match_distance_meter.group("text").strip()) / 1000, 1
-                )
-
-            match_track = patterns["track"].search(tcx)
-            if match_track:
-                track = match_track.group("text")
-                course["latitude"] = np.array(
-                    [
-                        float(m.group("text").strip())
-                        for m in patterns["latitude"].finditer(track)
-                    ]
-                )
-                course["longitude"] = np.array(
-                    [
-                        float(m.group("text").strip())
-                        for m in patterns["longitude"].finditer(track)
-                    ]
-                )
-                course["altitude"] = np.array(
-                    [
-                        float(m.group("text").strip())
-                        for m in patterns["altitude"].finditer(track)
-                    ]
-                )
-                course["distance"] = np.array(
-                    [
-                        float(m.group("text").strip())
-                        for m in patterns["distance"].finditer(track)
-                    ]
-                )
-                course["time"] = np.array(
-                    [m.group("text").strip() for m in patterns["time"].finditer(track)]
-                )
+        info, track, course_points_values = cls.parse(file)
+        course["info"].update(info)
 
-            match_course_point = patterns["course_point"].search(tcx)
+        if track is not None:
+            for k in track_fields.values():
+                course[k] = np.frombuffer(track[k]) if len(track[k]) else np.array([])
+            course["time"] = np.array(track["time"])
 
-            if match_course_point:
-                course_point = match_course_point.group("text")
-                course_points["name"] = np.array(
-                    [
-                        m.group("text").strip()
-                        for m in patterns["course_name"].finditer(course_point)
-                    ]
-                )
-                course_points["latitude"] = np.array(
-                    [
-                        float(m.group("text").strip())
-                        for m in patterns["latitude"].finditer(course_point)
-                    ]
-                )
-                course_points["longitude"] = np.array(
-                    [
-                        float(m.group("text").strip())
-                        for m in patterns["longitude"].finditer(course_point)
-                    ]
-                )
-                course_points["type"] = np.array(
-                    [
-                        m.group("text").strip()
-                        for m in patterns["course_point_type"].finditer(course_point)
-                    ]
-                )
-                course_points["notes"] = np.array(
-                    [
-                        m.group("text").strip()
-                        for m in patterns["course_notes"].finditer(course_point)
-                    ]
-                )
-                course_points["time"] = np.array(
-                    [
-                        m.group("text").strip()
-                        for m in patterns["course_time"].finditer(course_point)
-                    ]
-                )
+        if course_points_values is not None:
+            for k, v in course_points_values.items():
+                if k in course_point_float_fields:
+                    course_points[k] = np.frombuffer(v) if len(v) else np.array([])
+                else:
+                    course_points[k] = np.array(v)
 
         valid_course = True
         if len(course["latitude"]) != len(course["longitude"]):
@@ -1,32 +1,52 @@
-def crc16(data):
-    crc = 0
-    crc_table = [
-        0x0000,
-        0xCC01,
-        0xD801,
-        0x1400,
-        0xF001,
-        0x3C00,
-        0x2800,
-        0xE401,
-        0xA001,
-        0x6C00,
-        0x7800,
-        0xB401,
-        0x5000,
-        0x9C01,
-        0x8801,
-        0x4400,
-    ]
-
-    for d in data:
-        byte = d
-        # compute checksum of lower four bits of byte
-        tmp = crc_table[crc & 0xF]
-        crc = (crc >> 4) & 0x0FFF
-        crc = crc ^ tmp ^ crc_table[byte & 0xF]
-        # now compute checksum of upper four bits of byte
-        tmp = crc_table[crc & 0xF]
-        crc = (crc >> 4) & 0x0FFF
-        crc = crc ^ tmp ^ crc_table[(byte >> 4) & 0xF]
+def make_crc_table():
+    # CRC-16 (poly 0x8005, reflected: 0xA001) of each byte value
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+crc_table = make_crc_table()
+
+
+def crc16(data, crc=0):
+    # pass the previous crc to update it with more data
+    table = crc_table
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
     return crc
+
+
+def gf2_matrix_times(mat, vec):
+    total = 0
+    i = 0
+    while vec:
+        if vec & 1:
+            total ^= mat[i]
+        vec >>= 1
+        i += 1
+    return total
+
+
+def gf2_matrix_square(mat):
+    return [gf2_matrix_times(mat, mat[i]) for i in range(16)]
+
+
+def crc16_combine(crc1, crc2, len2):
+    # crc16(data1 + data2) from crc16(data1), crc16(data2) and len(data2),
+    # by applying len2 zero bytes to crc1 (as zlib crc32_combine)
+    if len2 <= 0:
+        return crc1
+
+    # operator for one zero byte: crc -> (crc >> 8) ^ crc_table[crc & 0xFF]
+    op = [crc_table[1 << i] for i in range(8)] + [1 << i for i in range(8)]
+    while len2:
+        if len2 & 1:
+            crc1 = gf2_matrix_times(op, crc1)
+        len2 >>= 1
+        if len2:
+            op = gf2_matrix_square(op)
+    return crc1 ^ crc2
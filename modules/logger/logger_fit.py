@@ -1,9 +1,13 @@
+import os
 import sqlite3
 import struct
 from datetime import datetime, timezone
 
+import numpy as np
+
 from logger import app_logger
 from modules.utils.date import datetime_myparser
+from .cython.crc16_p import crc16, crc16_combine
 from .logger import Logger
 
 # cython
@@ -31,6 +35,8 @@ class config_local:
 
 class LoggerFit(Logger):
     mode = None
+    # records are read and written by chunks of rows, to keep memory constant
+    record_chunk_size = 3600
     epoch_datetime = datetime(1989, 12, 31, 0, 0, 0, 0)
     profile = {
         0: {
@@ -130,7 +136,8 @@ class LoggerFit(Logger):
     }
     local_num = {}
     struct_def_cache = {}
-    # for getSummary (session, lap)
+    # for get_summaries (session, lap): aggregates, or columns taken at the last row of
+    # the lap (max timer) / the session (max total_timer_time)
     sql = {
         # session
         18: {
@@ -181,7 +188,10 @@ class LoggerFit(Logger):
             set_config(config)
 
     def reset(self):
-        self.fit_data = []
+        # file being written (with a placeholder header), crc16 and size of its data
+        self.fd = None
+        self.data_crc = 0
+        self.data_size = 0
         self.local_num = {
             # 0:{"message_num":0,"field":(3,4,1,2,0)}, #file_id (2 is product id)
             0: {"message_num": 0, "field": (3, 4, 1, 0)},  # file_id (7, 5)
@@ -219,8 +229,29 @@ class LoggerFit(Logger):
         #       01234567890123
         return "BbBhHiIsfdBHIs"[base_type_id & 0xF]
 
+    @staticmethod
+    def base_type_dtype_from_id(base_type_id):
+        return [
+            "u1",
+            "i1",
+            "u1",
+            "<i2",
+            "<u2",
+            "<i4",
+            "<u4",
+            "S1",
+            "<f4",
+            "<f8",
+            "u1",
+            "<u2",
+            "<u4",
+            "S1",
+        ][base_type_id & 0xF]
+
     def write(self, out):
-        self.fit_data.append(out)
+        self.fd.write(out)
+        self.data_crc = crc16(out, self.data_crc)
+        self.data_size += len(out)
 
     # referenced by https://opensource.quarq.us/fit_json/
     def write_log(self, filename, start_date, end_date):
@@ -241,9 +272,6 @@ class LoggerFit(Logger):
         return res
 
     def write_log_python(self, filename, start_date, end_date):
-        # make sure crc16 is imported is we resolve to using python code
-        from .cython.crc16_p import crc16
-
         con = sqlite3.connect(
             self.config.G_LOG_DB,
             detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
@@ -251,6 +279,7 @@ class LoggerFit(Logger):
         sqlite3.dbapi2.converters["DATETIME"] = sqlite3.dbapi2.converters["TIMESTAMP"]
         cur = con.cursor()
 
+        self.open_file(filename)
         local_message_num = 0
 
         # file_id
@@ -275,11 +304,11 @@ class LoggerFit(Logger):
         struct_def = self.get_struct_def(local_message_num)
         self.write(struct.pack("<1H1B", 100, 1))
 
+        # lap and session statistics
+        lap_summaries, session_summary = self.get_summaries(cur)
+
         # record
         app_logger.debug("record")
-        # get Max Lap
-        cur.execute("SELECT MAX(lap) FROM BIKECOMPUTER_LOG")
-        max_lap = (cur.fetchone())[0]
 
         # get log by laps
         message_num = 20
@@ -287,83 +316,42 @@ class LoggerFit(Logger):
         record_index = []
 
         for k, v in self.profile[message_num]["field"].items():
-            record_row.append(v[0])
+            if v[0] == "timestamp":
+                # FIT epoch time in SQL, without converting each row to datetime
+                # (truncated to seconds before strftime, which rounds milliseconds)
+                record_row.append(
+                    "CAST(strftime('%%s', substr(timestamp, 1, 19)) AS INTEGER) - %d"
+                    % self.epoch_datetime.replace(tzinfo=timezone.utc).timestamp()
+                )
+            else:
+                record_row.append(v[0])
             record_index.append(k)
         record_row = ",".join(record_row)
 
-        for lap_num in range(max_lap + 1):
+        for lap_num, lap_summary in lap_summaries.items():
             cur.execute(
-                "SELECT COUNT(lap) FROM BIKECOMPUTER_LOG WHERE lap = %s" % (lap_num)
-            )
-            if (cur.fetchone())[0] == 0:
-                continue
-
-            for row in cur.execute(
                 "SELECT %s FROM BIKECOMPUTER_LOG WHERE lap = %s" % (record_row, lap_num)
-            ):
-                # search definition in localNum
-                available_fields = []
-                available_data = []
-                if None in row:
-                    for i, v in enumerate(row):
-                        if v is None:
-                            continue
-                        available_fields.append(record_index[i])
-                        available_data.append(
-                            self.convertValue((v,), message_num, record_index[i])
-                        )
-
-                    # available_fields = [j for i, j in zip(row, record_index) if i is not None]
-                    # available_data = list(map(self.convertValue, [(i,) for i in row if i is not None], [message_num]*len(available_fields), available_fields))
-
-                    # available_data_gen = [(self.convertValue((i,),message_num,j), j) for i, j in zip(row, record_index) if i is not None]
-                    # available_fields = [row[1] for row in available_data_gen]
-                    # available_data = [row[0] for row in available_data_gen]
-                else:
-                    available_fields = record_index
-                    available_data = list(
-                        map(
-                            self.convertValue,
-                            [(i,) for i in row],
-                            [message_num] * len(available_fields),
-                            available_fields,
-                        )
-                    )
-
-                l_num = self.get_local_message_num(message_num, available_fields)
-                l_num_used = True
-                if l_num == -1:
-                    l_num_used = False
-                    # write header if needed
-                    local_message_num = (local_message_num + 1) % 16
-                    self.local_num[local_message_num] = {
-                        "message_num": message_num,
-                        "field": available_fields,
-                    }
-                    self.write_definition(local_message_num)
-                    l_num = local_message_num
-                # write data
-                struct_def = self.get_struct_def(l_num, l_num_used)
-
-                try:
-                    self.write(struct.pack(struct_def, *available_data))
-                except Exception:  # noqa
-                    app_logger.exception("Failed writing struct")
-                    app_logger.error(f"l_num = {l_num} message_num = {message_num}")
-                    app_logger.error(available_fields)
-                    app_logger.error(struct_def)
-                    app_logger.error(available_data)
+            )
+            while True:
+                rows = cur.fetchmany(self.record_chunk_size)
+                if not rows:
+                    break
+                local_message_num = self.write_records(
+                    message_num, record_index, rows, local_message_num
+                )
+                if local_message_num == -1:
                     cur.close()
                     con.close()
+                    self.discard_file()
                     return False
 
             # lap: 19
             app_logger.debug("lap")
-            local_message_num = self.get_summary(19, local_message_num, lap_num, cur)
+            local_message_num = self.get_summary(19, local_message_num, lap_summary)
 
         # session: 18
         app_logger.debug("session")
-        local_message_num = self.get_summary(18, local_message_num, 0, cur)
+        local_message_num = self.get_summary(18, local_message_num, session_summary)
 
         # activity: 34
         app_logger.debug("activity")
@@ -397,12 +385,105 @@ class LoggerFit(Logger):
         cur.close()
         con.close()
 
-        ################
-        # write fit file
-        ################
-        fd = open(filename, "wb")
-        write_data = b"".join(self.fit_data)
+        self.close_file(filename)
+
+        # success
+        self.reset()
+        self.config.G_UPLOAD_FILE = filename
+        return True
+
+    def write_records(self, message_num, fields, rows, local_message_num):
+        # convert the rows by column, then write consecutive rows with the same null
+        # pattern (the same definition) at once
+        columns = list(zip(*rows))
+        values = []
+        valid = []
+        for f_id, column in zip(fields, columns):
+            v, is_valid = self.convert_column(column, message_num, f_id)
+            values.append(v)
+            valid.append(is_valid)
+        valid = np.array(valid).T
+        pattern = valid @ (1 << np.arange(len(fields), dtype=np.int64))
+        starts = np.flatnonzero(np.diff(pattern, prepend=-1))
+        ends = np.append(starts[1:], len(rows))
+
+        for start, end in zip(starts, ends):
+            available = np.flatnonzero(valid[start])
+            if len(available) == len(fields):
+                available_fields = fields
+            else:
+                available_fields = [fields[i] for i in available]
+
+            l_num = self.get_local_message_num(message_num, available_fields)
+            if l_num == -1:
+                # write header if needed
+                local_message_num = (local_message_num + 1) % 16
+                self.local_num[local_message_num] = {
+                    "message_num": message_num,
+                    "field": available_fields,
+                }
+                self.write_definition(local_message_num)
+                l_num = local_message_num
+
+            # write data (header(0x00) and fields of each row)
+            dtype = self.get_record_dtype(l_num)
+            data = np.empty(end - start, dtype=dtype)
+            data["header"] = l_num
+            for i in available:
+                name = f"f{fields[i]}"
+                v = values[i][start:end]
+                if not self.check_range(v, dtype[name]):
+                    app_logger.error("Failed writing struct")
+                    app_logger.error(f"l_num = {l_num} message_num = {message_num}")
+                    app_logger.error(available_fields)
+                    app_logger.error(v)
+                    return -1
+                data[name] = v
+            self.write(data.tobytes())
+
+        return local_message_num
+
+    def convert_column(self, column, message_num, defnum):
+        # same conversion as convertValue, before int(): returns values and valid mask
+        # (timestamp is selected as FIT epoch time)
+        field = self.profile[message_num]["field"][defnum]
+        value = np.array(column, dtype=np.float64)
+        valid = ~np.isnan(value)
+        if field[0] in ["position_lat", "position_long"]:
+            value = value / 180 * (2**31)
+        elif len(field) == 4:  # with scale and offset (altitude)
+            value = field[2] * (value + field[3])
+        elif len(field) == 3:  # with scale
+            value = field[2] * value
+        return np.trunc(value), valid
+
+    @staticmethod
+    def check_range(value, dtype):
+        # struct.pack fails with values out of range
+        if not np.all(np.isfinite(value)):
+            return False
+        if dtype.kind in "iu":
+            info = np.iinfo(dtype)
+            return len(value) == 0 or (
+                value.min() >= info.min and value.max() <= info.max
+            )
+        return True
 
+    def get_record_dtype(self, local_message_num):
+        m_num = self.local_num[local_message_num]["message_num"]
+        dtype = [("header", "u1")]
+        for f_id in self.local_num[local_message_num]["field"]:
+            f_type = self.profile[m_num]["field"][f_id][1]
+            base_type_id = self.base_type_id_from_string(f_type)
+            dtype.append((f"f{f_id}", self.base_type_dtype_from_id(base_type_id)))
+        return np.dtype(dtype)
+
+    def open_file(self, filename):
+        # the file header is written at the end, when the data size is known
+        self.fd = open(filename + ".tmp", "wb")
+        self.fd.write(bytes(14))
+
+    def close_file(self, filename):
         # make file header
         file_header = struct.pack(
             "<BBHI4c",
@@ -410,28 +491,31 @@ class LoggerFit(Logger):
             0x10,  # protocol ver
             # 0x0514, #profile ver
             2014,  # profile ver
-            len(write_data),
+            self.data_size,
             b".",
             b"F",
             b"I",
             b"T",
         )
 
-        # make crc
-        crc = struct.pack("<H", crc16(file_header))
-        fd.write(file_header)
-
-        fd.write(crc)
-        fd.write(write_data)
-        crc = struct.pack("<H", crc16(file_header + crc + write_data))
+        # make crc: header, then the whole file from the crc of the data
+        header_crc = crc16(file_header)
+        crc = struct.pack("<H", header_crc)
+        header_crc = crc16(crc, header_crc)
+        self.fd.write(
+            struct.pack("<H", crc16_combine(header_crc, self.data_crc, self.data_size))
+        )
 
-        fd.write(crc)
-        fd.close()
+        self.fd.seek(0)
+        self.fd.write(file_header)
+        self.fd.write(crc)
+        self.fd.close()
+        os.replace(self.fd.name, filename)
 
-        # success
+    def discard_file(self):
+        self.fd.close()
+        os.remove(self.fd.name)
         self.reset()
-        self.config.G_UPLOAD_FILE = filename
-        return True
 
     def write_definition(self, local_message_num):
         m_num = self.local_num[local_message_num]["message_num"]
@@ -495,43 +579,87 @@ class LoggerFit(Logger):
             value = field[2] * v[0]
         return int(value)
 
-    def get_summary(self, message_num, local_message_num, lap_num, cur):
+    def get_summaries(self, cur):
+        # all the lap and session statistics in one query grouped by lap (through
+        # lap_index), the session aggregates are combined from the laps.
+        # the other columns are taken at the first row with max timer of the lap (l)
+        # and with max total_timer_time of the session (s)
+        columns = []
+        # c0: max timer of the lap
+        aggregates = {"MAX(timer)": 0}
+        for message_num, table in ((19, "l"), (18, "s")):
+            for k, v in self.sql[message_num].items():
+                for expr in v.split(","):
+                    if "(" in expr:
+                        name = "a.c%d" % aggregates.setdefault(expr, len(aggregates))
+                    else:
+                        name = "%s.%s" % (table, expr)
+                    columns.append((message_num, k, expr, name))
+
+        cur.execute(
+            """
+            SELECT a.lap, %s FROM (
+              SELECT lap, %s FROM BIKECOMPUTER_LOG GROUP BY lap
+            ) AS a
+            LEFT JOIN BIKECOMPUTER_LOG AS l ON l.rowid = (
+              SELECT rowid FROM BIKECOMPUTER_LOG
+              WHERE lap = a.lap AND timer = a.c0
+              ORDER BY rowid LIMIT 1
+            )
+            LEFT JOIN BIKECOMPUTER_LOG AS s ON s.rowid = (
+              SELECT rowid FROM BIKECOMPUTER_LOG
+              WHERE total_timer_time = (
+                SELECT MAX(total_timer_time) FROM BIKECOMPUTER_LOG)
+              ORDER BY rowid LIMIT 1
+            )
+            ORDER BY a.lap"""
+            % (
+                ",".join(c[3] for c in columns),
+                ",".join("%s AS c%d" % (k, v) for k, v in aggregates.items()),
+            )
+        )
+
+        lap_summaries = {}
+        session_summary = {}
+        for row in cur.fetchall():
+            lap_num = row[0]
+            summaries = {19: {}, 18: {}}
+            for (message_num, k, expr, _), v in zip(columns, row[1:]):
+                summary = summaries[message_num].setdefault(k, [])
+                if message_num == 18 and k in session_summary:
+                    # combine with the previous laps
+                    x = session_summary[k][len(summary)]
+                    if expr.startswith("MAX("):
+                        v = self.max_value(x, v)
+                    elif expr.startswith("MIN("):
+                        v = self.min_value(x, v)
+                summary.append(v)
+            if lap_num is not None:
+                lap_summaries[lap_num] = summaries[19]
+            session_summary = summaries[18]
+
+        return lap_summaries, session_summary
+
+    @staticmethod
+    def max_value(x1, x2):
+        # as SQL MAX (None is ignored)
+        if x1 is None or (x2 is not None and x2 > x1):
+            return x2
+        return x1
+
+    @staticmethod
+    def min_value(x1, x2):
+        if x1 is None or (x2 is not None and x2 < x1):
+            return x2
+        return x1
+
+    def get_summary(self, message_num, local_message_num, summary):
         # get statistics
         lap_fields = []
         lap_data = []
-        lap_sql = self.sql[message_num]
-        for k in lap_sql.keys():
-            if message_num == 19:  # lap
-                if (
-                    "MAX" not in lap_sql[k]
-                    and "MIN" not in lap_sql[k]
-                    and "AVG" not in lap_sql[k]
-                ):
-                    cur.execute(
-                        "\
-            SELECT %s FROM BIKECOMPUTER_LOG\
-            WHERE LAP = %s AND TIMER = (\
-              SELECT MAX(TIMER) FROM BIKECOMPUTER_LOG WHERE LAP = %s)"
-                        % (lap_sql[k], lap_num, lap_num)
-                    )
-                else:
-                    cur.execute(
-                        "SELECT %s FROM BIKECOMPUTER_LOG WHERE LAP = %s"
-                        % (lap_sql[k], lap_num)
-                    )
-            elif message_num == 18:  # session
-                if "avg_" in lap_sql[k]:
-                    cur.execute(
-                        "\
-            SELECT %s FROM BIKECOMPUTER_LOG\
-            WHERE total_timer_time = (\
-              SELECT MAX(total_timer_time) FROM BIKECOMPUTER_LOG)"
-                        % (lap_sql[k])
-                    )
-                else:
-                    cur.execute("SELECT %s FROM BIKECOMPUTER_LOG" % (lap_sql[k]))
-            v = list((cur.fetchone()))
-            if not len(v) or v[0] is None:
+        for k in self.sql[message_num].keys():
+            v = summary.get(k)
+            if not v or v[0] is None:
                 continue
             lap_fields.append(k)
             lap_data.append(self.convertValue(v, message_num, k))
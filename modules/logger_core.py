@@ -1,3 +1,5 @@
+import json
+import math
 import os
 import sqlite3
 import signal
@@ -5,7 +7,10 @@ import shutil
 import time
 import asyncio
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from operator import attrgetter, itemgetter
 
 import numpy as np
 from crdp import rdp
@@ -15,6 +20,144 @@ from modules.utils.cmd import exec_cmd
 from modules.utils.date import datetime_myparser
 from modules.utils.timer import Timer
 
+# columns of BIKECOMPUTER_LOG after timestamp: (column, source, key)
+# the sources are resolved in LoggerCore.compile_record_row, key is (key, size) for sequence values
+RECORD_SCHEMA = (
+    ("lap", "values", "lap"),
+    ("timer", "values", "count_lap"),
+    ("total_timer_time", "values", "count"),
+    ("elapsed_time", "values", "elapsed_time"),
+    ###
+    ("position_lat", "GPS", "lat"),
+    ("position_long", "GPS", "lon"),
+    ("raw_lat", "GPS", "raw_lat"),
+    ("raw_long", "GPS", "raw_lon"),
+    ("gps_altitude", "GPS", "alt"),
+    ("gps_speed", "GPS", "speed"),
+    ("gps_distance", "GPS", "distance"),
+    ("gps_mode", "GPS", "mode"),
+    ("gps_used_sats", "GPS", "used_sats"),
+    ("gps_total_sats", "GPS", "total_sats"),
+    ("gps_track", "GPS", "track"),
+    ("gps_epx", "GPS", "epx"),
+    ("gps_epy", "GPS", "epy"),
+    ("gps_epv", "GPS", "epv"),
+    ("gps_pdop", "GPS", "pdop"),
+    ("gps_hdop", "GPS", "hdop"),
+    ("gps_vdop", "GPS", "vdop"),
+    ###
+    ("heart_rate", "integrated", "heart_rate"),
+    ("cadence", "integrated", "cadence"),
+    ("distance", "integrated", "distance"),
+    ("speed", "integrated", "speed"),
+    ("power", "integrated", "power"),
+    ("accumulated_power", "integrated", "accumulated_power"),
+    ###
+    ("temperature", "integrated", "temperature"),
+    ("pressure", "I2C", "pressure"),
+    ("humidity", "I2C", "humidity"),
+    ("altitude", "I2C", "altitude"),
+    ("course_altitude", "course_index", "altitude"),
+    ("dem_altitude", "integrated", "dem_altitude"),
+    ("wind_speed", "integrated", "wind_speed"),
+    ("wind_direction", "integrated", "wind_direction"),
+    ("headwind", "integrated", "headwind"),
+    ("heading", "I2C", "heading"),
+    ("motion", "I2C", "m_stat"),
+    ("acc", "I2C", ("acc_graph", 3)),  # acc_x, acc_y, acc_z
+    ("gyro", "I2C", ("gyro_mod", 3)),  # gyro_x, gyro_y, gyro_z
+    ("light", "I2C", "light"),
+    ("cpu_percent", "integrated", "cpu_percent"),
+    ("total_ascent", "I2C", "total_ascent"),
+    ("total_descent", "I2C", "total_descent"),
+    ###
+    ("lap_heart_rate", "lap_avg", "heart_rate"),
+    ("lap_cadence", "lap_avg", "cadence"),
+    ("lap_distance", "lap_avg", "distance"),
+    ("lap_speed", "lap_avg", "speed"),
+    ("lap_power", "lap_avg", "power"),
+    ("lap_accumulated_power", "lap_avg", "accumulated_power"),
+    ("lap_total_ascent", "lap_avg", "total_ascent"),
+    ("lap_total_descent", "lap_avg", "total_descent"),
+    ###
+    ("avg_heart_rate", "entire_avg", "heart_rate"),
+    ("avg_cadence", "entire_avg", "cadence"),
+    ("avg_speed", "entire_avg", "speed"),
+    ("avg_power", "entire_avg", "power"),
+    ###
+    ("lap_cad_count", "lap_cadence", "count"),
+    ("lap_cad_sum", "lap_cadence", "sum"),
+    ("avg_cad_count", "entire_cadence", "count"),
+    ("avg_cad_sum", "entire_cadence", "sum"),
+    ("lap_power_count", "lap_power", "count"),
+    ("lap_power_sum", "lap_power", "sum"),
+    ("avg_power_count", "entire_power", "count"),
+    ("avg_power_sum", "entire_power", "sum"),
+)
+# columns of the last row of a lap, restored by LoggerCore.resume
+RESUME_COLUMNS = (
+    "timestamp",
+    "lap",
+    "timer",
+    "total_timer_time",
+    "distance",
+    "accumulated_power",
+    "total_ascent",
+    "total_descent",
+    "altitude",
+    "position_lat",
+    "position_long",
+    "lap_heart_rate",
+    "lap_cadence",
+    "lap_distance",
+    "lap_speed",
+    "lap_power",
+    "lap_accumulated_power",
+    "lap_total_ascent",
+    "lap_total_descent",
+    "avg_heart_rate",
+    "avg_cadence",
+    "avg_speed",
+    "avg_power",
+    "lap_cad_count",
+    "lap_cad_sum",
+    "lap_power_count",
+    "lap_power_sum",
+    "avg_cad_count",
+    "avg_cad_sum",
+    "avg_power_count",
+    "avg_power_sum",
+)
+RESUME_MAX_KEYS = ("heart_rate", "cadence", "speed", "power")
+RESUME_SNAPSHOT_VERSION = 1
+
+
+def get_resume_value(v):
+    # as read back from sqlite3 (nan is stored as NULL, datetime as text)
+    if v is None:
+        return None
+    if isinstance(v, datetime):
+        return str(v)
+    if isinstance(v, (float, np.floating)):
+        return None if math.isnan(v) else float(v)
+    if isinstance(v, np.integer):
+        return int(v)
+    return v
+
+
+def get_record_size(key):
+    return key[1] if isinstance(key, tuple) else 1
+
+
+def get_record_getter(obj, keys):
+    # itemgetter/attrgetter returns a tuple only with several keys
+    if not keys:
+        return []
+    getter = (itemgetter if isinstance(obj, dict) else attrgetter)(*keys)
+    if len(keys) == 1:
+        return [(obj, lambda o, g=getter: (g(o),))]
+    return [(obj, getter)]
+
 
 class LoggerCore:
     config = None
@@ -25,6 +168,11 @@ class LoggerCore:
     cur = None
     lock = None
     event = None
+    # rows waiting for the next transaction, and the time the first one was queued
+    sql_pending = []
+    sql_pending_time = None
+    # writer thread (G_LOG_DB_THREAD), the database is only written from there
+    sql_executor = None
 
     # for timer
     values = {
@@ -63,29 +211,36 @@ class LoggerCore:
     # for update_track
     pre_lat = None
     pre_lon = None
-
-    # for store_short_log_for_update_track
-    short_log_dist = []
-    short_log_lat = []
-    short_log_lon = []
-    short_log_timestamp = []
-    short_log_limit = 120
-    short_log_available = True
-    short_log_lock = False
+    track_con = None
+    track_chunk_size = 3600
+
+    # for store_short_log_for_update_track: ring buffer of
+    # (dist, lat, lon, timestamp[us]), written by record_log and read by update_track
+    # with their own cursors
+    short_log = None
+    short_log_write = 0
+    short_log_read = 0
+    short_log_limit = 600
+    # unread points dropped (the map was not shown): the track is read from the db
+    short_log_overflow = False
 
     # for debug
     position_log = np.array([])
 
     resume_status = False
     last_timestamp = None
+    # last rows and max values of the log, saved with each batch of rows for resume
+    resume_snapshot = None
+    insert_sql = None
 
     def __init__(self, config):
         super().__init__()
         self.config = config
+        self.sql_pending = []
+        self.short_log = np.full((self.short_log_limit, 4), np.nan)
 
     def start_coroutine(self):
-        self.sql_queue = asyncio.Queue()
-        asyncio.create_task(self.sql_worker())
+        self.start_sql_worker()
         try:
             self.count_up_lock = False
             self.config.loop.add_signal_handler(signal.SIGALRM, self.count_up)
@@ -119,11 +274,10 @@ class LoggerCore:
             self.record_stats["pre_lap_max"][k] = 0
             self.record_stats["lap_max"][k] = 0
             self.record_stats["entire_max"][k] = 0
+        self.compile_record_row()
 
         # sqlite3
-        # usage of sqlite3 is "insert" only, so check_same_thread=False
-        self.con = sqlite3.connect(self.config.G_LOG_DB, check_same_thread=False)
-        self.cur = self.con.cursor()
+        self.connect_db()
         self.init_db()
         self.cur.execute("SELECT timestamp FROM BIKECOMPUTER_LOG LIMIT 1")
         first_row = self.cur.fetchone()
@@ -175,20 +329,165 @@ class LoggerCore:
 
         await self.sql_queue.put(None)
         await asyncio.sleep(0.1)
+        self.flush_sql()
+        if self.sql_executor is not None:
+            self.sql_executor.shutdown()
+            self.sql_executor = None
+        self.close_track_db()
         self.cur.close()
         self.con.close()
 
     def remove_handler(self):
         self.config.loop.remove_signal_handler(signal.SIGALRM)
 
+    def start_sql_worker(self):
+        # bounded: record_log waits (without blocking the loop) if the writer falls behind
+        self.sql_queue = asyncio.Queue(maxsize=self.config.G_LOG_DB_QUEUE_SIZE)
+        if self.config.G_LOG_DB_THREAD:
+            # a single thread keeps the writes in order
+            self.sql_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="sql_writer"
+            )
+        return asyncio.create_task(self.sql_worker())
+
     async def sql_worker(self):
+        # rows are grouped in one transaction every G_LOG_DB_COMMIT_INTERVAL seconds
+        # or G_LOG_DB_COMMIT_ROWS rows
         while True:
-            sql = await self.sql_queue.get()
+            timeout = None
+            if self.sql_pending:
+                timeout = max(
+                    self.sql_pending_time
+                    + self.config.G_LOG_DB_COMMIT_INTERVAL
+                    - time.monotonic(),
+                    0,
+                )
+            try:
+                sql = await asyncio.wait_for(self.sql_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                await self.commit_sql()
+                continue
             if sql is None:
+                await self.commit_sql()
                 break
-            self.cur.execute(*sql)
-            self.con.commit()
+            self.add_sql(sql)
             self.sql_queue.task_done()
+            if len(self.sql_pending) >= self.config.G_LOG_DB_COMMIT_ROWS:
+                await self.commit_sql()
+
+    def add_sql(self, sql):
+        if not self.sql_pending:
+            self.sql_pending_time = time.monotonic()
+        self.sql_pending.append(sql)
+
+    def pop_sql(self):
+        sql_rows = self.sql_pending
+        self.sql_pending = []
+        self.sql_pending_time = None
+        return sql_rows
+
+    def execute_sql(self, sql_rows):
+        if not sql_rows:
+            return
+        # consecutive rows of the same statement are inserted at once
+        for statement, rows in groupby(sql_rows, key=lambda sql: sql[0]):
+            rows = [sql[1] for sql in rows]
+            self.cur.executemany(statement, rows)
+            if statement == self.insert_sql and self.resume_snapshot is not None:
+                self.update_resume_snapshot(rows)
+        if self.resume_snapshot is not None:
+            # in the same transaction, so that the snapshot matches the rows
+            self.save_resume_snapshot()
+        self.con.commit()
+
+    @staticmethod
+    def init_resume_snapshot():
+        return {
+            "version": RESUME_SNAPSHOT_VERSION,
+            "start": None,
+            "last": None,
+            "max": dict.fromkeys(RESUME_MAX_KEYS),
+            "lap_max": dict.fromkeys(RESUME_MAX_KEYS),
+            "pre_lap": None,
+            "pre_lap_max": dict.fromkeys(RESUME_MAX_KEYS),
+        }
+
+    def update_resume_snapshot(self, rows):
+        # same values as the queries of scan_resume_snapshot, from the inserted rows
+        snapshot = self.resume_snapshot
+        index = {k: self.record_columns.index(k) for k in RESUME_COLUMNS}
+        max_index = {k: self.record_columns.index(k) for k in RESUME_MAX_KEYS}
+        for row in rows:
+            last = {k: get_resume_value(row[i]) for k, i in index.items()}
+            if snapshot["last"] is not None and last["lap"] != snapshot["last"]["lap"]:
+                snapshot["pre_lap"] = snapshot["last"]
+                snapshot["pre_lap_max"] = snapshot["lap_max"]
+                snapshot["lap_max"] = dict.fromkeys(RESUME_MAX_KEYS)
+            snapshot["last"] = last
+            if snapshot["start"] is None or last["timestamp"] < snapshot["start"]:
+                snapshot["start"] = last["timestamp"]
+            for k, i in max_index.items():
+                v = get_resume_value(row[i])
+                if v is None:
+                    continue
+                for m in (snapshot["max"], snapshot["lap_max"]):
+                    if m[k] is None or m[k] < v:
+                        m[k] = v
+
+    def save_resume_snapshot(self):
+        self.cur.execute("SELECT MAX(rowid) FROM BIKECOMPUTER_LOG")
+        last_rowid = self.cur.fetchone()[0]
+        self.cur.execute(
+            "INSERT OR REPLACE INTO BIKECOMPUTER_RESUME VALUES(0, ?, ?)",
+            (last_rowid, json.dumps(self.resume_snapshot)),
+        )
+
+    def load_resume_snapshot(self):
+        # None if missing or stale (rows written without updating the snapshot)
+        self.cur.execute("SELECT last_rowid, snapshot FROM BIKECOMPUTER_RESUME")
+        res = self.cur.fetchone()
+        if res is None:
+            return None
+        self.cur.execute("SELECT MAX(rowid) FROM BIKECOMPUTER_LOG")
+        if res[0] != self.cur.fetchone()[0]:
+            return None
+        snapshot = json.loads(res[1])
+        if snapshot.get("version") != RESUME_SNAPSHOT_VERSION or not snapshot["last"]:
+            return None
+        return snapshot
+
+    async def commit_sql(self):
+        sql_rows = self.pop_sql()
+        if not sql_rows:
+            return
+        if self.sql_executor is not None:
+            await asyncio.wrap_future(
+                self.sql_executor.submit(self.execute_sql, sql_rows)
+            )
+        else:
+            self.execute_sql(sql_rows)
+
+    def flush_sql(self):
+        # write the queued rows now and wait for them (before closing or reading the database)
+        while not self.sql_queue.empty():
+            sql = self.sql_queue.get_nowait()
+            self.sql_queue.task_done()
+            if sql is not None:
+                self.add_sql(sql)
+        sql_rows = self.pop_sql()
+        if self.sql_executor is not None:
+            # also waits for the rows being written by the thread
+            self.sql_executor.submit(self.execute_sql, sql_rows).result()
+        else:
+            self.execute_sql(sql_rows)
+
+    def connect_db(self):
+        # usage of sqlite3 is "insert" only, so check_same_thread=False
+        self.con = sqlite3.connect(self.config.G_LOG_DB, check_same_thread=False)
+        # readers (course track, log export) do not block the writer, and commits are appended to the WAL
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute(f"PRAGMA synchronous={self.config.G_LOG_DB_SYNCHRONOUS}")
+        self.cur = self.con.cursor()
 
     def init_db(self):
         self.create_table_sql = """CREATE TABLE BIKECOMPUTER_LOG(
@@ -281,8 +580,7 @@ class LoggerCore:
                 f"The layout of {self.config.G_LOG_DB} is changed to {log_db_moved}"
             )
 
-            self.con = sqlite3.connect(self.config.G_LOG_DB, check_same_thread=False)
-            self.cur = self.con.cursor()
+            self.connect_db()
             replace_flg = True
         if res is None or replace_flg:
             self.con.execute(self.create_table_sql)
@@ -294,6 +592,14 @@ class LoggerCore:
                 "CREATE INDEX timestamp_index ON BIKECOMPUTER_LOG(timestamp)"
             )
             self.con.commit()
+        self.cur.execute(
+            "CREATE TABLE IF NOT EXISTS BIKECOMPUTER_RESUME("
+            "id INTEGER PRIMARY KEY, last_rowid INTEGER, snapshot TEXT)"
+        )
+        self.con.commit()
+        self.record_columns = [
+            c[1] for c in self.cur.execute("PRAGMA table_info(BIKECOMPUTER_LOG)")
+        ]
 
     def count_up(self):
         self.calc_gross()
@@ -444,6 +750,8 @@ class LoggerCore:
         self.config.display.screen_flash_long()
 
         # close db connect
+        self.flush_sql()
+        self.close_track_db()
         self.cur.close()
         self.con.close()
 
@@ -488,9 +796,7 @@ class LoggerCore:
             self.reset()
 
             # restart db connect
-            # usage of sqlite3 is "insert" only, so check_same_thread=False
-            self.con = sqlite3.connect(self.config.G_LOG_DB, check_same_thread=False)
-            self.cur = self.con.cursor()
+            self.connect_db()
             self.init_db()
 
         # reset temporary values
@@ -522,6 +828,7 @@ class LoggerCore:
             for k2 in ["cadence", "power"]:
                 self.average[k1][k2]["count"] = 0
                 self.average[k1][k2]["sum"] = 0
+        self.resume_snapshot = self.init_resume_snapshot()
 
     def reset_course(self, delete_course_file=False, replace=False):
         self.config.gui.reset_course()
@@ -537,182 +844,11 @@ class LoggerCore:
         # get present value
         value = self.sensor.values["integrated"]
 
-        # update lap stats if value is not Null
-        for k, v in value.items():
-            # skip when null value(np.nan)
-            if k not in [
-                "heart_rate",
-                "cadence",
-                "speed",
-                "power",
-                "distance",
-                "accumulated_power",
-            ]:
-                continue
-            if np.isnan(v):
-                continue
-            # get average
-            if k in ["heart_rate", "cadence", "speed", "power"]:
-                x1 = t1 = 0  # for lap_avg = x1 / t1
-                x2 = t2 = 0  # for entire_ave = x2 / t2
-
-                # heart_rate : hr_sum / t
-                # speed : distance / t
-                # power : power_sum / t (exclude/include zero)
-                # cadence : cad_sum / t (exclude/include zero)
-                if k in ["heart_rate"]:
-                    x1 = (
-                        self.record_stats["lap_avg"][k] * (self.values["count_lap"] - 1)
-                        + v
-                    )
-                    t1 = self.values["count_lap"]
-                    x2 = (
-                        self.record_stats["entire_avg"][k] * (self.values["count"] - 1)
-                        + v
-                    )
-                    t2 = self.values["count"]
-                elif k in ["speed"]:
-                    x1 = self.record_stats["lap_avg"]["distance"]  # [m]
-                    t1 = self.values["count_lap"]  # [s]
-                    x2 = value["distance"]  # [m]
-                    t2 = self.values["count"]  # [s]
-                # average including/excluding zero (cadence, power)
-                elif k in ["cadence", "power"]:
-                    if v == 0 and not self.config.G_AVERAGE_INCLUDING_ZERO[k]:
-                        continue
-                    for l_e in ["lap", "entire"]:
-                        self.average[l_e][k]["sum"] += v
-                        self.average[l_e][k]["count"] += 1
-                    x1 = self.average["lap"][k]["sum"]
-                    t1 = self.average["lap"][k]["count"]
-                    x2 = self.average["entire"][k]["sum"]
-                    t2 = self.average["entire"][k]["count"]
-                # update lap average
-                if t1 > 0:
-                    self.record_stats["lap_avg"][k] = x1 / t1
-                if t2 > 0:
-                    self.record_stats["entire_avg"][k] = x2 / t2
-            # get lap distance, accumulated_power
-            elif k in ["distance", "accumulated_power"]:
-                # v is valid value
-                x1 = self.record_stats["pre_lap_max"][k]
-                if np.isnan(x1):
-                    x1 = 0
-                self.record_stats["lap_avg"][k] = v - x1
-
-            # update max
-            if k in ["heart_rate", "cadence", "speed", "power"]:
-                if self.record_stats["lap_max"][k] < v:
-                    self.record_stats["lap_max"][k] = v
-                if self.record_stats["entire_max"][k] < v:
-                    self.record_stats["entire_max"][k] = v
-            elif k in ["distance", "accumulated_power"]:
-                self.record_stats["lap_max"][k] = v
-
-        # get lap total_ascent, total_descent
-        for k in ["total_ascent", "total_descent"]:
-            x1 = self.record_stats["pre_lap_max"][k]
-            x2 = self.sensor.values["I2C"][k]
-            self.record_stats["lap_avg"][k] = x2 - x1
-            self.record_stats["lap_max"][k] = x2
+        self.update_record_stats(value)
 
         ## SQLite
         now_time = datetime.utcnow()
-        # self.cur.execute("""\
-        sql = (
-            """\
-      INSERT INTO BIKECOMPUTER_LOG VALUES(\
-        ?,?,?,?,?,\
-        ?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,\
-        ?,?,?,?,?,?,\
-        ?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,\
-        ?,?,?,?,?,?,?,?,\
-        ?,?,?,?,\
-        ?,?,?,?,?,?,?,?\
-      )""",
-            (
-                now_time,
-                self.values["lap"],
-                self.values["count_lap"],
-                self.values["count"],
-                self.values["elapsed_time"],
-                ###
-                self.sensor.values["GPS"]["lat"],
-                self.sensor.values["GPS"]["lon"],
-                self.sensor.values["GPS"]["raw_lat"],
-                self.sensor.values["GPS"]["raw_lon"],
-                self.sensor.values["GPS"]["alt"],
-                self.sensor.values["GPS"]["speed"],
-                self.sensor.values["GPS"]["distance"],
-                self.sensor.values["GPS"]["mode"],
-                self.sensor.values["GPS"]["used_sats"],
-                self.sensor.values["GPS"]["total_sats"],
-                self.sensor.values["GPS"]["track"],
-                self.sensor.values["GPS"]["epx"],
-                self.sensor.values["GPS"]["epy"],
-                self.sensor.values["GPS"]["epv"],
-                self.sensor.values["GPS"]["pdop"],
-                self.sensor.values["GPS"]["hdop"],
-                self.sensor.values["GPS"]["vdop"],
-                ###
-                value["heart_rate"],
-                value["cadence"],
-                value["distance"],
-                value["speed"],
-                value["power"],
-                value["accumulated_power"],
-                ###
-                value["temperature"],
-                self.sensor.values["I2C"]["pressure"],
-                self.sensor.values["I2C"]["humidity"],
-                self.sensor.values["I2C"]["altitude"],
-                self.course.index.altitude,
-                value["dem_altitude"],
-                value["wind_speed"],
-                value["wind_direction"],
-                value["headwind"],
-                self.sensor.values["I2C"]["heading"],
-                self.sensor.values["I2C"]["m_stat"],
-                # self.sensor.values['I2C']['acc'][0],
-                # self.sensor.values['I2C']['acc'][1],
-                # self.sensor.values['I2C']['acc'][2],
-                self.sensor.values["I2C"]["acc_graph"][0],
-                self.sensor.values["I2C"]["acc_graph"][1],
-                self.sensor.values["I2C"]["acc_graph"][2],
-                self.sensor.values["I2C"]["gyro_mod"][0],
-                self.sensor.values["I2C"]["gyro_mod"][1],
-                self.sensor.values["I2C"]["gyro_mod"][2],
-                self.sensor.values["I2C"]["light"],
-                value["cpu_percent"],
-                self.sensor.values["I2C"]["total_ascent"],
-                self.sensor.values["I2C"]["total_descent"],
-                ###
-                self.record_stats["lap_avg"]["heart_rate"],
-                self.record_stats["lap_avg"]["cadence"],
-                self.record_stats["lap_avg"]["distance"],
-                self.record_stats["lap_avg"]["speed"],
-                self.record_stats["lap_avg"]["power"],
-                self.record_stats["lap_avg"]["accumulated_power"],
-                self.record_stats["lap_avg"]["total_ascent"],
-                self.record_stats["lap_avg"]["total_descent"],
-                ###
-                self.record_stats["entire_avg"]["heart_rate"],
-                self.record_stats["entire_avg"]["cadence"],
-                self.record_stats["entire_avg"]["speed"],
-                self.record_stats["entire_avg"]["power"],
-                ###
-                self.average["lap"]["cadence"]["count"],
-                self.average["lap"]["cadence"]["sum"],
-                self.average["entire"]["cadence"]["count"],
-                self.average["entire"]["cadence"]["sum"],
-                self.average["lap"]["power"]["count"],
-                self.average["lap"]["power"]["sum"],
-                self.average["entire"]["power"]["count"],
-                self.average["entire"]["power"]["sum"],
-            ),
-        )
-        # self.con.commit()
-        await self.sql_queue.put((sql))
+        await self.sql_queue.put((self.insert_sql, self.get_record_row(now_time)))
 
         self.store_short_log_for_update_track(
             value["distance"],
@@ -725,6 +861,123 @@ class LoggerCore:
         if self.config.G_THINGSBOARD_API["STATUS"]:
             self.config.api.send_livetrack_data(quick_send=False)
 
+    def update_record_stats(self, value):
+        count_lap = self.values["count_lap"]
+        count = self.values["count"]
+        lap_avg = self.record_stats["lap_avg"]
+        entire_avg = self.record_stats["entire_avg"]
+        lap_max = self.record_stats["lap_max"]
+        entire_max = self.record_stats["entire_max"]
+
+        # update lap stats if value is not Null, in the order of the integrated values
+        # (speed uses the lap distance of the previous record)
+        for k in ("heart_rate", "speed", "cadence", "power"):
+            v = value[k]
+            # skip when null value(np.nan)
+            if math.isnan(v):
+                continue
+
+            # get average
+            # heart_rate : hr_sum / t
+            # speed : distance / t
+            # power : power_sum / t (exclude/include zero)
+            # cadence : cad_sum / t (exclude/include zero)
+            if k == "heart_rate":
+                x1 = lap_avg[k] * (count_lap - 1) + v
+                t1 = count_lap
+                x2 = entire_avg[k] * (count - 1) + v
+                t2 = count
+            elif k == "speed":
+                x1 = lap_avg["distance"]  # [m]
+                t1 = count_lap  # [s]
+                x2 = value["distance"]  # [m]
+                t2 = count  # [s]
+            # average including/excluding zero (cadence, power)
+            else:
+                if v == 0 and not self.config.G_AVERAGE_INCLUDING_ZERO[k]:
+                    continue
+                lap_average = self.average["lap"][k]
+                entire_average = self.average["entire"][k]
+                lap_average["sum"] += v
+                lap_average["count"] += 1
+                entire_average["sum"] += v
+                entire_average["count"] += 1
+                x1 = lap_average["sum"]
+                t1 = lap_average["count"]
+                x2 = entire_average["sum"]
+                t2 = entire_average["count"]
+            # update lap average
+            if t1 > 0:
+                lap_avg[k] = x1 / t1
+            if t2 > 0:
+                entire_avg[k] = x2 / t2
+
+            # update max
+            if lap_max[k] < v:
+                lap_max[k] = v
+            if entire_max[k] < v:
+                entire_max[k] = v
+
+        # get lap distance, accumulated_power
+        for k in ("distance", "accumulated_power"):
+            v = value[k]
+            if math.isnan(v):
+                continue
+            # v is valid value
+            x1 = self.record_stats["pre_lap_max"][k]
+            if np.isnan(x1):
+                x1 = 0
+            lap_avg[k] = v - x1
+            lap_max[k] = v
+
+        # get lap total_ascent, total_descent
+        for k in ("total_ascent", "total_descent"):
+            x1 = self.record_stats["pre_lap_max"][k]
+            x2 = self.sensor.values["I2C"][k]
+            lap_avg[k] = x2 - x1
+            lap_max[k] = x2
+
+    def compile_record_row(self):
+        # resolve RECORD_SCHEMA once: consecutive columns of the same source are fetched
+        # with a single getter call per tick (the source objects are never reassigned)
+        sources = {
+            "values": self.values,
+            "GPS": self.sensor.values["GPS"],
+            "I2C": self.sensor.values["I2C"],
+            "integrated": self.sensor.values["integrated"],
+            "course_index": self.course.index,
+            "lap_avg": self.record_stats["lap_avg"],
+            "entire_avg": self.record_stats["entire_avg"],
+            "lap_cadence": self.average["lap"]["cadence"],
+            "entire_cadence": self.average["entire"]["cadence"],
+            "lap_power": self.average["lap"]["power"],
+            "entire_power": self.average["entire"]["power"],
+        }
+        getters = []
+        for source, columns in groupby(RECORD_SCHEMA, key=lambda c: c[1]):
+            obj = sources[source]
+            keys = []
+            for _, _, key in columns:
+                if isinstance(key, tuple):
+                    # sequence values (reassigned by the sensor) are sliced every tick
+                    getters.extend(get_record_getter(obj, keys))
+                    getters.append((obj, lambda o, k=key[0], n=key[1]: o[k][:n]))
+                    keys = []
+                else:
+                    keys.append(key)
+            getters.extend(get_record_getter(obj, keys))
+        self.record_row_getters = getters
+
+        self.insert_sql = "INSERT INTO BIKECOMPUTER_LOG VALUES({})".format(
+            ",".join(["?"] * (sum(get_record_size(c[2]) for c in RECORD_SCHEMA) + 1))
+        )
+
+    def get_record_row(self, now_time):
+        row = [now_time]
+        for obj, getter in self.record_row_getters:
+            row.extend(getter(obj))
+        return tuple(row)
+
     def calc_gross(self):
         # elapsed_time
         if self.values["start_time"] is None:
@@ -771,82 +1024,107 @@ class LoggerCore:
         self.cur.execute("SELECT count(*) FROM BIKECOMPUTER_LOG")
         res = self.cur.fetchone()
         if res[0] == 0:
+            self.resume_snapshot = self.init_resume_snapshot()
             return
 
         app_logger.info("resume existing rides...")
-        row_all = "\
-      timestamp,lap,timer,total_timer_time,\
-      distance,accumulated_power,total_ascent,total_descent,altitude,\
-      position_lat, position_long, \
-      lap_heart_rate,lap_cadence,lap_distance,lap_speed,lap_power,\
-      lap_accumulated_power,lap_total_ascent,lap_total_descent,\
-      avg_heart_rate,avg_cadence,avg_speed,avg_power,\
-      lap_cad_count,lap_cad_sum,lap_power_count,lap_power_sum,\
-      avg_cad_count,avg_cad_sum,avg_power_count,avg_power_sum"
-        self.cur.execute(
-            "\
-      SELECT %s FROM BIKECOMPUTER_LOG\
-      WHERE total_timer_time = (SELECT MAX(total_timer_time) FROM BIKECOMPUTER_LOG) \
-      AND lap = (SELECT MAX(lap) FROM BIKECOMPUTER_LOG)"
-            % (row_all)
-        )
-        value = list(self.cur.fetchone())
-        (
-            self.last_timestamp,
-            self.values["lap"],
-            self.values["count_lap"],
-            self.values["count"],
-        ) = value[0:4]
+        snapshot = self.load_resume_snapshot()
+        if snapshot is None:
+            app_logger.info("resume snapshot is not available, scanning the log")
+            snapshot = self.scan_resume_snapshot()
+        self.resume_snapshot = snapshot
+
+        last = snapshot["last"]
+        self.last_timestamp = last["timestamp"]
+        self.values["lap"] = last["lap"]
+        self.values["count_lap"] = last["timer"]
+        self.values["count"] = last["total_timer_time"]
 
         sn = self.sensor.values["integrated"]
         i2c = self.sensor.values["I2C"]
         gps = self.sensor.values["GPS"]
-        sn["distance"] += value[4]
-        sn["accumulated_power"] += value[5]
-        i2c["total_ascent"] += value[6]
-        i2c["total_descent"] += value[7]
+        sn["distance"] += last["distance"]
+        sn["accumulated_power"] += last["accumulated_power"]
+        i2c["total_ascent"] += last["total_ascent"]
+        i2c["total_descent"] += last["total_descent"]
         # None -> np.nan
         (i2c["pre_altitude"], gps["pre_lat"], gps["pre_lon"]) = np.array(
-            value[8:11], dtype=np.float32
+            [last["altitude"], last["position_lat"], last["position_long"]],
+            dtype=np.float32,
         )
 
-        index = 11
         for k in self.lap_keys:
-            self.record_stats["lap_avg"][k] = value[index]
-            index += 1
+            self.record_stats["lap_avg"][k] = last[f"lap_{k}"]
         for k in ["heart_rate", "cadence", "speed", "power"]:
-            self.record_stats["entire_avg"][k] = value[index]
-            index += 1
-        for k1 in ["lap", "entire"]:
-            for k2 in ["cadence", "power"]:
+            self.record_stats["entire_avg"][k] = last[f"avg_{k}"]
+        for k1, prefix in [("lap", "lap"), ("entire", "avg")]:
+            for k2, name in [("cadence", "cad"), ("power", "power")]:
                 for k3 in ["count", "sum"]:
-                    self.average[k1][k2][k3] = value[index]
-                    index += 1
-        # print(self.average)
+                    self.average[k1][k2][k3] = last[f"{prefix}_{name}_{k3}"]
+
+        # get max
+        for k in RESUME_MAX_KEYS:
+            self.record_stats["entire_max"][k] = 0
+            if snapshot["max"][k] is not None:
+                self.record_stats["entire_max"][k] = snapshot["max"][k]
+
+        # get lap max
+        for k in RESUME_MAX_KEYS:
+            self.record_stats["lap_max"][k] = 0
+            if snapshot["lap_max"][k] is not None:
+                self.record_stats["lap_max"][k] = snapshot["lap_max"][k]
+
+        # get pre lap
+        pre_lap = snapshot["pre_lap"]
+        if last["lap"] >= 1 and pre_lap is not None:
+            for k in ["distance", "accumulated_power", "total_ascent", "total_descent"]:
+                self.record_stats["pre_lap_max"][k] = pre_lap[k]
+            for k in self.lap_keys:
+                self.record_stats["pre_lap_avg"][k] = pre_lap[f"lap_{k}"]
+            # max
+            for k in RESUME_MAX_KEYS:
+                self.record_stats["pre_lap_max"][k] = snapshot["pre_lap_max"][k]
+
+        # start_time
+        if snapshot["start"] is not None:
+            self.values["start_time"] = int(
+                datetime_myparser(snapshot["start"]).timestamp() - 1
+            )
+
+        # if not self.config.G_IS_RASPI and self.config.G_DUMMY_OUTPUT:
+        if self.config.G_DUMMY_OUTPUT:
+            self.cur.execute(
+                "SELECT position_lat,position_long,distance,gps_track FROM BIKECOMPUTER_LOG"
+            )
+            self.position_log = np.array(self.cur.fetchall())
+
+    def scan_resume_snapshot(self):
+        # resume_snapshot from the whole log
+        snapshot = self.init_resume_snapshot()
+        row_all = ",".join(RESUME_COLUMNS)
+        self.cur.execute(
+            "\
+      SELECT %s FROM BIKECOMPUTER_LOG\
+      WHERE total_timer_time = (SELECT MAX(total_timer_time) FROM BIKECOMPUTER_LOG) \
+      AND lap = (SELECT MAX(lap) FROM BIKECOMPUTER_LOG)"
+            % (row_all)
+        )
+        snapshot["last"] = dict(zip(RESUME_COLUMNS, self.cur.fetchone()))
 
         # get lap
         self.cur.execute("SELECT MAX(LAP) FROM BIKECOMPUTER_LOG")
         max_lap = (self.cur.fetchone())[0]
 
         # get max
-        max_row = "MAX(heart_rate), MAX(cadence), MAX(speed), MAX(power)"
-        main_item = ["heart_rate", "cadence", "speed", "power"]
+        max_row = ",".join(f"MAX({k})" for k in RESUME_MAX_KEYS)
         self.cur.execute("SELECT %s FROM BIKECOMPUTER_LOG" % (max_row))
-        max_value = list(self.cur.fetchone())
-        for i, k in enumerate(main_item):
-            self.record_stats["entire_max"][k] = 0
-            if max_value[i] is not None:
-                self.record_stats["entire_max"][k] = max_value[i]
+        snapshot["max"] = dict(zip(RESUME_MAX_KEYS, self.cur.fetchone()))
 
         # get lap max
         self.cur.execute(
             "SELECT %s FROM BIKECOMPUTER_LOG WHERE LAP = %s" % (max_row, max_lap)
         )
-        max_value = list(self.cur.fetchone())
-        for i, k in enumerate(main_item):
-            self.record_stats["lap_max"][k] = 0
-            if max_value[i] is not None:
-                self.record_stats["lap_max"][k] = max_value[i]
+        snapshot["lap_max"] = dict(zip(RESUME_MAX_KEYS, self.cur.fetchone()))
 
         # get pre lap
         if max_lap >= 1:
@@ -858,75 +1136,147 @@ class LoggerCore:
           WHERE LAP = %s)"
                 % (row_all, max_lap - 1, max_lap - 1)
             )
-            value = list(self.cur.fetchone())
-
-            index = 4
-            for k in ["distance", "accumulated_power", "total_ascent", "total_descent"]:
-                self.record_stats["pre_lap_max"][k] = value[index]
-                index += 1
-            index += 3
-            for k in self.lap_keys:
-                self.record_stats["pre_lap_avg"][k] = value[index]
-                index += 1
+            row = self.cur.fetchone()
+            if row is not None:
+                snapshot["pre_lap"] = dict(zip(RESUME_COLUMNS, row))
             # max
             self.cur.execute(
                 "SELECT %s FROM BIKECOMPUTER_LOG WHERE LAP = %s"
                 % (max_row, max_lap - 1)
             )
-            max_value = list(self.cur.fetchone())
-            for i, k in enumerate(main_item):
-                self.record_stats["pre_lap_max"][k] = max_value[i]
-        # print(self.record_stats)
-        # print(self.average)
+            snapshot["pre_lap_max"] = dict(zip(RESUME_MAX_KEYS, self.cur.fetchone()))
 
         # start_time
         self.cur.execute("SELECT MIN(timestamp) FROM BIKECOMPUTER_LOG")
-        first_row = self.cur.fetchone()
-        if first_row[0] is not None:
-            self.values["start_time"] = int(
-                datetime_myparser(first_row[0]).timestamp() - 1
-            )
+        snapshot["start"] = self.cur.fetchone()[0]
 
-        # if not self.config.G_IS_RASPI and self.config.G_DUMMY_OUTPUT:
-        if self.config.G_DUMMY_OUTPUT:
-            self.cur.execute(
-                "SELECT position_lat,position_long,distance,gps_track FROM BIKECOMPUTER_LOG"
-            )
-            self.position_log = np.array(self.cur.fetchall())
+        return snapshot
+
+    @staticmethod
+    def get_short_log_timestamp(timestamp):
+        # datetime <-> [us] from the epoch, exact in float64
+        return (timestamp - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+
+    @staticmethod
+    def get_short_log_datetime(value):
+        return datetime(1970, 1, 1) + timedelta(microseconds=int(value))
 
     def store_short_log_for_update_track(self, dist, lat, lon, timestamp):
-        if not self.short_log_available:
-            return
         if np.isnan(lat) or np.isnan(lon):
             return
-        if len(self.short_log_dist) and self.short_log_dist[-1] == dist:
-            return
-        if (len(self.short_log_lat) and self.short_log_lat[-1] == lat) and (
-            len(self.short_log_lon) and self.short_log_lon[-1] == lon
-        ):
-            return
-        if len(self.short_log_lat) > self.short_log_limit:
-            self.clear_short_log()
-            self.short_log_available = False
-            return
-
-        self.short_log_lock = True
-        self.short_log_dist.append(dist)
-        self.short_log_lat.append(lat)
-        self.short_log_lon.append(lon)
-        self.short_log_timestamp.append(timestamp)
-        self.short_log_lock = False
-        self.short_log_available = True
-        # print("append", len(self.short_log_dist), len(self.short_log_lat), len(self.short_log_lon))
+        buf = self.short_log
+        limit = len(buf)
+        write = self.short_log_write
+        if write:
+            pre_dist, pre_lat, pre_lon, _ = buf[(write - 1) % limit]
+            if pre_dist == dist or (pre_lat == lat and pre_lon == lon):
+                return
+
+        if write - self.short_log_read >= limit:
+            # the oldest unread point is dropped, it is read from the db
+            self.short_log_read = write - limit + 1
+            self.short_log_overflow = True
+
+        # the row is set before the cursor, then update_track reads complete rows only
+        buf[write % limit] = (dist, lat, lon, self.get_short_log_timestamp(timestamp))
+        self.short_log_write = write + 1
+
+    def read_short_log(self):
+        # unread rows of the short log (written and read in the same event loop)
+        read = self.short_log_read
+        write = self.short_log_write
+        self.short_log_read = write
+        return self.short_log[np.arange(read, write) % len(self.short_log)]
 
     def clear_short_log(self):
-        while self.short_log_lock:
-            app_logger.info("locked: clear_short_log")
-            time.sleep(0.02)
-        self.short_log_dist = []
-        self.short_log_lat = []
-        self.short_log_lon = []
-        self.short_log_timestamp = []
+        self.short_log_read = self.short_log_write
+
+    def connect_track_db(self):
+        # read-only connection for the track: reads the committed rows (WAL included)
+        # while the log is written, without copying the database
+        if self.track_con is None:
+            self.track_con = sqlite3.connect(
+                f"file:{self.config.G_LOG_DB}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+                isolation_level=None,
+            )
+        return self.track_con
+
+    def close_track_db(self):
+        if self.track_con is not None:
+            self.track_con.close()
+            self.track_con = None
+
+    def read_track(self, timestamp=None):
+        # positions after timestamp (with timestamp_index), by chunks of
+        # track_chunk_size rows: (rowid, distance, lat, lon) arrays, None -> np.nan
+        query = (
+            "SELECT rowid,distance,position_lat,position_long FROM BIKECOMPUTER_LOG "
+            "WHERE typeof(position_lat) = 'real' AND typeof(position_long) = 'real'"
+        )
+        params = ()
+        if timestamp is not None:
+            query += " AND timestamp > ?"
+            params = (str(timestamp),)
+
+        cur = self.connect_track_db().execute(query, params)
+        try:
+            while True:
+                rows = cur.fetchmany(self.track_chunk_size)
+                if not rows:
+                    break
+                rows = np.array(rows, dtype=np.float64)
+                yield (
+                    rows[:, 0].astype(np.int64),
+                    rows[:, 1],
+                    rows[:, 2],
+                    rows[:, 3],
+                )
+        finally:
+            cur.close()
+
+    def read_track_db(self, timestamp):
+        # track after timestamp from the db, then the points of the short log not in
+        # the db yet (not committed): timestamp, dist, lat, lon
+        dist_raw = np.array([])
+        lat_raw = np.array([])
+        lon_raw = np.array([])
+        timestamp_new = timestamp
+
+        self.short_log_overflow = False
+
+        # one read transaction: the track and the timestamp are of the same snapshot
+        con = self.connect_track_db()
+        con.execute("BEGIN")
+        try:
+            track = list(self.read_track(timestamp=timestamp))
+            # timestamp
+            cur = con.execute("SELECT MAX(timestamp) FROM BIKECOMPUTER_LOG")
+            first_row = cur.fetchone()
+            cur.close()
+        finally:
+            con.execute("COMMIT")
+
+        if track:
+            dist_raw = np.concatenate([t[1] for t in track]).astype("float32")  # [m]
+            lat_raw = np.concatenate([t[2] for t in track]).astype("float32")
+            lon_raw = np.concatenate([t[3] for t in track]).astype("float32")
+        if first_row[0] is not None:
+            # with the microseconds: the next read starts after the last row
+            timestamp_new = datetime.fromisoformat(first_row[0])
+
+            rows = self.read_short_log()
+            rows = rows[rows[:, 3] > self.get_short_log_timestamp(timestamp_new)]
+            if len(rows):
+                dist_raw = np.concatenate([dist_raw, rows[:, 0]])
+                lat_raw = np.concatenate([lat_raw, rows[:, 1]])
+                lon_raw = np.concatenate([lon_raw, rows[:, 2]])
+                timestamp_new = self.get_short_log_datetime(rows[-1, 3])
+        else:
+            self.clear_short_log()
+
+        return timestamp_new, dist_raw, lat_raw, lon_raw
 
     def update_track(self, timestamp):
         lon = np.array([])
@@ -934,59 +1284,20 @@ class LoggerCore:
         timestamp_new = timestamp
         # t = datetime.utcnow()
 
-        timestamp_delta = None
-        if timestamp is not None:
-            timestamp_delta = (datetime.utcnow() - timestamp).total_seconds()
-
-        # make_tmp_db = False
         lat_raw = np.array([])
         lon_raw = np.array([])
         dist_raw = np.array([])
 
-        # get values from short_log to db in logging
-        if timestamp_delta is not None and self.short_log_available:
-            while self.short_log_lock:
-                app_logger.info("locked: get values")
-                time.sleep(0.02)
-            lat_raw = np.array(self.short_log_lat)
-            lon_raw = np.array(self.short_log_lon)
-            dist_raw = np.array(self.short_log_dist)
-            if len(self.short_log_lon):
-                timestamp_new = self.short_log_timestamp[-1]
-            self.clear_short_log()
-            self.short_log_available = True
-        # get values from copied db when initial execution or migration from short_log to db in logging
+        # get values from short_log in logging
+        if timestamp is not None and not self.short_log_overflow:
+            rows = self.read_short_log()
+            if len(rows):
+                dist_raw, lat_raw, lon_raw = rows[:, 0], rows[:, 1], rows[:, 2]
+                timestamp_new = self.get_short_log_datetime(rows[-1, 3])
+        # get values from db when initial execution or when points of the short log
+        # were dropped
         else:
-            db_file = self.config.G_LOG_DB + ".tmp"
-            shutil.copy(self.config.G_LOG_DB, db_file)
-
-            query = (
-                "SELECT distance,position_lat,position_long FROM BIKECOMPUTER_LOG "
-                + "WHERE position_lat is not null AND position_long is not null "
-                + 'and typeof(position_lat) = "real" and typeof(position_long) = "real"'
-            )
-            if timestamp is not None:
-                query = query + "AND timestamp > '%s'" % timestamp
-
-            con = sqlite3.connect(db_file)
-            cur = con.cursor()
-            cur.execute(query)
-            res_array = np.array(cur.fetchall())
-            if len(res_array.shape) and res_array.shape[0] > 0:
-                dist_raw = res_array[:, 0].astype("float32")  # [m]
-                lat_raw = res_array[:, 1].astype("float32")
-                lon_raw = res_array[:, 2].astype("float32")
-
-            # timestamp
-            cur.execute("SELECT MAX(timestamp) FROM BIKECOMPUTER_LOG")
-            first_row = cur.fetchone()
-            if first_row[0] is not None:
-                timestamp_new = datetime_myparser(first_row[0])
-
-            cur.close()
-            con.close()
-            os.remove(db_file)
-            self.short_log_available = True
+            timestamp_new, dist_raw, lat_raw, lon_raw = self.read_track_db(timestamp)
 
         # print("lat_raw", len(lat_raw))
         if len(lat_raw) and (len(lat_raw) == len(lon_raw) == len(dist_raw)):
@@ -1005,7 +1316,8 @@ class LoggerCore:
                 lat = lat_raw
                 lon = lon_raw
 
-        if timestamp is None:
+        # no track yet
+        if timestamp_new is None:
             timestamp_new = datetime.utcnow()
 
         # print("\tlogger_core : update_track(new) ", (datetime.utcnow()-t).total_seconds(), "sec")
@@ -215,14 +215,12 @@ class CourseProfileGraphWidget(BaseMapWidget):
             self.plot.removeItem(self.climb_detail)
         climb_index = None
 
-        for i in range(len(self.course.climb_segment)):
-            if (
-                self.course.climb_segment[i]["start"]
-                <= graph_index
-                <= self.course.climb_segment[i]["end"]
-            ):
-                climb_index = i
-                break
+        climb_indexes = np.flatnonzero(
+            (self.course.climb_segment["start"] <= graph_index)
+            & (graph_index <= self.course.climb_segment["end"])
+        )
+        if len(climb_indexes):
+            climb_index = climb_indexes[0]
 
         if climb_index is None:
             self.climb_detail.setHtml("")
@@ -1,7 +1,6 @@
 import datetime
 import io
 import os
-import sqlite3
 
 import numpy as np
 from PIL import Image
@@ -17,11 +16,14 @@ from modules.utils.geo import (
     get_width_distance,
 )
 from modules.utils.map import (
+    MBTilesReader,
+    TileItemCache,
     get_maptile_filename,
     get_lon_lat_from_tile_xy,
     get_tilexy_and_xy_in_tile,
 )
 from modules.utils.timer import Timer, log_timers
+from modules.utils.track import TrackBuffer
 from .pyqt_base_map import BaseMapWidget
 from .pyqt_map_button import (
     DirectionButton,
@@ -47,8 +49,7 @@ class MapWidget(BaseMapWidget):
     location = []
 
     # tracks
-    tracks_lat = np.array([])
-    tracks_lon = np.array([])
+    tracks = None
     tracks_lat_pos = None
     tracks_lon_pos = None
     tracks_timestamp = None
@@ -70,6 +71,10 @@ class MapWidget(BaseMapWidget):
     pre_zoomlevel = {}
 
     drawn_tile = {}
+    # TileItemCache by map name, of the ImageItems in the plot
+    tile_items = {}
+    # MBTilesReader by map name
+    mbtiles = {}
     existing_tiles = {}
     map_cuesheet_ratio = 1  # map:cuesheet = 1:0
 
@@ -120,7 +125,9 @@ class MapWidget(BaseMapWidget):
         self.map_pos["y"] = self.config.G_DUMMY_POS_Y
 
         # self.plot.showGrid(x=True, y=True, alpha=1)
-        self.track_plot = self.plot.plot(pen=self.track_pen)
+        self.tracks = TrackBuffer()
+        # decimated by TrackBuffer.get_lod, broken with nan
+        self.track_plot = self.plot.plot(pen=self.track_pen, connect="finite")
         self.scale_plot = self.plot.plot(pen=self.scale_pen)
 
         self.current_point.setZValue(40)
@@ -180,7 +187,7 @@ class MapWidget(BaseMapWidget):
         # self.load_course()
         t = datetime.datetime.utcnow()
         self.get_track()  # heavy when resume
-        if len(self.tracks_lon):
+        if len(self.tracks):
             app_logger.info(
                 f"resume_track(init): {(datetime.datetime.utcnow() - t).total_seconds():.3f} sec"
             )
@@ -231,12 +238,28 @@ class MapWidget(BaseMapWidget):
             self.zoomlevel = 1
         self.auto_zoomlevel = self.zoomlevel + self.auto_zoomlevel_diff
 
-        for key in [
+        # remove the tiles of the previous map
+        for tile_items in self.tile_items.values():
+            tile_items.clear()
+        self.tile_items = {}
+
+        maps = [
             self.config.G_MAP,
             self.config.G_HEATMAP_OVERLAY_MAP,
             self.config.G_RAIN_OVERLAY_MAP,
             self.config.G_WIND_OVERLAY_MAP,
-        ]:
+        ]
+
+        # close the .mbtiles of the maps no longer used
+        mbtiles = {}
+        for map_name, reader in self.mbtiles.items():
+            if map_name in maps:
+                mbtiles[map_name] = reader
+            else:
+                reader.close()
+        self.mbtiles = mbtiles
+
+        for key in maps:
             self.drawn_tile[key] = {}
             self.pre_zoomlevel[key] = np.nan
 
@@ -430,7 +453,7 @@ class MapWidget(BaseMapWidget):
         # dummy position
         if np.isnan(self.gps_values["lon"]) or np.isnan(self.gps_values["lat"]):
             # recent point(from log or pre_point) / course start / dummy
-            if len(self.tracks_lon) and len(self.tracks_lat):
+            if len(self.tracks):
                 self.point["pos"] = [self.tracks_lon_pos, self.tracks_lat_pos]
             elif self.course.is_set:
                 self.point["pos"] = [
@@ -560,7 +583,16 @@ class MapWidget(BaseMapWidget):
 
         # draw track
         self.get_track()
-        self.track_plot.setData(self.tracks_lon, self.tracks_lat)
+        self.track_plot.setData(
+            *self.tracks.get_lod(
+                x_start,
+                x_end,
+                get_mod_lat(y_start),
+                get_mod_lat(y_end),
+                self.plot.width(),
+                self.plot.height(),
+            )
+        )
 
         if not np.any(np.isnan([x_start, y_start])):
             # draw scale
@@ -577,12 +609,10 @@ class MapWidget(BaseMapWidget):
         if len(lon) and len(lat):
             self.tracks_lon_pos = lon[-1]
             self.tracks_lat_pos = lat[-1]
-            self.tracks_lon = np.append(self.tracks_lon, np.array(lon))
-            self.tracks_lat = np.append(self.tracks_lat, get_mod_lat_np(np.array(lat)))
+            self.tracks.append(lon, get_mod_lat_np(np.array(lat)))
 
     def reset_track(self):
-        self.tracks_lon = np.array([])
-        self.tracks_lat = np.array([])
+        self.tracks.reset()
 
     def reset_course(self):
         for p in [
@@ -736,36 +766,49 @@ class MapWidget(BaseMapWidget):
             # download
             await self.download_tiles(tiles, map_config, map_name, z_draw)
 
-        # tile check
+        # read the tiles of the range at once
         if use_mbtiles:
-            self.con = sqlite3.connect(
-                f"file:./maptile/{map_name}.mbtiles?mode=ro", uri=True
-            )
-            self.cur = self.con.cursor()
+            mbtiles = self.get_mbtiles(map_name)
+            if expand:
+                mbtiles.fetch(
+                    z_draw,
+                    [t // z_conv_factor for t in tile_x],
+                    [t // z_conv_factor for t in tile_y],
+                )
+            else:
+                mbtiles.fetch(z_draw, tile_x, tile_y)
 
         draw_flag, add_keys, expand_keys = self.check_drawn_tile(
             use_mbtiles, map_config, map_name, z, z_draw, z_conv_factor, tile_x, tile_y, expand
         )
 
         self.pre_zoomlevel[map_name] = z
+        tile_items = self.get_tile_items(map_name)
+        visible_keys = {
+            (z, i, j)
+            for i in range(tile_x[0], tile_x[1] + 1)
+            for j in range(tile_y[0], tile_y[1] + 1)
+        }
+        tile_items.touch(visible_keys)
         if not draw_flag:
-            if use_mbtiles:
-                self.cur.close()
-                self.con.close()
             return False
 
         # draw only the necessary tiles
         w_h = int(tile_size / z_conv_factor) if expand else 0
         for keys in add_keys:
             x, y = keys[0:2] if not expand else expand_keys[keys][0:2]
-            img_file = self.get_image_file(use_mbtiles, map_config, map_name, z_draw, x, y)
+            if use_mbtiles:
+                # decoded RGBA
+                img_pil = mbtiles.get(z_draw, x, y)
+            else:
+                img_pil = Image.open(self.get_image_file(map_config, map_name, z_draw, x, y))
             if not expand:
-                img_pil = Image.open(img_file).convert("RGBA")
+                img_pil = img_pil.convert("RGBA")
             else:
                 x_start, y_start = int(w_h * expand_keys[keys][2]), int(
                     w_h * expand_keys[keys][3]
                 )
-                img_pil = Image.open(img_file).crop((
+                img_pil = img_pil.crop((
                     x_start, y_start, x_start + w_h, y_start + w_h
                 )).convert("RGBA")
 
@@ -801,12 +844,37 @@ class MapWidget(BaseMapWidget):
                     get_mod_lat(imgarray_max_y) - get_mod_lat(imgarray_min_y),
                 )
             )
-        if use_mbtiles:
-            self.cur.close()
-            self.con.close()
+            # replaces the item of a tile drawn again
+            tile_items.add(
+                (z, keys[0], keys[1]),
+                imgitem,
+                (imgarray_min_x, imgarray_min_y, imgarray_max_x, imgarray_max_y),
+            )
+        # remove the tiles over G_MAP_TILE_ITEMS, to be drawn again if needed
+        for tile_z, i, j in tile_items.evict(
+            z, (p0["x"], p0["y"], p1["x"], p1["y"]), keep=visible_keys
+        ):
+            self.drawn_tile[map_name].get(tile_z, {}).pop(f"{i}-{j}", None)
 
         return True
 
+    def get_mbtiles(self, map_name):
+        if map_name not in self.mbtiles:
+            self.mbtiles[map_name] = MBTilesReader(
+                f"./maptile/{map_name}.mbtiles",
+                decode=lambda data: Image.open(io.BytesIO(data)).convert("RGBA"),
+                mmap_size=self.config.G_MAP_MBTILES_MMAP_SIZE,
+                cache_size=self.config.G_MAP_MBTILES_CACHE_SIZE,
+            )
+        return self.mbtiles[map_name]
+
+    def get_tile_items(self, map_name):
+        if map_name not in self.tile_items:
+            self.tile_items[map_name] = TileItemCache(
+                self.plot.removeItem, self.config.G_MAP_TILE_ITEMS
+            )
+        return self.tile_items[map_name]
+
     @staticmethod
     def init_draw_map(map_config, map_name, z, p0, p1, expand, tile_size):
         z_draw = z
@@ -931,29 +999,17 @@ class MapWidget(BaseMapWidget):
             )
             if (filename, True) in self.existing_tiles.items():
                 return True
-        else:
-            sql = (
-                f"select count(*) from tiles where "
-                f"zoom_level={z_draw} and tile_column={key[0]} and tile_row={2**z_draw - 1 - key[1]}"
-            )
-            if (self.cur.execute(sql).fetchone())[0] == 1:
-                return True
+        elif self.mbtiles[map_name].has_tile(z_draw, *key):
+            return True
         return False
 
-    def get_image_file(self, use_mbtiles, map_config, map_name, z_draw, x, y):
-        if not use_mbtiles:
-            basetime = map_config[map_name].get("basetime", None)
-            validtime = map_config[map_name].get("validtime", None)
-            img_file = get_maptile_filename(
-                map_name, z_draw, x, y, basetime=basetime, validtime=validtime
-            )
-        else:
-            sql = (
-                f"select tile_data from tiles where "
-                f"zoom_level={z_draw} and tile_column={x} and tile_row={2**z_draw - 1 - y}"
-            )
-            img_file = io.BytesIO((self.cur.execute(sql).fetchone())[0])
-        return img_file
+    @staticmethod
+    def get_image_file(map_config, map_name, z_draw, x, y):
+        basetime = map_config[map_name].get("basetime", None)
+        validtime = map_config[map_name].get("validtime", None)
+        return get_maptile_filename(
+            map_name, z_draw, x, y, basetime=basetime, validtime=validtime
+        )
 
     def draw_scale(self, x_start, y_start):
         # draw scale at left bottom
@@ -159,9 +159,9 @@ class CoursesMenuWidget(MenuWidget):
                     )
                 )
                 self.onoff_course_cancel_button()
-        # tcx file
-        elif filename.lower().find(".tcx") >= 0:
-            await self.load_tcx_route(filename)
+        # tcx, gpx, fit file
+        elif self.get_course_file_ext(filename):
+            await self.load_course_file_route(filename)
         await self.cancel_receive_route()
 
     async def load_html_route(self, html_file):
@@ -182,10 +182,19 @@ class CoursesMenuWidget(MenuWidget):
         finally:
             self.config.gui.show_forced_message(msg)
 
-    async def load_tcx_route(self, filename):
+    @staticmethod
+    def get_course_file_ext(filename):
+        for ext in (".tcx", ".gpx", ".fit"):
+            if filename.lower().find(ext) >= 0:
+                return ext
+        return None
+
+    async def load_course_file_route(self, filename):
         self.cancel_course()
+        ext = self.get_course_file_ext(filename)
         course_file = os.path.join(
-            self.config.G_COURSE_DIR, filename[: filename.lower().find(".tcx") + 4]
+            self.config.G_COURSE_DIR,
+            filename[: filename.lower().find(ext) + len(ext)],
         )
         shutil.move(os.path.join(self.config.G_COURSE_DIR, filename), course_file)
         self.set_new_course(course_file)
@@ -54,6 +54,9 @@ class Item(QtWidgets.QVBoxLayout):
     label = None
     value = None
     name = ""
+    # texts set in label and value
+    label_text = None
+    text = None
 
     def __init__(self, config, name, font_size, bottom_flag, right_flag, *args):
         super().__init__(*args)
@@ -64,9 +67,12 @@ class Item(QtWidgets.QVBoxLayout):
         self.setSpacing(0)
 
         self.label = ItemLabel(right_flag, name)
+        self.label_text = name
         self.value = ItemValue(right_flag, bottom_flag)
 
         self.itemformat = self.config.gui.gui_config.G_ITEM_DEF[name][0]
+        # value of the item from the widget
+        self.getter = self.config.gui.gui_config.get_item_getter(name)
 
         self.addWidget(self.label)
         self.addWidget(self.value)
@@ -74,39 +80,55 @@ class Item(QtWidgets.QVBoxLayout):
         self.update_font_size(font_size)
         self.update_value(np.nan)
 
-    def update_value(self, value):
+    def get_text(self, value):
         if value is None:
-            self.value.setText("-")
+            return "-"
         elif isinstance(value, str):
-            self.value.setText(value)
+            return value
         elif np.isnan(value):
-            self.value.setText("-")
+            return "-"
         elif self.name.startswith("Speed"):
-            self.value.setText(self.itemformat.format(value * 3.6))  # m/s to km/h
+            return self.itemformat.format(value * 3.6)  # m/s to km/h
         elif "SPD" in self.name:
-            self.value.setText(self.itemformat.format(value * 3.6))  # m/s to km/h
+            return self.itemformat.format(value * 3.6)  # m/s to km/h
         elif "Dist" in self.name:
-            self.value.setText(self.itemformat.format(value / 1000))  # m to km
+            return self.itemformat.format(value / 1000)  # m to km
         elif "DIST" in self.name:
-            self.value.setText(self.itemformat.format(value / 1000))  # m to km
+            return self.itemformat.format(value / 1000)  # m to km
         elif "Work" in self.name:
-            self.value.setText(self.itemformat.format(value / 1000))  # j to kj
+            return self.itemformat.format(value / 1000)  # j to kj
         elif "WRK" in self.name:
-            self.value.setText(self.itemformat.format(value / 1000))  # j to kj
+            return self.itemformat.format(value / 1000)  # j to kj
         elif (
             "Grade" in self.name or "Glide" in self.name
         ) and self.config.G_STOPWATCH_STATUS != "START":
-            self.value.setText("-")
+            return "-"
         elif self.itemformat == "timer":
             # fmt = '%H:%M:%S' #default (too long)
             fmt = "%H:%M"
             if value < 3600:
                 fmt = "%M:%S"
-            self.value.setText(time.strftime(fmt, time.gmtime(value)))
+            return time.strftime(fmt, time.gmtime(value))
         elif self.itemformat == "time":
-            self.value.setText(time.strftime("%H:%M"))
+            return time.strftime("%H:%M")
         else:
-            self.value.setText(self.itemformat.format(value))
+            return self.itemformat.format(value)
+
+    def update_value(self, value):
+        # setText (and the repaint and draw_display) only when the text changes
+        text = self.get_text(value)
+        if text == self.text:
+            return False
+        self.text = text
+        self.value.setText(text)
+        return True
+
+    def update_label(self, text):
+        if text == self.label_text:
+            return False
+        self.label_text = text
+        self.label.setText(text)
+        return True
 
     def update_font_size(self, font_size):
         for text, fsize in zip(
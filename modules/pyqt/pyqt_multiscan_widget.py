@@ -86,11 +86,9 @@ class MultiScanWidget(ScreenWidget):
 
         for item in self.items:
             if item.name in ["HR", "Power", "Time"]:
-                item.update_value(
-                    eval(self.config.gui.gui_config.G_ITEM_DEF[item.name][1])
-                )
+                item.update_value(item.getter(self))
             else:
-                item.label.setText(item.name)
+                label = item.name
                 key = item.name[0:-1]
                 i = int(item.name[-1:]) - 1
                 ant_id_type = self.values[key + "_ID"][i]
@@ -102,10 +100,10 @@ class MultiScanWidget(ScreenWidget):
                         and "manu_name"
                         in self.sensor.sensor_ant.scanner.values[ant_id_type]
                     ):
-                        item.label.setText(
-                            self.sensor.sensor_ant.scanner.values[ant_id_type][
-                                "manu_name"
-                            ]
-                        )
+                        label = self.sensor.sensor_ant.scanner.values[ant_id_type][
+                            "manu_name"
+                        ]
                 else:
                     item.update_value(None)
+                # set once, not changed by frame
+                item.update_label(label)
@@ -144,9 +144,7 @@ class ScreenWidget(QtWidgets.QWidget):
     async def update_display(self):
         for item in self.items:
             try:
-                item.update_value(
-                    eval(self.config.gui.gui_config.G_ITEM_DEF[item.name][1])
-                )
+                item.update_value(item.getter(self))
             except KeyError:
                 pass
                 # item.update_value(None)
@@ -155,5 +153,5 @@ class ScreenWidget(QtWidgets.QWidget):
             except Exception:  # noqa
                 item.update_value(None)
                 app_logger.exception(
-                    f"###update_display### : {item.name} {eval(self.config.gui.gui_config.G_ITEM_DEF[item.name][1])}",
+                    f"###update_display### : {item.name} {self.config.gui.gui_config.G_ITEM_DEF[item.name][1]}",
                 )
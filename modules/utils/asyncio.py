@@ -1,5 +1,8 @@
 import asyncio
 import inspect
+from collections import deque
+
+import numpy as np
 
 
 async def _call_with_delay(callback, delay):
@@ -13,3 +16,38 @@ async def _call_with_delay(callback, delay):
 
 def call_with_delay(callback, delay=1):
     asyncio.create_task(_call_with_delay(callback, delay))
+
+
+class LoopLatencyMonitor:
+    # how late the event loop wakes up a coroutine sleeping for interval,
+    # i.e. how long the loop was blocked by other (synchronous) work
+    def __init__(self, interval=0.1, size=600):
+        self.interval = interval
+        self.latency = deque(maxlen=size)  # [s]
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.latency.append(loop.time() - start - self.interval)
+
+    def get_stats(self):
+        # mean, p95 and max latency [ms]
+        if not self.latency:
+            return {"mean": 0, "p95": 0, "max": 0}
+        latency = np.array(self.latency) * 1000
+        return {
+            "mean": float(np.mean(latency)),
+            "p95": float(np.percentile(latency, 95)),
+            "max": float(np.max(latency)),
+        }
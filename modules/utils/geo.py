@@ -127,3 +127,27 @@ def get_track_str(drc):
 
 def get_width_distance(lat, w):
     return w * GEO_R1 * 1000 * 2 * np.pi * math.cos(lat / 180 * np.pi) / 360
+
+
+def get_route_position(lon, lat, p_lon, p_lat):
+    # position of the points along the route (lon, lat): index of the nearest segment
+    # plus the ratio of the projection on it, in local planar coordinates
+    if len(lon) < 2:
+        return np.zeros(len(p_lon))
+    scale = math.cos(math.radians(np.mean(lat)))
+    x = np.asarray(lon) * scale
+    y = np.asarray(lat)
+    dx = np.diff(x)
+    dy = np.diff(y)
+    seg_len2 = dx**2 + dy**2
+    # duplicated points: projection on the first point
+    seg_len2[seg_len2 == 0] = np.inf
+
+    position = np.empty(len(p_lon))
+    for i, (px, py) in enumerate(zip(np.asarray(p_lon) * scale, p_lat)):
+        px = px - x[:-1]
+        py = py - y[:-1]
+        t = np.clip((px * dx + py * dy) / seg_len2, 0, 1)
+        j = np.argmin((px - t * dx) ** 2 + (py - t * dy) ** 2)
+        position[i] = j + t[j]
+    return position
@@ -1,6 +1,8 @@
 import math
 import os
 import shutil
+import sqlite3
+from collections import OrderedDict
 
 
 def get_maptile_filename(map_name, z, x, y, basetime=None, validtime=None):
@@ -41,3 +43,119 @@ def remove_maptiles(map_name, basetime):
         dirs = [f for f in files if basetime is not None and f != basetime and os.path.isdir(os.path.join(path, f))]
         for d in dirs:
             shutil.rmtree(os.path.join(path, d))
+
+
+class TileItemCache:
+    # drawn tile items of a map by (z, x, y), in order of use. Over max_items, the least
+    # recently used are removed with remove_item, first the tiles of another zoom level
+    # or more than a view size away from the view
+    def __init__(self, remove_item, max_items):
+        self.remove_item = remove_item
+        self.max_items = max_items
+        self.items = OrderedDict()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def add(self, key, item, rect):
+        # rect: (min lon, min lat, max lon, max lat) of the tile
+        if key in self.items:
+            self.remove_item(self.items.pop(key)[0])
+        self.items[key] = (item, rect)
+
+    def touch(self, keys):
+        for key in keys:
+            if key in self.items:
+                self.items.move_to_end(key)
+
+    def is_far(self, key, z, view):
+        if key[0] != z:
+            return True
+        x0, y0, x1, y1 = view
+        r_x0, r_y0, r_x1, r_y1 = self.items[key][1]
+        dx = max(x0 - r_x1, r_x0 - x1, 0) / (x1 - x0 or 1)
+        dy = max(y0 - r_y1, r_y0 - y1, 0) / (y1 - y0 or 1)
+        return max(dx, dy) > 1
+
+    def evict(self, z, view, keep=()):
+        # view: (min lon, min lat, max lon, max lat), keep: keys of the drawn tiles
+        if len(self.items) <= self.max_items:
+            return []
+        # stable sort: in order of use by group
+        order = sorted(self.items, key=lambda k: not self.is_far(k, z, view))
+        evicted = []
+        for key in order:
+            if len(self.items) <= self.max_items:
+                break
+            if key in keep:
+                continue
+            self.remove_item(self.items.pop(key)[0])
+            evicted.append(key)
+        return evicted
+
+    def clear(self):
+        for item, _ in self.items.values():
+            self.remove_item(item)
+        self.items.clear()
+
+
+class MBTilesReader:
+    # tiles of an .mbtiles file with one read-only connection. The tiles of a range are
+    # read with one query, and kept decoded (with decode) in a LRU cache of cache_size
+    # tiles, with the missing tiles
+    def __init__(self, path, decode=None, mmap_size=0, cache_size=64):
+        self.con = sqlite3.connect(
+            f"file:{path}?mode=ro", uri=True, check_same_thread=False
+        )
+        if mmap_size:
+            self.con.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self.decode = decode
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    def close(self):
+        self.con.close()
+        self.cache.clear()
+
+    def fetch(self, z, tile_x, tile_y):
+        # tile_x, tile_y: [min, max] of the tiles in XYZ
+        keys = [
+            (z, x, y)
+            for x in range(tile_x[0], tile_x[1] + 1)
+            for y in range(tile_y[0], tile_y[1] + 1)
+        ]
+        missing = [k for k in keys if k not in self.cache]
+        if missing:
+            # TMS rows of the mbtiles
+            n = 2**z - 1
+            cur = self.con.execute(
+                "SELECT tile_column, tile_row, tile_data FROM tiles "
+                "WHERE zoom_level = ? "
+                "AND tile_column BETWEEN ? AND ? AND tile_row BETWEEN ? AND ?",
+                (z, tile_x[0], tile_x[1], n - tile_y[1], n - tile_y[0]),
+            )
+            data = {(z, x, n - row): tile_data for x, row, tile_data in cur}
+            cur.close()
+            for key in missing:
+                tile_data = data.get(key)
+                if tile_data is not None and self.decode is not None:
+                    tile_data = self.decode(tile_data)
+                self.cache[key] = tile_data
+        for key in keys:
+            self.cache.move_to_end(key)
+        # keep at least the tiles of the range
+        while len(self.cache) > max(self.cache_size, len(keys)):
+            self.cache.popitem(last=False)
+
+    def get(self, z, x, y):
+        # decoded tile, or None if missing
+        key = (z, x, y)
+        if key not in self.cache:
+            self.fetch(z, (x, x), (y, y))
+        return self.cache[key]
+
+    def has_tile(self, z, x, y):
+        return self.get(z, x, y) is not None
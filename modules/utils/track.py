@@ -0,0 +1,176 @@
+import numpy as np
+
+
+class TrackBuffer:
+    # growable (lon, lat) buffer of the track: the capacity is doubled when full,
+    # so appending the new points of each refresh doesn't copy the whole track
+    initial_capacity = 1024
+    # bounding boxes by chunk of points, to skip the chunks out of the view range
+    chunk_size = 256
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.data = np.empty((self.initial_capacity, 2))
+        self.size = 0
+        # (min lon, min lat, max lon, max lat) of the done chunks
+        self.chunk_bbox = np.empty((0, 4))
+        self.lod_key = None
+        self.lod = (np.array([]), np.array([]))
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def lon(self):
+        return self.data[: self.size, 0]
+
+    @property
+    def lat(self):
+        return self.data[: self.size, 1]
+
+    def append(self, lon, lat):
+        n = len(lon)
+        if not n:
+            return
+        if self.size + n > len(self.data):
+            capacity = len(self.data)
+            while capacity < self.size + n:
+                capacity *= 2
+            data = np.empty((capacity, 2))
+            data[: self.size] = self.data[: self.size]
+            self.data = data
+        self.data[self.size : self.size + n, 0] = lon
+        self.data[self.size : self.size + n, 1] = lat
+        self.size += n
+
+    def update_chunk_bbox(self):
+        # a chunk is done when the first point of the next one is there: its bbox
+        # covers the segments from its points, up to that point
+        done_n = max(self.size - 1, 0) // self.chunk_size
+        done = len(self.chunk_bbox)
+        if done_n == done:
+            return
+        points = self.data[done * self.chunk_size : done_n * self.chunk_size + 1]
+        chunks = points[:-1].reshape(done_n - done, self.chunk_size, 2)
+        next_first = points[self.chunk_size :: self.chunk_size]
+        self.chunk_bbox = np.concatenate(
+            [
+                self.chunk_bbox,
+                np.hstack(
+                    [
+                        np.fmin(np.nanmin(chunks, axis=1), next_first),
+                        np.fmax(np.nanmax(chunks, axis=1), next_first),
+                    ]
+                ),
+            ]
+        )
+
+    def get_candidates(self, x_min, x_max, y_min, y_max):
+        # indexes of the points of the chunks whose segments may cross the range
+        self.update_chunk_bbox()
+        bbox = self.chunk_bbox
+        hit = np.ones(len(bbox) + 1, dtype=bool)  # the last chunk is not done
+        hit[:-1] = (
+            (bbox[:, 0] <= x_max)
+            & (bbox[:, 2] >= x_min)
+            & (bbox[:, 1] <= y_max)
+            & (bbox[:, 3] >= y_min)
+        )
+        chunks = np.flatnonzero(hit)
+        index = (
+            chunks[:, np.newaxis] * self.chunk_size + np.arange(self.chunk_size)
+        ).ravel()
+        return index[index < self.size]
+
+    def get_lod(self, x_start, x_end, y_start, y_end, width, height, margin=0.5):
+        # points to draw for the view range and its size [px]:
+        # - the segments out of the range (with margin) are dropped, the line is
+        #   broken with nan (pyqtgraph connect="finite")
+        # - consecutive points in the same pixel are drawn once
+        key = (x_start, x_end, y_start, y_end, width, height, self.size)
+        if key == self.lod_key:
+            return self.lod
+        self.lod_key = key
+
+        if (
+            not self.size
+            or width <= 0
+            or height <= 0
+            or not np.all(np.isfinite([x_start, x_end, y_start, y_end]))
+            or x_start >= x_end
+            or y_start >= y_end
+        ):
+            self.lod = (self.lon.copy(), self.lat.copy())
+            return self.lod
+
+        x_margin = (x_end - x_start) * margin
+        y_margin = (y_end - y_start) * margin
+        x_min, x_max = x_start - x_margin, x_end + x_margin
+        y_min, y_max = y_start - y_margin, y_end + y_margin
+
+        index = self.get_candidates(x_min, x_max, y_min, y_max)
+        lon = self.data[index, 0]
+        lat = self.data[index, 1]
+        inside = (lon >= x_min) & (lon <= x_max) & (lat >= y_min) & (lat <= y_max)
+
+        # next points, for the segments index -> index + 1
+        next_candidate = np.zeros(len(index), dtype=bool)
+        next_candidate[:-1] = np.diff(index) == 1
+        lon_next = np.empty(len(index))
+        lat_next = np.empty(len(index))
+        lon_next[:-1] = lon[1:]
+        lat_next[:-1] = lat[1:]
+        other = np.flatnonzero(~next_candidate)
+        other_next = np.minimum(index[other] + 1, self.size - 1)
+        lon_next[other] = self.data[other_next, 0]
+        lat_next[other] = self.data[other_next, 1]
+        # segments whose bbox overlaps the range, even with both points out of it
+        hit = (
+            (np.minimum(lon, lon_next) <= x_max)
+            & (np.maximum(lon, lon_next) >= x_min)
+            & (np.minimum(lat, lat_next) <= y_max)
+            & (np.maximum(lat, lat_next) >= y_min)
+        )
+        hit[-1] &= index[-1] < self.size - 1
+        keep = inside | hit
+        keep[1:] |= hit[:-1] & next_candidate[:-1]
+
+        kept = index[keep]
+        kept_hit = hit[keep]
+        # the segment ends in a chunk out of the range (its next segments too)
+        end = index[hit & ~next_candidate] + 1
+        if len(end):
+            kept = np.concatenate([kept, end])
+            kept_hit = np.concatenate([kept_hit, np.zeros(len(end), dtype=bool)])
+            order = np.argsort(kept, kind="stable")
+            kept = kept[order]
+            kept_hit = kept_hit[order]
+        if not len(kept):
+            self.lod = (np.array([]), np.array([]))
+            return self.lod
+        lon = self.data[kept, 0]
+        lat = self.data[kept, 1]
+        # joined to the previous point by a segment in the range
+        joined = np.zeros(len(kept), dtype=bool)
+        joined[1:] = (np.diff(kept) == 1) & kept_hit[:-1]
+
+        # pixel of the points
+        px = np.floor((lon - x_start) / (x_end - x_start) * width)
+        py = np.floor((lat - y_start) / (y_end - y_start) * height)
+        same_pixel = np.zeros(len(kept), dtype=bool)
+        same_pixel[1:] = (px[1:] == px[:-1]) & (py[1:] == py[:-1]) & joined[1:]
+        # the last point (current position) is always drawn
+        same_pixel[-1] = False
+
+        drawn = np.flatnonzero(~same_pixel)
+
+        # break the line where segments are dropped
+        dropped = np.cumsum(~joined)[drawn]
+        gap = np.flatnonzero(dropped[1:] != dropped[:-1]) + 1
+        self.lod = (
+            np.insert(lon[drawn], gap, np.nan),
+            np.insert(lat[drawn], gap, np.nan),
+        )
+        return self.lod
@@ -0,0 +1,103 @@
+# Replay a recorded ride against a (long) course and report the per-fix latency of
+# Course.get_index, for the search modes.
+#
+#   python -m tests.benchmarks.bench_course_index [--repeat 100]
+#
+# The course is repeated --repeat times end to end, shifted eastward each time,
+# to emulate a long course. The ride is replayed on the first one.
+# The segment grid is built for all the sizes here: it is only used from
+# G_GPS_SEGMENT_GRID_MIN_POINTS (faster from ~20000 points, --repeat 110).
+import argparse
+import asyncio
+import sqlite3
+import time
+
+import numpy as np
+
+from modules.course import Course
+from tests.test_course import Config
+
+COURSE_FILE = "tests/data/tcx/Heart_of_St._Johns_Peninsula_Ride.tcx"
+LOG_DB = "tests/data/log.db-Heart_of_St._Johns_Peninsula_Ride"
+
+
+def load_course(file, repeat):
+    course = Course(Config(indexing=True))
+    course.load(file=file)
+
+    if repeat > 1:
+        course.latitude = np.tile(course.latitude, repeat)
+        shift = 1.1 * (np.max(course.longitude) - np.min(course.longitude))
+        course.longitude = np.concatenate(
+            [course.longitude + i * shift for i in range(repeat)]
+        )
+        course.altitude = np.tile(course.altitude, repeat)
+        course.distance = np.concatenate(
+            [course.distance + i * course.distance[-1] for i in range(repeat)]
+        )
+        course.calc_slope_smoothing()
+        course.modify_course_points()
+
+    return course
+
+
+def load_ride(file):
+    con = sqlite3.connect(file)
+    rows = con.execute(
+        "SELECT position_lat, position_long, gps_track FROM BIKECOMPUTER_LOG "
+        "WHERE position_lat IS NOT NULL AND gps_track IS NOT NULL "
+        "ORDER BY timestamp"
+    ).fetchall()
+    con.close()
+    return rows
+
+
+def replay(course, ride):
+    config = course.config
+    course.index.reset()
+    latency = np.zeros(len(ride))
+
+    for i, (lat, lon, track) in enumerate(ride):
+        t = time.perf_counter()
+        course.get_index(
+            lat,
+            lon,
+            track,
+            config.G_GPS_SEARCH_RANGE,
+            config.G_GPS_ON_ROUTE_CUTOFF,
+            [config.G_GPS_AZIMUTH_CUTOFF, 360 - config.G_GPS_AZIMUTH_CUTOFF],
+        )
+        latency[i] = time.perf_counter() - t
+
+    return latency * 1000  # [ms]
+
+
+async def main(args):
+    course = load_course(args.course, args.repeat)
+    ride = load_ride(args.log)
+
+    print(f"course: {len(course.latitude)} points, {course.distance[-1]:.1f} km")
+    print(f"ride  : {len(ride)} fixes")
+
+    segment_grid = course.segment_grid
+
+    for name, incremental, grid in (
+        ("full scan  ", False, None),
+        ("global     ", False, segment_grid),
+        ("incremental", True, segment_grid),
+    ):
+        course.config.G_GPS_INCREMENTAL_SEARCH = incremental
+        course.segment_grid = grid
+        latency = replay(course, ride)
+        print(
+            f"{name}: mean {latency.mean():.3f} ms, "
+            f"p95 {np.percentile(latency, 95):.3f} ms, max {latency.max():.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--course", default=COURSE_FILE)
+    parser.add_argument("--log", default=LOG_DB)
+    parser.add_argument("--repeat", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
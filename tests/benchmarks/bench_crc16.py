@@ -0,0 +1,72 @@
+# crc16 of a FIT payload with the previous nibble implementation and the byte table,
+# and the cost of prepending the header with crc16_combine.
+#
+#   python -m tests.benchmarks.bench_crc16 [--size 4]
+import argparse
+import os
+import time
+
+from modules.logger.cython.crc16_p import crc16, crc16_combine
+
+nibble_table = [
+    0x0000,
+    0xCC01,
+    0xD801,
+    0x1400,
+    0xF001,
+    0x3C00,
+    0x2800,
+    0xE401,
+    0xA001,
+    0x6C00,
+    0x7800,
+    0xB401,
+    0x5000,
+    0x9C01,
+    0x8801,
+    0x4400,
+]
+
+
+def crc16_nibble(data):
+    crc = 0
+    for byte in data:
+        tmp = nibble_table[crc & 0xF]
+        crc = (crc >> 4) & 0x0FFF
+        crc = crc ^ tmp ^ nibble_table[byte & 0xF]
+        tmp = nibble_table[crc & 0xF]
+        crc = (crc >> 4) & 0x0FFF
+        crc = crc ^ tmp ^ nibble_table[(byte >> 4) & 0xF]
+    return crc
+
+
+def measure(func, *args):
+    t = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=float, default=4, help="payload size [MB]")
+    args = parser.parse_args()
+
+    header = os.urandom(16)
+    data = os.urandom(int(args.size * 1024 * 1024))
+
+    # as before: crc of the header + data buffer
+    expected, nibble = measure(crc16_nibble, header + data)
+    table_crc, table = measure(crc16, header + data)
+    # incremental: crc of the data while written, then the header is prepended
+    data_crc, _ = measure(crc16, data)
+    combined, combine = measure(crc16_combine, crc16(header), data_crc, len(data))
+    assert expected == table_crc == combined
+
+    print(f"{args.size} MB")
+    print(f"nibble       : {nibble * 1000:.0f} ms")
+    print(f"byte table   : {table * 1000:.0f} ms ({nibble / table:.2f}x)")
+    print(f"crc16_combine: {combine * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Export a synthetic ride to FIT with LoggerFit.write_log_python and report the export
+# time, the file size and the peak memory (which should not grow with the ride).
+#
+#   python -m tests.benchmarks.bench_fit_export [--repeat 1 4 16] [--laps 1]
+#
+# The rows of the test log are repeated --repeat times (~30 min each) and split into
+# --laps laps.
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from modules.logger.logger_fit import LoggerFit
+
+LOG_DB = "tests/data/log.db-Heart_of_St._Johns_Peninsula_Ride"
+
+
+class Config:
+    G_LOG_DB = None
+    G_UNIT_ID_HEX = 0x12345678
+
+
+def make_log_db(repeat, laps):
+    path = os.path.join(tempfile.mkdtemp(), "log.db")
+    shutil.copy(LOG_DB, path)
+    con = sqlite3.connect(path)
+    columns = [c[1] for c in con.execute("PRAGMA table_info(BIKECOMPUTER_LOG)")]
+    first, last = con.execute(
+        "SELECT MIN(timestamp), MAX(timestamp) FROM BIKECOMPUTER_LOG"
+    ).fetchone()
+    duration = int(
+        (datetime.fromisoformat(last) - datetime.fromisoformat(first)).total_seconds()
+        + 1
+    )
+    con.execute("CREATE TEMP TABLE SRC AS SELECT * FROM BIKECOMPUTER_LOG")
+    for r in range(1, repeat):
+        # shift the time, keep the microseconds for datetime_myparser
+        shifted = (
+            f"strftime('%Y-%m-%d %H:%M:%S', timestamp, '+{r * duration} seconds')"
+            " || substr(timestamp, 20)"
+        )
+        select = ",".join(shifted if c == "timestamp" else c for c in columns)
+        con.execute(f"INSERT INTO BIKECOMPUTER_LOG SELECT {select} FROM SRC")
+    count = con.execute("SELECT COUNT(*) FROM BIKECOMPUTER_LOG").fetchone()[0]
+    con.execute(f"UPDATE BIKECOMPUTER_LOG SET lap = (rowid - 1) * {laps} / {count}")
+    con.commit()
+    con.close()
+    start = datetime.fromisoformat(first).replace(tzinfo=timezone.utc)
+    end = start + timedelta(seconds=duration * repeat)
+    return path, count, start, end
+
+
+def export(config, start, end):
+    path = os.path.join(tempfile.mkdtemp(), "log.fit")
+    assert LoggerFit(config).write_log_python(path, start, end)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--laps", type=int, default=1)
+    args = parser.parse_args()
+
+    for repeat in args.repeat:
+        config = Config()
+        config.G_LOG_DB, count, start, end = make_log_db(repeat, args.laps)
+
+        # tracing slows down allocations, so time and memory are measured separately
+        t = time.perf_counter()
+        path = export(config, start, end)
+        elapsed = time.perf_counter() - t
+        size = os.path.getsize(path)
+
+        tracemalloc.start()
+        export(config, start, end)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"{count:7d} rows, {args.laps} laps: {elapsed:6.2f} s, "
+            f"file {size / 1024:7.0f} KiB, peak memory {peak / 1024:6.0f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# per-frame update cost of the items of the bundled layouts: eval() of the G_ITEM_DEF
+# expressions as before, against the getters compiled by GUI_Config.
+# The cost of Item.update_value (Qt labels) is not included.
+#
+#   python -m tests.benchmarks.bench_item_getters [--frames 10000]
+import argparse
+import glob
+import time
+
+from modules.gui_config import GUI_Config
+from tests.test_gui_config import get_widget
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=10000)
+    args = parser.parse_args()
+
+    self = get_widget()
+    for layout_file in sorted(glob.glob("layouts/layout-*.yaml")):
+        gui_config = GUI_Config(layout_file)
+        print(layout_file)
+        for screen, screen_config in gui_config.layout.items():
+            if not isinstance(screen_config, dict) or not isinstance(
+                screen_config.get("LAYOUT"), dict
+            ):
+                continue
+            names = [n for n in screen_config["LAYOUT"] if n in GUI_Config.G_ITEM_DEF]
+            if not names:
+                continue
+            expressions = [GUI_Config.G_ITEM_DEF[n][1] for n in names]
+            getters = [gui_config.get_item_getter(n) for n in names]
+
+            t = time.perf_counter()
+            for _ in range(args.frames):
+                for expression in expressions:
+                    eval(expression)
+            elapsed_eval = time.perf_counter() - t
+
+            t = time.perf_counter()
+            for _ in range(args.frames):
+                for getter in getters:
+                    getter(self)
+            elapsed_getter = time.perf_counter() - t
+
+            print(
+                f"  {screen:12s} {len(names):2d} items: "
+                f"eval {elapsed_eval / args.frames * 1e6:6.1f} us/frame, "
+                f"compiled {elapsed_getter / args.frames * 1e6:5.1f} us/frame "
+                f"({elapsed_eval / elapsed_getter:.0f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
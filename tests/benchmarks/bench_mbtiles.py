@@ -0,0 +1,100 @@
+# map refreshes with an .mbtiles map: a connection by refresh with count(*) and
+# tile_data queries by tile as before, against MBTilesReader (tiles not decoded).
+#
+#   python -m tests.benchmarks.bench_mbtiles [--refreshes 1000] [--tiles 3]
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from modules.utils.map import MBTilesReader
+
+Z = 14
+
+
+def make_mbtiles(path, size=64, tile_size=20000):
+    con = sqlite3.connect(path)
+    con.execute(
+        "CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, "
+        "tile_row INTEGER, tile_data BLOB)"
+    )
+    con.execute(
+        "CREATE UNIQUE INDEX tile_index on tiles (zoom_level, tile_column, tile_row)"
+    )
+    data = os.urandom(tile_size)
+    con.executemany(
+        "INSERT INTO tiles VALUES (?, ?, ?, ?)",
+        [(Z, x, 2**Z - 1 - y, data) for x in range(size) for y in range(size)],
+    )
+    con.commit()
+    con.close()
+
+
+def refresh_before(path, tile_x, tile_y):
+    con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    cur = con.cursor()
+    tiles = []
+    for x in range(tile_x[0], tile_x[1] + 1):
+        for y in range(tile_y[0], tile_y[1] + 1):
+            row = 2**Z - 1 - y
+            sql = (
+                f"select count(*) from tiles where "
+                f"zoom_level={Z} and tile_column={x} and tile_row={row}"
+            )
+            if cur.execute(sql).fetchone()[0] == 1:
+                sql = (
+                    f"select tile_data from tiles where "
+                    f"zoom_level={Z} and tile_column={x} and tile_row={row}"
+                )
+                tiles.append(cur.execute(sql).fetchone()[0])
+    cur.close()
+    con.close()
+    return tiles
+
+
+def refresh_reader(reader, tile_x, tile_y):
+    reader.fetch(Z, tile_x, tile_y)
+    tiles = []
+    for x in range(tile_x[0], tile_x[1] + 1):
+        for y in range(tile_y[0], tile_y[1] + 1):
+            if reader.has_tile(Z, x, y):
+                tiles.append(reader.get(Z, x, y))
+    return tiles
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--refreshes", type=int, default=1000)
+    parser.add_argument("--tiles", type=int, default=3, help="tiles by side")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bench.mbtiles")
+        make_mbtiles(path)
+        # the view moves by one tile every 10 refreshes
+        ranges = [
+            ((i // 10) % 60, (i // 10) % 60 + args.tiles - 1)
+            for i in range(args.refreshes)
+        ]
+
+        t = time.perf_counter()
+        for r in ranges:
+            before = refresh_before(path, r, (0, args.tiles - 1))
+        elapsed_before = time.perf_counter() - t
+
+        reader = MBTilesReader(path)
+        t = time.perf_counter()
+        for r in ranges:
+            after = refresh_reader(reader, r, (0, args.tiles - 1))
+        elapsed_reader = time.perf_counter() - t
+        reader.close()
+        assert before == after
+
+    print(f"before       : {elapsed_before / args.refreshes * 1e6:.0f} us/refresh")
+    print(f"MBTilesReader: {elapsed_reader / args.refreshes * 1e6:.0f} us/refresh")
+    print(f"{elapsed_before / elapsed_reader:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
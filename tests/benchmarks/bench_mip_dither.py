@@ -0,0 +1,69 @@
+# 3bit color conversion of the MIP display by frame: conv_3bit_color_py (Python
+# mode), conv_3bit_color_np on the full frame and on 1/4 of the lines (damaged
+# lines), and conv_3bit_color of the Cython helper when it can be built (pigpio).
+#
+#   python -m tests.benchmarks.bench_mip_dither [--frames 200]
+import argparse
+import time
+
+import numpy as np
+
+from modules.display.mip_display import MipDisplay
+
+try:
+    import pyximport
+
+    pyximport.install()
+    from modules.display.cython.mip_helper import conv_3bit_color
+except Exception:
+    conv_3bit_color = None
+
+
+def bench(func, frames):
+    t = time.perf_counter()
+    for im_array in frames:
+        func(im_array)
+    return (time.perf_counter() - t) / len(frames) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for size in ((400, 240), (640, 480)):
+        display = MipDisplay.__new__(MipDisplay)
+        display.size = size
+        display.init_buffer()
+        frames = [
+            rng.integers(0, 256, (size[1], size[0], 3), dtype="uint8")
+            for _ in range(10)
+        ] * (args.frames // 10)
+        lines = size[1] // 4
+
+        results = {
+            "conv_3bit_color_py": bench(display.conv_3bit_color_py, frames),
+            "conv_3bit_color_np": bench(display.conv_3bit_color_np, frames),
+            "conv_3bit_color_np (1/4 lines)": bench(
+                lambda im_array: display.conv_3bit_color_np(
+                    im_array[lines : lines * 2]
+                ),
+                frames,
+            ),
+        }
+        if conv_3bit_color is not None:
+            results["conv_3bit_color (Cython)"] = bench(conv_3bit_color, frames)
+        else:
+            results["conv_3bit_color (Cython)"] = None
+
+        print(f"{size[0]}x{size[1]}")
+        for name, elapsed in results.items():
+            if elapsed is None:
+                print(f"  {name:30s}: not available")
+            else:
+                print(f"  {name:30s}: {elapsed:.0f} us/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Build the BIKECOMPUTER_LOG row of one record_log tick, with the nested lookups of
+# the literal tuple (as before RECORD_SCHEMA) and with the compiled getters.
+#
+#   python -m tests.benchmarks.bench_record_log [--ticks 100000]
+import argparse
+import time
+from datetime import datetime
+
+from tests.test_logger_core import get_record_logger
+
+
+def get_literal_row(self, now_time):
+    value = self.sensor.values["integrated"]
+    return (
+        now_time,
+        self.values["lap"],
+        self.values["count_lap"],
+        self.values["count"],
+        self.values["elapsed_time"],
+        ###
+        self.sensor.values["GPS"]["lat"],
+        self.sensor.values["GPS"]["lon"],
+        self.sensor.values["GPS"]["raw_lat"],
+        self.sensor.values["GPS"]["raw_lon"],
+        self.sensor.values["GPS"]["alt"],
+        self.sensor.values["GPS"]["speed"],
+        self.sensor.values["GPS"]["distance"],
+        self.sensor.values["GPS"]["mode"],
+        self.sensor.values["GPS"]["used_sats"],
+        self.sensor.values["GPS"]["total_sats"],
+        self.sensor.values["GPS"]["track"],
+        self.sensor.values["GPS"]["epx"],
+        self.sensor.values["GPS"]["epy"],
+        self.sensor.values["GPS"]["epv"],
+        self.sensor.values["GPS"]["pdop"],
+        self.sensor.values["GPS"]["hdop"],
+        self.sensor.values["GPS"]["vdop"],
+        ###
+        value["heart_rate"],
+        value["cadence"],
+        value["distance"],
+        value["speed"],
+        value["power"],
+        value["accumulated_power"],
+        ###
+        value["temperature"],
+        self.sensor.values["I2C"]["pressure"],
+        self.sensor.values["I2C"]["humidity"],
+        self.sensor.values["I2C"]["altitude"],
+        self.course.index.altitude,
+        value["dem_altitude"],
+        value["wind_speed"],
+        value["wind_direction"],
+        value["headwind"],
+        self.sensor.values["I2C"]["heading"],
+        self.sensor.values["I2C"]["m_stat"],
+        self.sensor.values["I2C"]["acc_graph"][0],
+        self.sensor.values["I2C"]["acc_graph"][1],
+        self.sensor.values["I2C"]["acc_graph"][2],
+        self.sensor.values["I2C"]["gyro_mod"][0],
+        self.sensor.values["I2C"]["gyro_mod"][1],
+        self.sensor.values["I2C"]["gyro_mod"][2],
+        self.sensor.values["I2C"]["light"],
+        value["cpu_percent"],
+        self.sensor.values["I2C"]["total_ascent"],
+        self.sensor.values["I2C"]["total_descent"],
+        ###
+        self.record_stats["lap_avg"]["heart_rate"],
+        self.record_stats["lap_avg"]["cadence"],
+        self.record_stats["lap_avg"]["distance"],
+        self.record_stats["lap_avg"]["speed"],
+        self.record_stats["lap_avg"]["power"],
+        self.record_stats["lap_avg"]["accumulated_power"],
+        self.record_stats["lap_avg"]["total_ascent"],
+        self.record_stats["lap_avg"]["total_descent"],
+        ###
+        self.record_stats["entire_avg"]["heart_rate"],
+        self.record_stats["entire_avg"]["cadence"],
+        self.record_stats["entire_avg"]["speed"],
+        self.record_stats["entire_avg"]["power"],
+        ###
+        self.average["lap"]["cadence"]["count"],
+        self.average["lap"]["cadence"]["sum"],
+        self.average["entire"]["cadence"]["count"],
+        self.average["entire"]["cadence"]["sum"],
+        self.average["lap"]["power"]["count"],
+        self.average["lap"]["power"]["sum"],
+        self.average["entire"]["power"]["count"],
+        self.average["entire"]["power"]["sum"],
+    )
+
+
+def measure(func, logger, ticks):
+    now_time = datetime.utcnow()
+    t = time.perf_counter()
+    for _ in range(ticks):
+        func(logger, now_time)
+    return (time.perf_counter() - t) / ticks * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ticks", type=int, default=100000)
+    args = parser.parse_args()
+
+    logger = get_record_logger()
+    now_time = datetime.utcnow()
+    assert get_literal_row(logger, now_time) == logger.get_record_row(now_time)
+
+    literal = measure(get_literal_row, logger, args.ticks)
+    compiled = measure(type(logger).get_record_row, logger, args.ticks)
+    print(f"literal tuple   : {literal:.2f} us/tick")
+    print(f"compiled getters: {compiled:.2f} us/tick ({literal / compiled:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
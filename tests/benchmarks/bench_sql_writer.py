@@ -0,0 +1,71 @@
+# Record rows into the log database while measuring how late the event loop wakes up
+# a sensor-like coroutine, with the database written on the loop or from the writer thread.
+#
+#   python -m tests.benchmarks.bench_sql_writer [--duration 5] [--stall 0.2]
+#
+# Slow SD card commits are emulated by sleeping --stall seconds after each commit.
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from modules.logger_core import LoggerCore
+from modules.utils.asyncio import LoopLatencyMonitor
+from tests.test_logger_core import INSERT_SQL, Config
+
+
+async def run(thread, args):
+    config = Config(thread)
+    config.G_LOG_DB_COMMIT_INTERVAL = args.commit_interval
+    config.G_LOG_DB_COMMIT_ROWS = 1000000
+
+    logger = LoggerCore(config)
+    logger.connect_db()
+    logger.init_db()
+
+    execute_sql = logger.execute_sql
+
+    def slow_execute_sql(sql_rows):
+        execute_sql(sql_rows)
+        time.sleep(args.stall)
+
+    logger.execute_sql = slow_execute_sql
+
+    worker = logger.start_sql_worker()
+    monitor = LoopLatencyMonitor(interval=args.interval)
+    monitor.start()
+
+    for i in range(int(args.duration / args.interval)):
+        await logger.sql_queue.put((INSERT_SQL, (datetime.utcnow(), i)))
+        await asyncio.sleep(args.interval)
+
+    monitor.stop()
+    await logger.sql_queue.put(None)
+    await worker
+    if logger.sql_executor is not None:
+        logger.sql_executor.shutdown()
+    logger.cur.close()
+    logger.con.close()
+
+    return monitor.get_stats()
+
+
+async def main(args):
+    print(
+        f"commit every {args.commit_interval} sec, {args.stall * 1000:.0f} ms stall per commit"
+    )
+    for name, thread in (("event loop   ", False), ("writer thread", True)):
+        stats = await run(thread, args)
+        print(
+            f"{name}: loop latency mean {stats['mean']:.1f} ms, "
+            f"p95 {stats['p95']:.1f} ms, max {stats['max']:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=5)  # [s]
+    parser.add_argument("--interval", type=float, default=0.1)  # [s]
+    parser.add_argument("--commit-interval", type=float, default=1)  # [s]
+    parser.add_argument("--stall", type=float, default=0.2)  # [s]
+    asyncio.run(main(parser.parse_args()))
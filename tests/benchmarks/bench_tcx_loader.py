@@ -0,0 +1,92 @@
+# Parse a (large) TCX course and report the parse time and peak memory of TcxLoader,
+# against reading the whole file and running one regex pass per field.
+#
+#   python -m tests.benchmarks.bench_tcx_loader [--repeat 50]
+#
+# The track of the course is repeated --repeat times to emulate a multi-MB course file.
+import argparse
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from modules.loaders.tcx import TcxLoader
+
+COURSE_FILE = "tests/data/tcx/Mt_Angel_Abbey.tcx"
+
+whole_file_patterns = {
+    "latitude": re.compile(r"<LatitudeDegrees>(?P<text>[^<]*)</LatitudeDegrees>"),
+    "longitude": re.compile(r"<LongitudeDegrees>(?P<text>[^<]*)</LongitudeDegrees>"),
+    "altitude": re.compile(r"<AltitudeMeters>(?P<text>[^<]*)</AltitudeMeters>"),
+    "distance": re.compile(r"<DistanceMeters>(?P<text>[^<]*)</DistanceMeters>"),
+}
+time_pattern = re.compile(r"<Time>(?P<text>[^<]*)</Time>")
+
+
+def make_course_file(file, repeat):
+    with open(file, "r", encoding="utf-8_sig") as f:
+        tcx = f.read()
+    start = tcx.index("<Track>") + len("<Track>")
+    end = tcx.index("</Track>")
+
+    fd, path = tempfile.mkstemp(suffix=".tcx")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(tcx[:start])
+        for _ in range(repeat):
+            f.write(tcx[start:end])
+        f.write(tcx[end:])
+    return path
+
+
+def load_whole_file(file):
+    with open(file, "r", encoding="utf-8_sig") as f:
+        tcx = f.read()
+    course = {
+        k: np.array([float(m.group("text").strip()) for m in p.finditer(tcx)])
+        for k, p in whole_file_patterns.items()
+    }
+    course["time"] = np.array([m.group("text").strip() for m in time_pattern.finditer(tcx)])
+    return course
+
+
+def measure(func, file):
+    # tracing slows down allocations a lot, so time and memory are measured in separate runs
+    t = time.perf_counter()
+    func(file)
+    elapsed = time.perf_counter() - t
+
+    tracemalloc.start()
+    func(file)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(args):
+    path = make_course_file(args.course, args.repeat)
+    try:
+        size = os.path.getsize(path)
+        course, _ = TcxLoader.load_file(path)
+        print(f"course: {len(course['latitude'])} points, {size / 2**20:.1f} MB")
+
+        for name, func in (
+            ("whole file regex", load_whole_file),
+            ("TcxLoader       ", TcxLoader.load_file),
+        ):
+            elapsed, peak = measure(func, path)
+            print(
+                f"{name}: {elapsed:.3f} sec, peak {peak / 2**20:.1f} MB "
+                f"({peak / size:.2f}x file size)"
+            )
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--course", default=COURSE_FILE)
+    parser.add_argument("--repeat", type=int, default=50)
+    main(parser.parse_args())
@@ -0,0 +1,71 @@
+# map track refreshes of a long ride: np.append of the whole track and all the points
+# drawn, against TrackBuffer and its level of detail for the view range.
+# The cost of drawing the points with pyqtgraph is not included: it is by point drawn.
+#
+#   python -m tests.benchmarks.bench_track [--hours 12] [--points 5]
+import argparse
+import time
+
+import numpy as np
+
+from modules.utils.track import TrackBuffer
+
+
+def make_track(n):
+    # random walk at 1s of ~8m/s, in degrees
+    rng = np.random.default_rng(0)
+    angle = np.cumsum(rng.normal(0, 0.05, n))
+    lon = 139.0 + np.cumsum(np.cos(angle)) * 8e-5
+    lat = 35.0 + np.cumsum(np.sin(angle)) * 8e-5
+    return lon, lat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, default=12)
+    parser.add_argument(
+        "--points", type=int, default=5, help="new points by map refresh"
+    )
+    args = parser.parse_args()
+
+    lon, lat = make_track(int(args.hours * 3600))
+    # view of ~2km around the current position, 400x400 px
+    w = 0.02
+
+    hour = 3600 // args.points
+    for name in ("np.append", "TrackBuffer"):
+        track = TrackBuffer()
+        tracks_lon = np.array([])
+        tracks_lat = np.array([])
+        elapsed = []
+        drawn = []
+        for i in range(0, len(lon), args.points):
+            new_lon = lon[i : i + args.points]
+            new_lat = lat[i : i + args.points]
+            t = time.perf_counter()
+            if name == "np.append":
+                tracks_lon = np.append(tracks_lon, new_lon)
+                tracks_lat = np.append(tracks_lat, new_lat)
+                x = tracks_lon
+            else:
+                track.append(new_lon, new_lat)
+                x, _ = track.get_lod(
+                    new_lon[-1] - w / 2,
+                    new_lon[-1] + w / 2,
+                    new_lat[-1] - w / 2,
+                    new_lat[-1] + w / 2,
+                    400,
+                    400,
+                )
+            elapsed.append(time.perf_counter() - t)
+            drawn.append(len(x))
+        print(
+            f"{name:11s}: {np.mean(elapsed[:hour]) * 1e6:.0f} us/refresh "
+            f"(first hour), {np.mean(elapsed[-hour:]) * 1e6:.0f} us/refresh "
+            f"(last hour), points drawn: {np.mean(drawn[:hour]):.0f} / "
+            f"{np.mean(drawn[-hour:]):.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,17 @@
+import os
+import tempfile
 import unittest
 from tempfile import NamedTemporaryFile
 
-from modules.course import Course
+import numpy as np
+
+from modules.course import (
+    COURSE_CACHE_ARRAYS,
+    COURSE_POINTS_CACHE_ARRAYS,
+    Course,
+    get_nearest_index,
+)
+from tests.test_loader import GPX, make_gpx_waypoints
 
 
 class Config:
@@ -14,6 +24,8 @@ class Config:
     G_GPS_ON_ROUTE_CUTOFF = 50  # [m] #generate from course
     G_GPS_SEARCH_RANGE = 6  # [km] #100km/h -> 27.7m/s
     G_GPS_AZIMUTH_CUTOFF = 60  # degree(30/45/90): 0~G_GPS_AZIMUTH_CUTOFF, (360-G_GPS_AZIMUTH_CUTOFF)~G_GPS_AZIMUTH_CUTOFF
+    G_GPS_INCREMENTAL_SEARCH = False
+    G_GPS_SEGMENT_GRID_MIN_POINTS = 0
 
     # Graph color by slope
     G_CLIMB_DISTANCE_CUTOFF = 0.3  # [km]
@@ -37,6 +49,13 @@ class Config:
 
     G_THINGSBOARD_API = {"STATUS": False}
 
+    G_IS_RASPI = False
+    G_GROSS_AVE_SPEED = 15  # [km/h]
+
+    class logger:
+        class sensor:
+            values = {"integrated": {"grade": np.nan}}
+
     def __init__(self, indexing=False):
         self.G_COURSE_INDEXING = indexing
         self.G_COURSE_FILE_PATH = NamedTemporaryFile().name
@@ -87,3 +106,125 @@ class TestCourse(unittest.TestCase):
         self.assertEqual(course.course_points.latitude[-1], 45.5788)
         self.assertEqual(course.course_points.longitude[-1], -122.7135)
         self.assertEqual(course.course_points.distance[-1], 12.286501)
+
+
+class TestCourseIndex(unittest.IsolatedAsyncioTestCase):
+    def test_get_nearest_index(self):
+        rng = np.random.default_rng(0)
+
+        for _ in range(200):
+            # cumulative distance, with some repeated values
+            distance = np.cumsum(rng.integers(0, 4, rng.integers(1, 30)) / 2)
+            for value in np.arange(-1, distance[-1] + 1, 0.25):
+                self.assertEqual(
+                    get_nearest_index(distance, value),
+                    np.abs(distance - value).argmin(),
+                )
+
+    async def test_get_index_segment_grid(self):
+        courses = []
+        for _ in range(3):
+            course = Course(Config(indexing=True))
+            course.load(file="tests/data/tcx/Mt_Angel_Abbey.tcx")
+            courses.append(course)
+        self.assertIsNotNone(courses[0].segment_grid)
+        # not built for short courses
+        config = Config(indexing=True)
+        config.G_GPS_SEGMENT_GRID_MIN_POINTS = 30000
+        course = Course(config)
+        course.load(file="tests/data/tcx/Mt_Angel_Abbey.tcx")
+        self.assertIsNone(course.segment_grid)
+        # full scan of the search windows
+        courses[1].segment_grid = None
+        # windows ahead of the current index first
+        courses[2].config.G_GPS_INCREMENTAL_SEARCH = True
+
+        rng = np.random.default_rng(0)
+        n = len(courses[0].latitude)
+
+        for i in range(500):
+            j = rng.integers(0, n - 1)
+            lat, lon = (
+                courses[0].latitude[j] + rng.normal(0, 0.001),
+                courses[0].longitude[j] + rng.normal(0, 0.001),
+            )
+            track = (courses[0].azimuth[j] + rng.integers(-90, 90)) % 360
+
+            for course in courses:
+                course.get_index(lat, lon, track, 6, 50, [60, 300])
+
+            for course in courses[1:]:
+                self.assertEqual(courses[0].index.value, course.index.value)
+                self.assertEqual(
+                    courses[0].index.on_course_status, course.index.on_course_status
+                )
+                self.assertEqual(courses[0].index.distance, course.index.distance)
+
+    async def test_load_cache(self):
+        config = Config(indexing=True)
+        course = Course(config)
+        course.load(file="tests/data/tcx/Mt_Angel_Abbey.tcx")
+        self.assertTrue(os.path.exists(course.cache_file_path))
+
+        cached_course = Course(config)
+        self.assertTrue(cached_course.load_cache(cached_course.get_cache_key()))
+        cached_course.load()
+
+        self.assertEqual(course.info, cached_course.info)
+        for k in COURSE_CACHE_ARRAYS:
+            np.testing.assert_array_equal(getattr(course, k), getattr(cached_course, k))
+        for k in COURSE_POINTS_CACHE_ARRAYS:
+            np.testing.assert_array_equal(
+                getattr(course.course_points, k), getattr(cached_course.course_points, k)
+            )
+        self.assertIsNotNone(cached_course.segment_grid)
+
+        # a parameter change invalidates the cache
+        config.G_CLIMB_GRADE_CUTOFF = 3
+        self.assertFalse(Course(config).load_cache(course.get_cache_key()))
+
+        course.reset(delete_course_file=True)
+        self.assertFalse(os.path.exists(course.cache_file_path))
+
+    async def test_load_gpx_waypoints_order(self):
+        course = Course(Config(indexing=True))
+        _, path = tempfile.mkstemp(suffix=".gpx")
+        try:
+            with open(path, "w") as f:
+                f.write(make_gpx_waypoints([30, 5, 20, 12]))
+            course.load(file=path)
+        finally:
+            os.remove(path)
+
+        distance = course.course_points.distance
+        self.assertTrue(np.all(np.diff(distance) >= 0))
+        self.assertEqual(
+            list(course.course_points.name)[1:5], ["Wpt5", "Wpt12", "Wpt20", "Wpt30"]
+        )
+        course.reset(delete_course_file=True)
+
+    async def test_load_by_extension(self):
+        config = Config(indexing=True)
+        course = Course(config)
+        course.load(file="tests/data/tcx/Mt_Angel_Abbey.tcx")
+        self.assertEqual(course.get_course_file_ext(), "tcx")
+
+        # the format of the current course is detected from its content
+        _, path = tempfile.mkstemp(suffix=".gpx")
+        try:
+            with open(path, "w") as f:
+                f.write(GPX)
+            course.load(file=path)
+        finally:
+            os.remove(path)
+        self.assertEqual(course.get_course_file_ext(), "gpx")
+
+        course = Course(config)
+        course.load()
+        self.assertEqual(len(course.latitude), 4)
+        # start point is inserted
+        np.testing.assert_array_equal(
+            course.course_points.name, ["Start", "Water", "Left"]
+        )
+
+        course.reset(delete_course_file=True)
@@ -0,0 +1,44 @@
+import unittest
+from collections import defaultdict
+from types import SimpleNamespace
+
+from modules.gui_config import GUI_Config
+
+
+class Values(dict):
+    # nested values, created on access
+    def __missing__(self, key):
+        value = self[key] = Values()
+        return value
+
+
+def get_widget():
+    return SimpleNamespace(
+        sensor=SimpleNamespace(values=Values()),
+        logger=SimpleNamespace(values=Values(), record_stats=Values()),
+        # ANT+ ID and type of the sensors
+        config=SimpleNamespace(G_ANT={"ID_TYPE": defaultdict(int)}),
+    )
+
+
+class TestGuiConfig(unittest.TestCase):
+    def test_item_getters(self):
+        gui_config = GUI_Config("layouts/layout-cycling.yaml")
+        # compiled with the layout
+        self.assertIn("Power", gui_config.item_getters)
+        self.assertIn("Latitude", gui_config.item_getters)
+
+        widget = get_widget()
+        for name, (_, expression) in GUI_Config.G_ITEM_DEF.items():
+            value = gui_config.get_item_getter(name)(widget)
+            self.assertIs(value, eval(expression, {}, {"self": widget}), name)
+        self.assertIs(
+            gui_config.get_item_getter("Power"), gui_config.item_getters["Power"]
+        )
+
+        # values are read at each call
+        widget.sensor.values["integrated"]["power"] = 123
+        self.assertEqual(gui_config.get_item_getter("Power")(widget), 123)
+
+        # no layout file
+        self.assertEqual(GUI_Config("not_found.yaml").item_getters, {})
@@ -0,0 +1,105 @@
+import asyncio
+import unittest
+
+import numpy as np
+
+from modules.display.line_queue import LineQueue
+from modules.display.mip_display import MipDisplay
+from modules.display.mip_sharp_display import MipSharpDisplay
+
+
+class FakePi:
+    # pigpio.pi stand-in, records the SPI writes
+    def __init__(self):
+        self.spi_writes = []
+
+    def write(self, gpio, level):
+        pass
+
+    def spi_write(self, handle, data):
+        self.spi_writes.append(bytes(data))
+
+
+def make_display(cls, size):
+    display = cls.__new__(cls)
+    display.size = size
+    display.init_buffer()
+    display.pi = FakePi()
+    display.spi = 0
+    return display
+
+
+class TestLineQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_coalesce(self):
+        queue = LineQueue(10, max_lines=4)
+        queue.put(np.array([0, 1, 2]))
+        # frame 0 replaced, frame 1 partly replaced
+        queue.put(np.array([1, 2, 5]))
+        queue.put(np.array([0, 1, 2, 3, 7]))
+        metrics = queue.get_metrics()
+        self.assertEqual(metrics["frames"], 3)
+        self.assertEqual(metrics["frames_dropped"], 1)
+        self.assertEqual(metrics["pending_lines"], 6)
+
+        rows = await queue.get()
+        self.assertEqual(rows.tolist(), [0, 1, 2, 3])
+        queue.task_done(40)
+        self.assertEqual(queue.get_metrics()["frames_written"], 0)
+        rows = await queue.get()
+        self.assertEqual(rows.tolist(), [5, 7])
+        queue.task_done(20)
+
+        metrics = queue.get_metrics()
+        self.assertEqual(metrics["frames_written"], 2)
+        self.assertEqual(metrics["pending_lines"], 0)
+        self.assertGreater(metrics["spi_bytes_per_sec"], 0)
+        self.assertGreaterEqual(metrics["latency_max"], metrics["latency_avg"])
+
+        # waits for a frame, returns None when closed
+        task = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+        self.assertFalse(task.done())
+        queue.put(np.array([9]))
+        self.assertEqual((await task).tolist(), [9])
+        queue.close()
+        self.assertIsNone(await queue.get())
+
+    async def test_mip_sharp_display(self):
+        display = make_display(MipSharpDisplay, (400, 240))
+        display.start_coroutine()
+        im_array = np.zeros((240, 50), dtype="uint8")
+        # screen cleared as in __init__
+        display.update(im_array, direct_update=True)
+        display.pi.spi_writes = []
+
+        # 3 frames before the worker runs: the last one is written only
+        for i in range(3):
+            im_array[10:20] = i + 1
+            display.update(im_array, direct_update=False)
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(len(display.pi.spi_writes), 2)  # lines and dummy output
+        expected = display.img_buff_rgb8[10:20].tobytes()
+        self.assertEqual(display.pi.spi_writes[0], expected)
+        metrics = display.draw_queue.get_metrics()
+        self.assertEqual(metrics["frames_dropped"], 2)
+        self.assertEqual(metrics["frames_written"], 1)
+        display.draw_queue.close()
+
+    async def test_mip_display(self):
+        # MIP_640: 270 lines by write at most
+        display = make_display(MipDisplay, (640, 480))
+        display.conv_color = display.conv_3bit_color_np
+        display.start_coroutine()
+        im_array = np.full((480, 640, 3), 255, dtype="uint8")
+        display.update(im_array, direct_update=False)
+        await asyncio.sleep(0.01)
+
+        lines = display.pi.spi_writes[0::2]
+        self.assertEqual([len(l) // display.buff_width for l in lines], [270, 210])
+        self.assertEqual(b"".join(lines), display.img_buff_rgb8.tobytes())
+        display.draw_queue.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
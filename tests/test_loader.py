@@ -1,6 +1,74 @@
+import os
+import sqlite3
+import struct
+import tempfile
 import unittest
+from datetime import datetime, timezone
 
+import numpy as np
+
+from modules.loaders.fit import FitLoader
+from modules.loaders.gpx import GpxLoader
 from modules.loaders.tcx import TcxLoader
+from modules.logger.logger_fit import LoggerFit
+
+GPX = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+  <metadata><name>Test course</name></metadata>
+  <wpt lat="45.001" lon="-122.001"><name>Water</name><type>Water</type></wpt>
+  <wpt lat="45.002" lon="-122.002"><name>Go</name><type>Straight</type></wpt>
+  <wpt lat="45.003" lon="-122.003"><name>Left</name><sym>Left</sym><desc>turn</desc></wpt>
+  <trk>
+    <name>Track</name>
+    <trkseg>
+      <trkpt lat="45.000" lon="-122.000"><ele>10.0</ele></trkpt>
+      <trkpt lat="45.001" lon="-122.001"></trkpt>
+      <trkpt lat="45.002" lon="-122.002"><ele>30.0</ele></trkpt>
+      <trkpt lat="45.003" lon="-122.003"><ele>40.0</ele></trkpt>
+    </trkseg>
+  </trk>
+</gpx>
+"""
+
+
+def make_gpx_waypoints(indexes, n=40):
+    # track along a diagonal and waypoints next to its points, in the order of indexes
+    trkpt = "".join(
+        f'<trkpt lat="{45 + i * 0.001:.3f}" lon="{-122 + i * 0.001:.3f}"></trkpt>'
+        for i in range(n)
+    )
+    wpt = "".join(
+        f'<wpt lat="{45 + i * 0.001 + 0.0001:.4f}" lon="{-122 + i * 0.001:.4f}">'
+        f"<name>Wpt{i}</name></wpt>"
+        for i in indexes
+    )
+    return (
+        '<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1">'
+        f"{wpt}<trk><trkseg>{trkpt}</trkseg></trk></gpx>"
+    )
+
+
+def make_fit_course_points(points):
+    # FIT file of course_point messages (lat, lon [deg], distance [m], type, name)
+    messages = bytes([0x40, 0, 0]) + struct.pack("<HB", 32, 5)
+    # position_lat, position_long, distance, type, name
+    messages += bytes([2, 4, 0x85, 3, 4, 0x85, 4, 4, 0x86, 5, 1, 0x00, 6, 16, 0x07])
+    for lat, lon, distance, point_type, name in points:
+        messages += bytes([0]) + struct.pack(
+            "<iiIB16s",
+            round(lat / 180 * 2**31),
+            round(lon / 180 * 2**31),
+            round(distance * 100),
+            point_type,
+            name.encode(),
+        )
+    header = struct.pack("<BBHI4s", 12, 0x10, 2093, len(messages), b".FIT")
+    return header + messages + b"\0\0"
+
+
+class LocalConfig:
+    G_LOG_DB = "tests/data/log.db-Heart_of_St._Johns_Peninsula_Ride"
+    G_UNIT_ID_HEX = 0x12345678
 
 
 class TestLoader(unittest.TestCase):
@@ -13,3 +81,124 @@ class TestLoader(unittest.TestCase):
 
         # validate that course_point distance was set correctly
         self.assertTrue(len(data_course_points["distance"]))
+
+    def test_tcx_chunks(self):
+        # elements cut at chunk boundaries are parsed the same
+        for file in (
+            "tests/data/tcx/Mt_Angel_Abbey.tcx",
+            "tests/data/tcx/Heart_of_St._Johns_Peninsula_Ride.tcx",
+        ):
+            data_course, data_course_points = TcxLoader.load_file(file)
+            try:
+                TcxLoader.CHUNK_SIZE = 7
+                chunk_course, chunk_course_points = TcxLoader.load_file(file)
+            finally:
+                TcxLoader.CHUNK_SIZE = 1 << 20
+
+            self.assertEqual(data_course["info"], chunk_course["info"])
+            for k in ("latitude", "longitude", "altitude", "distance"):
+                np.testing.assert_array_equal(data_course[k], chunk_course[k])
+            self.assertEqual(data_course_points.keys(), chunk_course_points.keys())
+            for k, v in data_course_points.items():
+                np.testing.assert_array_equal(v, chunk_course_points[k])
+
+    def test_gpx(self):
+        _, path = tempfile.mkstemp(suffix=".gpx")
+        try:
+            with open(path, "w") as f:
+                f.write(GPX)
+            data_course, data_course_points = GpxLoader.load_file(path)
+        finally:
+            os.remove(path)
+
+        self.assertEqual(data_course["info"], {"Name": "Test course"})
+        np.testing.assert_array_equal(
+            data_course["latitude"], [45.000, 45.001, 45.002, 45.003]
+        )
+        # missing elevation is interpolated
+        np.testing.assert_array_equal(data_course["altitude"], [10, 20, 30, 40])
+        self.assertEqual(len(data_course["distance"]), 0)
+
+        # 'Straight' is removed
+        np.testing.assert_array_equal(data_course_points["name"], ["Water", "Left"])
+        np.testing.assert_array_equal(data_course_points["type"], ["Water", "Left"])
+        np.testing.assert_array_equal(data_course_points["notes"], ["", "turn"])
+
+    def test_gpx_waypoints_order(self):
+        # wpt out of the route order are sorted along the track
+        _, path = tempfile.mkstemp(suffix=".gpx")
+        try:
+            with open(path, "w") as f:
+                f.write(make_gpx_waypoints([30, 5, 20, 12]))
+            _, data_course_points = GpxLoader.load_file(path)
+        finally:
+            os.remove(path)
+
+        np.testing.assert_array_equal(
+            data_course_points["name"], ["Wpt5", "Wpt12", "Wpt20", "Wpt30"]
+        )
+        np.testing.assert_allclose(
+            data_course_points["latitude"], [45.0051, 45.0121, 45.0201, 45.0301]
+        )
+
+    def test_fit_course_points(self):
+        _, path = tempfile.mkstemp(suffix=".fit")
+        try:
+            with open(path, "wb") as f:
+                f.write(
+                    make_fit_course_points(
+                        [
+                            (45.001, -122.001, 100, 3, "Water"),
+                            (45.002, -122.002, 200, 8, "Go"),
+                            (45.003, -122.003, 350.5, 6, "Left"),
+                        ]
+                    )
+                )
+            data_course, data_course_points = FitLoader.load_file(path)
+        finally:
+            os.remove(path)
+
+        self.assertEqual(len(data_course["latitude"]), 0)
+        # 'Straight' is removed
+        np.testing.assert_array_equal(data_course_points["name"], ["Water", "Left"])
+        np.testing.assert_array_equal(data_course_points["type"], ["Water", "Left"])
+        np.testing.assert_allclose(
+            data_course_points["latitude"], [45.001, 45.003], atol=1e-6
+        )
+        np.testing.assert_allclose(
+            data_course_points["longitude"], [-122.001, -122.003], atol=1e-6
+        )
+        # [km]
+        np.testing.assert_allclose(data_course_points["distance"], [0.1, 0.3505])
+
+    def test_fit(self):
+        # records of an activity file written from the log
+        logger = LoggerFit(LocalConfig())
+        start = datetime(2023, 9, 28, 20, 39, 13, tzinfo=timezone.utc)
+        end = datetime(2023, 9, 28, 21, 10, 53, tzinfo=timezone.utc)
+
+        _, path = tempfile.mkstemp(suffix=".fit")
+        try:
+            self.assertTrue(logger.write_log_python(path, start, end))
+            data_course, data_course_points = FitLoader.load_file(path)
+        finally:
+            os.remove(path)
+
+        con = sqlite3.connect(LocalConfig.G_LOG_DB)
+        rows = np.array(
+            con.execute(
+                "SELECT position_lat, position_long, distance FROM BIKECOMPUTER_LOG "
+                "WHERE position_lat IS NOT NULL AND position_long IS NOT NULL "
+                "ORDER BY lap, rowid"
+            ).fetchall(),
+            dtype=float,
+        )
+        con.close()
+
+        self.assertEqual(len(data_course["latitude"]), len(rows))
+        np.testing.assert_allclose(data_course["latitude"], rows[:, 0], atol=1e-6)
+        np.testing.assert_allclose(data_course["longitude"], rows[:, 1], atol=1e-6)
+        np.testing.assert_allclose(data_course["distance"], rows[:, 2], atol=0.01)
+        # no altitude in the log
+        self.assertEqual(len(data_course["altitude"]), 0)
+        self.assertEqual(len(data_course_points["name"]), 0)
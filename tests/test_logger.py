@@ -1,8 +1,12 @@
 import os
+import shutil
+import sqlite3
 import tempfile
 import unittest
 from datetime import datetime, timezone
 
+from modules.loaders import FitLoader
+from modules.logger.cython.crc16_p import crc16, crc16_combine
 from modules.logger.logger_csv import LoggerCsv
 from modules.logger.logger_fit import LoggerFit
 
@@ -12,6 +16,18 @@ class LocalConfig:
     G_UNIT_ID_HEX = 0x12345678
 
 
+class TestCrc16(unittest.TestCase):
+    def test_crc16(self):
+        data = b"123456789"
+        self.assertEqual(crc16(data), 0xBB3D)
+        self.assertEqual(crc16(data[4:], crc16(data[:4])), 0xBB3D)
+        for i in range(len(data) + 1):
+            self.assertEqual(
+                crc16_combine(crc16(data[:i]), crc16(data[i:]), len(data) - i),
+                0xBB3D,
+            )
+
+
 class TestLoggerCsv(unittest.TestCase):
     def test_write_log(self):
         config = LocalConfig()
@@ -60,3 +76,46 @@ class TestLoggerFit(unittest.TestCase):
             os.remove(path)
 
         self.assertEqual(cython_data, python_data)
+
+    def test_write_logs_laps(self):
+        # lap and session summaries with 3 laps, read back with FitLoader
+        config = LocalConfig()
+        _, config.G_LOG_DB = tempfile.mkstemp()
+        shutil.copy(LocalConfig.G_LOG_DB, config.G_LOG_DB)
+        con = sqlite3.connect(config.G_LOG_DB)
+        count = con.execute("SELECT COUNT(*) FROM BIKECOMPUTER_LOG").fetchone()[0]
+        con.execute(f"UPDATE BIKECOMPUTER_LOG SET lap = (rowid - 1) * 3 / {count}")
+        con.commit()
+        lap_distance = con.execute(
+            "SELECT MAX(lap_distance) FROM BIKECOMPUTER_LOG GROUP BY lap"
+        ).fetchall()
+        lap_speed = con.execute(
+            "SELECT lap_speed FROM BIKECOMPUTER_LOG WHERE rowid IN ("
+            "  SELECT MAX(rowid) FROM BIKECOMPUTER_LOG GROUP BY lap)"
+        ).fetchall()
+        con.close()
+        logger = LoggerFit(config)
+
+        start = datetime(2023, 9, 28, 20, 39, 13, tzinfo=timezone.utc)
+        end = datetime(2023, 9, 28, 21, 10, 53, tzinfo=timezone.utc)
+
+        _, path = tempfile.mkstemp()
+        try:
+            self.assertTrue(logger.write_log_python(path, start, end))
+            with open(path, "rb") as f:
+                data = f.read()
+        finally:
+            os.remove(path)
+            os.remove(config.G_LOG_DB)
+
+        self.assertEqual(crc16(data), 0)
+        runs = FitLoader.read_messages(data, (18, 19))
+        self.assertEqual(
+            list(FitLoader.get_field(runs[19], "f9", "u4", 0)),
+            [int(v[0] * 100) for v in lap_distance],
+        )
+        self.assertEqual(
+            list(FitLoader.get_field(runs[19], "f13", "u2", 0)),
+            [int(v[0] * 1000) for v in lap_speed],
+        )
+        self.assertEqual(list(FitLoader.get_field(runs[18], "f26", "u2", 0)), [2])
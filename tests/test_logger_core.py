@@ -0,0 +1,365 @@
+import asyncio
+import math
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+from modules.logger_core import RECORD_SCHEMA, LoggerCore
+
+
+class Config:
+    G_DUMMY_OUTPUT = False
+    G_LOG_DB = None
+    G_LOG_DB_COMMIT_INTERVAL = 0.2  # [s]
+    G_LOG_DB_COMMIT_ROWS = 5
+    G_LOG_DB_SYNCHRONOUS = "NORMAL"
+    G_LOG_DB_THREAD = False
+    G_LOG_DB_QUEUE_SIZE = 10
+
+    def __init__(self, thread=False):
+        self.G_LOG_DB = os.path.join(tempfile.mkdtemp(), "log.db")
+        self.G_LOG_DB_THREAD = thread
+
+
+INSERT_SQL = "INSERT INTO BIKECOMPUTER_LOG (timestamp, lap) VALUES (?, ?)"
+
+
+def get_record_logger(thread=False):
+    # logger with sensor values of all the columns of RECORD_SCHEMA, set to distinct numbers
+    logger = LoggerCore(Config(thread))
+    logger.sensor = SimpleNamespace(values={"GPS": {}, "I2C": {}, "integrated": {}})
+    logger.course = SimpleNamespace(index=SimpleNamespace(altitude=1.0))
+    logger.values = dict(logger.values)
+    logger.record_stats = {
+        k: dict.fromkeys(logger.lap_keys, 0) for k in logger.record_stats
+    }
+    logger.average = {
+        k1: {k2: {"count": 0, "sum": 0} for k2 in v} for k1, v in logger.average.items()
+    }
+    for i, (_, source, key) in enumerate(RECORD_SCHEMA):
+        if source not in logger.sensor.values:
+            continue
+        if isinstance(key, tuple):
+            key, size = key
+            logger.sensor.values[source][key] = [i + 0.1 * j for j in range(size + 1)]
+        else:
+            logger.sensor.values[source][key] = float(i)
+    logger.compile_record_row()
+    return logger
+
+
+class TestLoggerCoreSql(unittest.IsolatedAsyncioTestCase):
+    def get_logger(self, thread):
+        logger = LoggerCore(Config(thread))
+        logger.connect_db()
+        logger.init_db()
+        return logger
+
+    @staticmethod
+    def close_logger(logger):
+        if logger.sql_executor is not None:
+            logger.sql_executor.shutdown()
+        logger.cur.close()
+        logger.con.close()
+
+    @staticmethod
+    def count_rows(logger):
+        # committed rows, seen from another connection
+        con = sqlite3.connect(logger.config.G_LOG_DB)
+        count = con.execute("SELECT COUNT(*) FROM BIKECOMPUTER_LOG").fetchone()[0]
+        con.close()
+        return count
+
+    async def test_sql_worker(self):
+        for thread in (False, True):
+            logger = self.get_logger(thread)
+            self.assertEqual(
+                logger.con.execute("PRAGMA journal_mode").fetchone()[0], "wal"
+            )
+            worker = logger.start_sql_worker()
+
+            # committed by rows
+            for i in range(7):
+                await logger.sql_queue.put((INSERT_SQL, ("2023-01-01", i)))
+            await asyncio.sleep(0.05)
+            self.assertEqual(self.count_rows(logger), 5)
+
+            # committed by interval
+            await asyncio.sleep(0.3)
+            self.assertEqual(self.count_rows(logger), 7)
+
+            # committed on quit
+            await logger.sql_queue.put((INSERT_SQL, ("2023-01-01", 7)))
+            await logger.sql_queue.put(None)
+            await worker
+            self.assertEqual(self.count_rows(logger), 8)
+
+            # rows are kept in order
+            laps = logger.con.execute(
+                "SELECT lap FROM BIKECOMPUTER_LOG ORDER BY rowid"
+            ).fetchall()
+            self.assertEqual([lap[0] for lap in laps], list(range(8)))
+            self.close_logger(logger)
+
+    async def test_flush_sql(self):
+        for thread in (False, True):
+            logger = self.get_logger(thread)
+            logger.start_sql_worker()
+            for i in range(3):
+                await logger.sql_queue.put((INSERT_SQL, ("2023-01-01", i)))
+            logger.flush_sql()
+            self.assertEqual(self.count_rows(logger), 3)
+            self.assertTrue(logger.sql_queue.empty())
+            self.close_logger(logger)
+
+    def test_record_row(self):
+        logger = get_record_logger()
+        logger.connect_db()
+        logger.init_db()
+        now_time = datetime(2023, 1, 1)
+        row = logger.get_record_row(now_time)
+        logger.cur.execute(logger.insert_sql, row)
+
+        logger.cur.execute("SELECT * FROM BIKECOMPUTER_LOG")
+        columns = [c[0] for c in logger.cur.description]
+        values = dict(zip(columns, logger.cur.fetchone()))
+        self.assertEqual(len(columns), len(row))
+        index = {c[0]: i for i, c in enumerate(RECORD_SCHEMA)}
+        self.assertEqual(values["position_lat"], index["position_lat"])
+        self.assertEqual(values["course_altitude"], 1.0)
+        self.assertEqual(values["acc_z"], index["acc"] + 0.2)
+        self.assertEqual(values["gyro_x"], index["gyro"])
+        self.assertEqual(values["total_descent"], index["total_descent"])
+        self.assertEqual(
+            values["avg_power_sum"], logger.average["entire"]["power"]["sum"]
+        )
+
+        # sensor values are read at each call
+        logger.sensor.values["I2C"]["acc_graph"] = [1.0, 2.0, 3.0]
+        logger.sensor.values["GPS"]["lat"] = 35.0
+        row = logger.get_record_row(now_time)
+        self.assertEqual(row[columns.index("position_lat")], 35.0)
+        acc = columns.index("acc_x")
+        self.assertEqual(row[acc : acc + 3], (1.0, 2.0, 3.0))
+        self.close_logger(logger)
+
+    @staticmethod
+    def get_resume_state(logger):
+        return {
+            "values": {
+                k: logger.values[k] for k in ("lap", "count_lap", "count", "start_time")
+            },
+            "last_timestamp": logger.last_timestamp,
+            "record_stats": logger.record_stats,
+            "average": logger.average,
+            "distance": logger.sensor.values["integrated"]["distance"],
+            "total_ascent": logger.sensor.values["I2C"]["total_ascent"],
+        }
+
+    def test_resume_snapshot(self):
+        logger = get_record_logger()
+        logger.connect_db()
+        logger.init_db()
+        logger.reset()
+
+        # 3 laps, with missing values
+        start = datetime(2023, 1, 1, 0, 0, 0, 123456)
+        integrated = logger.sensor.values["integrated"]
+        sql_rows = []
+        for i in range(30):
+            logger.values["lap"] = i // 10
+            logger.values["count_lap"] = i % 10
+            logger.values["count"] = i
+            integrated["heart_rate"] = math.nan if i % 4 == 0 else 100.0 + i % 7
+            integrated["speed"] = math.nan if i % 5 == 0 else 5.0 + i % 11
+            integrated["distance"] = 10.0 * i
+            logger.record_stats["lap_avg"]["distance"] = 10.0 * (i % 10)
+            sql_rows.append(
+                (
+                    logger.insert_sql,
+                    logger.get_record_row(start + timedelta(seconds=i)),
+                )
+            )
+            if len(sql_rows) == 7:
+                logger.execute_sql(sql_rows)
+                sql_rows = []
+        logger.execute_sql(sql_rows)
+        self.close_logger(logger)
+        log_db = logger.config.G_LOG_DB
+
+        states = []
+        for use_snapshot in (True, False):
+            logger = get_record_logger()
+            logger.config.G_LOG_DB = log_db
+            logger.connect_db()
+            logger.init_db()
+            self.assertIsNotNone(logger.load_resume_snapshot())
+            if not use_snapshot:
+                # the log is scanned without snapshot
+                logger.cur.execute("DELETE FROM BIKECOMPUTER_RESUME")
+                self.assertIsNone(logger.load_resume_snapshot())
+            logger.resume()
+            states.append(self.get_resume_state(logger))
+            self.close_logger(logger)
+
+        self.assertEqual(states[0], states[1])
+        self.assertEqual(states[0]["values"]["lap"], 2)
+        self.assertEqual(states[0]["record_stats"]["pre_lap_max"]["heart_rate"], 106)
+        self.assertEqual(states[0]["record_stats"]["pre_lap_max"]["distance"], 190.0)
+
+        # stale snapshot: rows written without updating it
+        logger = get_record_logger()
+        logger.config.G_LOG_DB = log_db
+        logger.connect_db()
+        logger.init_db()
+        logger.cur.execute(INSERT_SQL, (start, 2))
+        self.assertIsNone(logger.load_resume_snapshot())
+        self.close_logger(logger)
+
+    def test_read_track(self):
+        logger = get_record_logger()
+        logger.connect_db()
+        logger.init_db()
+        logger.reset()
+
+        # positions are missing every 3 rows
+        start = datetime(2023, 1, 1, 0, 0, 0, 500000)
+        gps = logger.sensor.values["GPS"]
+        integrated = logger.sensor.values["integrated"]
+        sql_rows = []
+        for i in range(20):
+            gps["lat"] = math.nan if i % 3 == 0 else 35.0 + 0.001 * i
+            gps["lon"] = math.nan if i % 3 == 0 else 139.0 + 0.001 * i
+            integrated["distance"] = 10.0 * i
+            sql_rows.append(
+                (logger.insert_sql, logger.get_record_row(start + timedelta(seconds=i)))
+            )
+        logger.execute_sql(sql_rows)
+        logger.track_chunk_size = 4
+
+        track = list(logger.read_track())
+        self.assertEqual([len(t[0]) for t in track], [4, 4, 4, 1])
+        rowid, distance, lat, lon = (np.concatenate(t) for t in zip(*track))
+        index = [i for i in range(20) if i % 3]
+        np.testing.assert_array_equal(rowid, np.array(index) + 1)
+        np.testing.assert_array_equal(distance, 10.0 * np.array(index))
+        np.testing.assert_allclose(lat, 35.0 + 0.001 * np.array(index))
+
+        # rows after a timestamp
+        track = list(logger.read_track(timestamp=start + timedelta(seconds=14)))
+        np.testing.assert_array_equal(track[0][0], [17, 18, 20])
+        plan = logger.track_con.execute(
+            "EXPLAIN QUERY PLAN SELECT rowid FROM BIKECOMPUTER_LOG WHERE timestamp > ?",
+            ("2023",),
+        ).fetchall()
+        self.assertIn("timestamp_index", plan[0][-1])
+
+        # track from the db, then the rows written after it
+        timestamp, _, lat, _ = logger.read_track_db(start)
+        self.assertEqual(timestamp, start + timedelta(seconds=19))
+        self.assertEqual(len(lat), 13)
+        # no row read again
+        timestamp, _, lat, _ = logger.read_track_db(timestamp)
+        self.assertEqual(timestamp, start + timedelta(seconds=19))
+        self.assertEqual(len(lat), 0)
+        gps["lat"], gps["lon"] = 36.0, 140.0
+        logger.execute_sql(
+            [(logger.insert_sql, logger.get_record_row(start + timedelta(seconds=20)))]
+        )
+        timestamp, _, lat, _ = logger.read_track_db(timestamp)
+        self.assertEqual(timestamp, start + timedelta(seconds=20))
+        self.assertEqual(len(lat), 1)
+        self.assertEqual(lat[-1], np.float32(36.0))
+
+        logger.close_track_db()
+        self.assertIsNone(logger.track_con)
+        self.close_logger(logger)
+
+    def test_short_log(self):
+        logger = LoggerCore(Config())
+        logger.short_log = np.full((8, 4), np.nan)
+        start = datetime(2023, 1, 1, 0, 0, 0, 500000)
+
+        def store(i):
+            logger.store_short_log_for_update_track(
+                10.0 * i, 35.0 + i, 139.0 + i, start + timedelta(seconds=i)
+            )
+
+        # no position or same point
+        logger.store_short_log_for_update_track(0.0, math.nan, 139.0, start)
+        store(0)
+        store(0)
+        for i in range(1, 5):
+            store(i)
+        timestamp, lon, lat = logger.update_track(start)
+        self.assertEqual(timestamp, start + timedelta(seconds=4))
+        self.assertEqual(lat[-1], 39.0)
+        self.assertEqual(len(logger.read_short_log()), 0)
+
+        # over the ring buffer: the oldest unread points are dropped
+        for i in range(5, 30):
+            store(i)
+        self.assertTrue(logger.short_log_overflow)
+        rows = logger.read_short_log()
+        np.testing.assert_array_equal(rows[:, 1], 35.0 + np.arange(22, 30))
+        self.assertEqual(logger.short_log_write - logger.short_log_read, 0)
+
+    def test_update_track_overflow(self):
+        # the map is not shown for a long time: the points dropped from the short log
+        # are read from the db, without gap
+        logger = get_record_logger()
+        logger.connect_db()
+        logger.init_db()
+        logger.reset()
+        logger.short_log = np.full((60, 4), np.nan)
+
+        start = datetime(2023, 1, 1, 0, 0, 0, 500000)
+        gps = logger.sensor.values["GPS"]
+        integrated = logger.sensor.values["integrated"]
+
+        def record(i, commit=True):
+            # zigzag, not simplified by rdp
+            gps["lat"] = 35.0 + 0.001 * (i % 2)
+            gps["lon"] = 139.0 + 0.0001 * i
+            integrated["distance"] = 10.0 * i
+            timestamp = start + timedelta(seconds=i)
+            if commit:
+                logger.execute_sql(
+                    [(logger.insert_sql, logger.get_record_row(timestamp))]
+                )
+            logger.store_short_log_for_update_track(
+                integrated["distance"], gps["lat"], gps["lon"], timestamp
+            )
+
+        record(0)
+        timestamp, lon, lat = logger.update_track(None)
+        self.assertEqual(len(lon), 1)
+
+        # the last rows are not committed yet
+        n = 2000
+        for i in range(1, n):
+            record(i, commit=i < n - 5)
+        self.assertTrue(logger.short_log_overflow)
+        timestamp, lon, lat = logger.update_track(timestamp)
+
+        self.assertEqual(timestamp, start + timedelta(seconds=n - 1))
+        index = np.round((np.array(lon, dtype=np.float64) - 139.0) / 0.0001)
+        # first point after the previous update, largest gap of 1s
+        self.assertEqual(index[0], 1)
+        self.assertEqual(index[-1], n - 1)
+        self.assertEqual(np.max(np.diff(index)), 1)
+        self.assertFalse(logger.short_log_overflow)
+
+        # then from the short log
+        record(n)
+        timestamp, lon, lat = logger.update_track(timestamp)
+        self.assertEqual(timestamp, start + timedelta(seconds=n))
+        self.assertEqual(len(lon), 1)
+
+        logger.close_track_db()
+        self.close_logger(logger)
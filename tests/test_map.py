@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from modules.utils.map import MBTilesReader, TileItemCache
+
+
+class TestTileItemCache(unittest.TestCase):
+    def test_evict(self):
+        removed = []
+        cache = TileItemCache(removed.append, 4)
+
+        # tiles of 1x1 at zoom level 10 along x, and one of another zoom level
+        for x in range(5):
+            cache.add((10, x, 0), f"10-{x}", (x, 0, x + 1, 1))
+        cache.add((9, 0, 0), "9-0", (0, 0, 2, 2))
+        cache.touch([(10, 0, 0)])
+        # least recently used of the tiles far from the view or of another zoom level
+        evicted = cache.evict(10, (4, 0, 5, 1), keep={(10, 4, 0)})
+        self.assertEqual(evicted, [(10, 1, 0), (9, 0, 0)])
+        self.assertEqual(removed, ["10-1", "9-0"])
+        self.assertEqual(len(cache), 4)
+
+        # the drawn tiles are kept
+        cache.add((10, 5, 0), "10-5", (5, 0, 6, 1))
+        evicted = cache.evict(10, (1, 0, 2, 1), keep={(10, 4, 0)})
+        self.assertEqual(evicted, [(10, 5, 0)])
+        self.assertIn((10, 4, 0), cache)
+
+        # then the least recently used
+        cache.add((10, 6, 0), "10-6", (1, 0, 2, 1))
+        evicted = cache.evict(10, (1, 0, 2, 1), keep={(10, 6, 0)})
+        self.assertEqual(evicted, [(10, 4, 0)])
+
+        # a tile drawn again replaces its item
+        cache.add((10, 6, 0), "10-6b", (1, 0, 2, 1))
+        self.assertEqual(removed[-1], "10-6")
+        self.assertEqual(len(cache), 4)
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(len(removed), 9)
+
+
+class TestMBTilesReader(unittest.TestCase):
+    def test_fetch(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "test.mbtiles")
+            con = sqlite3.connect(path)
+            con.execute(
+                "CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, "
+                "tile_row INTEGER, tile_data BLOB)"
+            )
+            con.execute(
+                "CREATE UNIQUE INDEX tile_index "
+                "on tiles (zoom_level, tile_column, tile_row)"
+            )
+            # TMS rows
+            con.executemany(
+                "INSERT INTO tiles VALUES (?, ?, ?, ?)",
+                [
+                    (3, x, 7 - y, f"{x}-{y}".encode())
+                    for x in range(3)
+                    for y in range(3)
+                ],
+            )
+            con.commit()
+            con.close()
+
+            decoded = []
+
+            def decode(data):
+                decoded.append(data)
+                return data.decode()
+
+            reader = MBTilesReader(path, decode=decode, mmap_size=2**20, cache_size=4)
+            queries = []
+            reader.con.set_trace_callback(queries.append)
+
+            # tiles of the range in one query, with the missing ones
+            reader.fetch(3, (1, 3), (1, 2))
+            self.assertEqual(len(queries), 1)
+            self.assertEqual(reader.get(3, 1, 2), "1-2")
+            self.assertFalse(reader.has_tile(3, 3, 1))
+            self.assertEqual(len(queries), 1)
+            self.assertEqual(len(decoded), 4)
+
+            # least recently used tiles out of the cache
+            reader.fetch(3, (1, 3), (1, 2))
+            self.assertEqual(len(queries), 1)
+            self.assertEqual(reader.get(3, 0, 0), "0-0")
+            self.assertEqual(len(queries), 2)
+            self.assertEqual(len(reader.cache), 4)
+            self.assertNotIn((3, 1, 1), reader.cache)
+            self.assertIsNone(reader.get(4, 0, 0))
+            reader.close()
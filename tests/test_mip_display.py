@@ -0,0 +1,78 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from modules.display.display_core import get_lines_array, get_update_lines
+from modules.display.mip_display import MipDisplay
+from modules.display.mip_sharp_display import MipSharpDisplay
+from tests.test_line_queue import make_display
+
+
+class TestMipDisplay(unittest.TestCase):
+    def test_conv_3bit_color_np(self):
+        rng = np.random.default_rng(0)
+        for size in ((400, 240), (640, 480)):
+            display = make_display(MipDisplay, size)
+            im_array = rng.integers(0, 256, (size[1], size[0], 3), dtype="uint8")
+            # cutoff values themselves
+            im_array[0, :, :] = 128
+            im_array[1, :, :] = 216
+            im_array[2, :, :] = 217
+            expected = display.conv_3bit_color_py(im_array)
+
+            self.assertTrue(
+                np.array_equal(display.conv_3bit_color_np(im_array), expected)
+            )
+            # lines from even lines (MipDisplay.line_align)
+            for start, end in ((0, 2), (40, 100), (32, 71), (size[1] - 2, size[1])):
+                self.assertTrue(
+                    np.array_equal(
+                        display.conv_3bit_color_np(im_array[start:end]),
+                        expected[start:end],
+                    )
+                )
+
+    def test_update_start_line(self):
+        rng = np.random.default_rng(0)
+        for cls, shape in (
+            (MipDisplay, (240, 400, 3)),
+            (MipSharpDisplay, (240, 50)),
+        ):
+            display, expected = [make_display(cls, (400, 240)) for _ in range(2)]
+            for d in (display, expected):
+                d.config = SimpleNamespace(G_DISPLAY="MIP")
+                d.conv_color = getattr(d, "conv_3bit_color_np", None)
+
+            im_array = rng.integers(0, 256, shape, dtype="uint8")
+            display.update(im_array, direct_update=True)
+            # lines 40-99 changed, sent from start_line 40
+            im_array[40:100] = rng.integers(0, 256, (60,) + shape[1:], dtype="uint8")
+            display.pi.spi_writes = []
+            display.update(im_array[40:100], direct_update=True, start_line=40)
+            expected.update(im_array, direct_update=True)
+
+            self.assertTrue(np.array_equal(display.pre_img, expected.pre_img))
+            self.assertEqual(
+                display.pi.spi_writes, [display.pre_img[40:100].tobytes()]
+            )
+
+    def test_get_update_lines(self):
+        self.assertEqual(get_update_lines(41, 100, 2, 240), (40, 100))
+        self.assertEqual(get_update_lines(40, 99, 2, 240), (40, 100))
+        self.assertEqual(get_update_lines(0, 239, 2, 239), (0, 239))
+        self.assertEqual(get_update_lines(41, 100, 1, 240), (41, 100))
+
+    def test_get_lines_array(self):
+        # 3 lines of a mono image of 20px (3 bytes) with 4 bytes by line
+        bits = bytes(range(12))
+        buf = get_lines_array(bits, 3, 4, (3,))
+        self.assertEqual(buf.tolist(), [[0, 1, 2], [4, 5, 6], [8, 9, 10]])
+        # RGB888 without padding
+        buf = get_lines_array(bytes(range(12)), 2, 6, (2, 3))
+        self.assertEqual(buf.shape, (2, 2, 3))
+        self.assertEqual(buf[1, 0].tolist(), [6, 7, 8])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+
+from modules.utils.track import TrackBuffer
+
+
+class TestTrackBuffer(unittest.TestCase):
+    def test_append(self):
+        track = TrackBuffer()
+        track.initial_capacity = 4
+        track.reset()
+        lon = np.arange(100.0)
+        for i in range(0, 100, 7):
+            track.append(lon[i : i + 7], -lon[i : i + 7])
+        self.assertEqual(len(track), 100)
+        self.assertEqual(len(track.data), 128)
+        np.testing.assert_array_equal(track.lon, lon)
+        np.testing.assert_array_equal(track.lat, -lon)
+
+        track.reset()
+        self.assertEqual(len(track), 0)
+        self.assertEqual(len(track.lon), 0)
+
+    def test_get_lod(self):
+        track = TrackBuffer()
+        # out and back on a line through the range [0, 10], then a loop far from it
+        lon = np.concatenate(
+            [np.linspace(-50, 50, 10001), np.linspace(50, 100, 100), [100.0, 5.0]]
+        )
+        lat = np.concatenate([np.full(10001, 5.0), np.full(100, 50.0), [5.0, 5.0]])
+        track.append(lon, lat)
+
+        x, y = track.get_lod(0, 10, 0, 10, 100, 100)
+        # at most 1 point by pixel in the range (and margin), with the neighbours
+        self.assertLess(len(x), 400)
+        finite = np.isfinite(x)
+        self.assertTrue(np.all(x[finite][:-1] >= -5.01))
+        # the line is broken where the points are dropped, and the last point is kept
+        self.assertEqual(np.count_nonzero(~finite), 1)
+        self.assertEqual((x[-1], y[-1]), (5.0, 5.0))
+
+        # cached while the range and the track don't change
+        self.assertIs(track.get_lod(0, 10, 0, 10, 100, 100)[0], x)
+        track.append([5.1], [5.0])
+        self.assertEqual(track.get_lod(0, 10, 0, 10, 100, 100)[0][-1], 5.1)
+
+        # all the points without range
+        x, y = track.get_lod(np.nan, np.nan, np.nan, np.nan, 100, 100)
+        self.assertEqual(len(x), len(track))
+
+    def test_get_lod_crossing(self):
+        # segment crossing the range, with both points out of it
+        track = TrackBuffer()
+        track.append([-10, 10], [0.5, 0.5])
+        x, y = track.get_lod(0, 1, 0, 1, 400, 240)
+        np.testing.assert_array_equal(x, [-10, 10])
+        np.testing.assert_array_equal(y, [0.5, 0.5])
+
+        # from the last point of a chunk to the first one of the next chunk
+        track = TrackBuffer()
+        n = track.chunk_size
+        lon = np.concatenate([np.full(n, -100.0), np.full(3 * n, 100.0)])
+        track.append(lon, np.full(len(lon), 0.5))
+        x, y = track.get_lod(0, 1, 0, 1, 400, 240)
+        np.testing.assert_array_equal(x, [-100, 100])